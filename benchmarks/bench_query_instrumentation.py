@@ -0,0 +1,97 @@
+"""
+Per-query overhead of the instrumentation in Database.execute_query, before
+and after replacing inspect.stack() caller detection.
+
+Only the logging/instrumentation path is timed (caller detection, param
+normalization, audit log calls); no database is needed. Audit lines go to a
+temporary directory, not mcp_server/logs.
+
+    python benchmarks/bench_query_instrumentation.py [iterations]
+"""
+from __future__ import annotations
+
+import inspect
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mcp_server import audit_logger  # noqa: E402
+
+SQL = """
+SELECT COUNT(*) AS pr_count
+FROM insightly.pull_request
+WHERE organizationid = 2133 AND createdon BETWEEN %s AND %s
+"""
+PARAMS = ("2025-11-01T00:00:00+00:00", "2025-11-06T00:00:00+00:00")
+INTERPOLATED = SQL % tuple(repr(p) for p in PARAMS)
+
+
+def _norm(params):
+    if params is None:
+        return ()
+    if isinstance(params, (list, tuple)):
+        return tuple(params)
+    return (params,)
+
+
+def before(sql, params):
+    try:
+        caller_fn = inspect.stack()[1].function
+    except Exception:
+        caller_fn = "unknown_caller"
+    log_params = _norm(params)
+    audit_logger.log_sql(sql)
+    audit_logger.log_sql(INTERPOLATED)
+    return caller_fn, log_params
+
+
+def after(sql, params):
+    caller_fn = audit_logger.current_context().get("tool")
+    if caller_fn is None:
+        caller_fn = sys._getframe(1).f_code.co_name
+    log_params = _norm(params)
+    if audit_logger.logs_raw_sql():
+        audit_logger.log_sql(sql)
+    if audit_logger.logs_interpolated_sql():
+        audit_logger.log_sql(INTERPOLATED)
+    return caller_fn, log_params
+
+
+def _nested(fn, depth):
+    # Tool calls run ~20 frames deep under FastMCP/anyio/the executor.
+    if depth == 0:
+        return fn(SQL, PARAMS)
+    return _nested(fn, depth - 1)
+
+
+def bench(label, fn, iterations, depth=20):
+    for _ in range(min(iterations, 200)):
+        _nested(fn, depth)
+    audit_logger.flush()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        _nested(fn, depth)
+    elapsed = time.perf_counter() - start
+    audit_logger.flush()
+    per_call_us = elapsed / iterations * 1e6
+    print(f"{label:<40} {per_call_us:10.1f} us/query")
+    return per_call_us
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        audit_logger.LOG_DIR = Path(tmp)
+        audit_logger.LOG_FILE = Path(tmp) / "activity.log"
+        audit_logger.bind(tool="pr.get_pr_count_period", request_id="bench")
+        old = bench("before: inspect.stack() + 2x log_sql", before, iterations)
+        new = bench("after: contextvar + AUDIT_SQL_MODE", after, iterations)
+        print(f"{'speedup':<40} {old / new:10.1f}x")
+        audit_logger.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark of the shared read-only validator (mcp_server.sql_guard)
+against the three regex validators it replaced, over a corpus of
+agent-generated and built-in tool queries. Also prints where the verdicts
+differ.
+
+    python benchmarks/bench_sql_guard.py [iterations]
+"""
+from __future__ import annotations
+
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mcp_server import sql_guard  # noqa: E402
+
+CORPUS = [
+    # Built-in tool statements (parameterised, fixed text).
+    "SELECT COUNT(*) AS pr_count FROM insightly.pull_request WHERE organizationid = 2133 AND createdon BETWEEN %s AND %s",
+    "SELECT COUNT(*) AS commit_count FROM insightly.commit WHERE organizationid = %s AND date BETWEEN %s AND %s",
+    "SELECT opentoreviewduration AS review_time_minutes FROM insightly.pull_request WHERE organizationid = 2133 AND actualpullrequestid = %s LIMIT 1",
+    "SELECT * FROM insightly.pull_request WHERE organizationid = 2133 AND actualpullrequestid = %s LIMIT 1",
+    """SELECT id, commitid, authorid, message, date, repoid, branch, linesadded, linesremoved,
+              COUNT(*) OVER () AS total_count
+       FROM insightly.commit WHERE organizationid = %s AND date BETWEEN %s AND %s
+       ORDER BY date DESC, id DESC LIMIT %s OFFSET %s""",
+    # Agent-written custom queries.
+    "SELECT actualpullrequestid, title FROM insightly.pull_request WHERE organizationid = 2133 ORDER BY actualpullrequestid ASC LIMIT 10",
+    "SELECT authorid, COUNT(*) AS commits FROM insightly.commit WHERE organizationid = 2133 AND date >= now() - interval '30 days' GROUP BY authorid ORDER BY commits DESC",
+    "SELECT title, updatedon FROM insightly.pull_request WHERE organizationid = 2133 AND state = 'merged' ORDER BY updatedon DESC LIMIT 5",
+    "SELECT message FROM insightly.commit WHERE organizationid = 2133 AND message ILIKE '%%fix%%' LIMIT 20",
+    "WITH recent AS (SELECT * FROM insightly.pull_request WHERE organizationid = 2133 AND createdon > now() - interval '7 days') SELECT state, COUNT(*) FROM recent GROUP BY state",
+    "SELECT AVG(cycletimeduration) FROM insightly.pull_request WHERE organizationid = 2133 AND mergedon IS NOT NULL",
+    "SELECT * FROM insightly.commit WHERE organizationid = 2133 AND message LIKE '%%delete old files%%' -- cleanup commits",
+    "(SELECT id FROM insightly.commit WHERE organizationid = 2133 ORDER BY date DESC LIMIT 3)",
+    "SELECT percentile_cont(0.9) WITHIN GROUP (ORDER BY cycletimeduration) FROM insightly.pull_request WHERE organizationid = 2133",
+    # Queries that must be rejected.
+    "DELETE FROM insightly.commit WHERE organizationid = 2133",
+    "SELECT 1; DROP TABLE insightly.commit",
+    "WITH gone AS (DELETE FROM insightly.commit RETURNING *) SELECT * FROM gone",
+    "MERGE INTO insightly.commit USING x ON true WHEN MATCHED THEN DO NOTHING",
+    "SELECT * INTO scratch FROM insightly.pull_request",
+    "SELECT pg_sleep(600)",
+    "SELECT * FROM insightly.pull_request FOR UPDATE",
+]
+
+_LEGACY_FORBIDDEN = ("insert", "update", "delete", "drop", "alter", "create", "truncate",
+                     "grant", "revoke", "merge", "call")
+
+
+def legacy_database(sql: str) -> bool:
+    sanitized = re.sub(r"--.*?$", "", sql, flags=re.MULTILINE)
+    sanitized = re.sub(r"/\*.*?\*/", "", sanitized, flags=re.DOTALL)
+    stripped = sanitized.strip()
+    if not stripped or ";" in stripped.rstrip("; \n\t\r"):
+        return False
+    leading = stripped.lstrip("(").lstrip().lower()
+    if not (leading.startswith("select") or leading.startswith("with")):
+        return False
+    lowered = stripped.lower()
+    return not any(re.search(rf"\b{kw}\b", lowered) for kw in _LEGACY_FORBIDDEN)
+
+
+def legacy_commit(sql: str) -> bool:
+    if ";" in sql.strip().rstrip().rstrip(";"):
+        return False
+    s = re.sub(r"^\(+", "", sql.strip().lower()).strip()
+    if not s.startswith("select"):
+        return False
+    forbidden = ["insert", "update", "delete", "drop", "alter", "truncate", "create", ";",
+                 "grant", "revoke", "call", "merge"]
+    return not any(kw in s for kw in forbidden)
+
+
+def legacy_pr(sql: str) -> bool:
+    s = re.sub(r"^\(+", "", sql.strip().lower()).strip()
+    if not s.startswith("select"):
+        return False
+    forbidden = ["insert", "update", "delete", "drop", "alter", "truncate", "create", "grant", "revoke"]
+    if any(kw in s for kw in forbidden):
+        return False
+    return ";" not in sql.strip().rstrip().rstrip(";")
+
+
+def bench(label, fn, iterations, before_each=None):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if before_each is not None:
+            before_each()
+        for sql in CORPUS:
+            fn(sql)
+    elapsed = time.perf_counter() - start
+    per_query_us = elapsed / (iterations * len(CORPUS)) * 1e6
+    print(f"{label:<44} {per_query_us:8.2f} us/query")
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{len(CORPUS)} statements x {iterations} iterations\n")
+    bench("legacy database._ensure_read_only", legacy_database, iterations)
+    bench("legacy commit _is_read_only_select", legacy_commit, iterations)
+    bench("legacy pr _is_read_only_select", legacy_pr, iterations)
+
+    def clear():
+        sql_guard._parse.cache_clear()
+        sql_guard._verdict_for.cache_clear()
+
+    bench("sql_guard.check_read_only (cold cache)", sql_guard.check_read_only, max(1, iterations // 10), clear)
+    clear()
+    bench("sql_guard.check_read_only (warm cache)", sql_guard.check_read_only, iterations)
+
+    print("\nVerdict differences (ok = accepted):")
+    header = f"{'database':>9} {'commit':>7} {'pr':>5} {'guard':>6}  statement"
+    print(header)
+    for sql in CORPUS:
+        row = (legacy_database(sql), legacy_commit(sql), legacy_pr(sql), sql_guard.check_read_only(sql).ok)
+        if len(set(row)) > 1:
+            flags = " ".join(f"{'ok' if v else '-':>{w}}" for v, w in zip(row, (9, 7, 5, 6)))
+            print(f"{flags}  {' '.join(sql.split())[:70]}")
+
+
+if __name__ == "__main__":
+    main()
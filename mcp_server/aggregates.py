@@ -0,0 +1,294 @@
+"""
+Period aggregates computed in SQL for the PR and commit servers.
+
+Each server describes its table with an :class:`AggregateSpec` (which
+metrics and groupings it offers); :func:`aggregate` turns a request into
+one GROUP BY query (plus one query for a histogram) and :func:`trend` into
+one zero-filled time series query. Both return compact, columnar results
+instead of raw rows for the agent to page through.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .database import Database
+from .schema_cache import SCHEMA_CACHE
+
+STATS = ("count", "sum", "avg", "min", "max", "p50", "p90", "p99", "histogram")
+DEFAULT_METRIC_STATS = ("count", "avg", "p50", "p90")
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+DEFAULT_GROUP_LIMIT = 50
+MAX_GROUP_LIMIT = 500
+DEFAULT_BUCKETS = 10
+MAX_BUCKETS = 50
+
+
+class AggregateSpec(NamedTuple):
+    table: str  # table name in the insightly schema
+    time_column: str  # column the period filters on (and "day" groups by)
+    metrics: Dict[str, str]  # metric name -> SQL expression over the table's columns
+    groups: Dict[str, Tuple[str, ...]]  # group name -> candidate columns, first existing wins
+
+
+def _utc_time(spec: AggregateSpec) -> str:
+    """``spec.time_column`` as a UTC timestamp, independent of the session TimeZone."""
+    types = {col["column_name"]: col["data_type"] for col in SCHEMA_CACHE.columns(spec.table)}
+    if types.get(spec.time_column) == "timestamp with time zone":
+        return f"({spec.time_column} AT TIME ZONE 'UTC')"
+    # timestamp without time zone already holds UTC; a date becomes its midnight.
+    return f"({spec.time_column})::timestamp"
+
+
+def _utc_naive(value: datetime) -> str:
+    """ISO text of ``value`` in UTC without an offset (``::timestamp`` would drop the offset, not apply it)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def _resolve_group(spec: AggregateSpec, group_by: str) -> str:
+    if group_by == "day":
+        return f"date_trunc('day', {_utc_time(spec)})"
+    candidates = spec.groups.get(group_by)
+    if candidates is None:
+        raise ValueError(
+            f"group_by must be one of: {', '.join(sorted(list(spec.groups) + ['day']))}"
+        )
+    columns = SCHEMA_CACHE.column_names(spec.table)
+    for column in candidates:
+        if column in columns:
+            return column
+    raise ValueError(f"grouping by {group_by} is not available for {spec.table}")
+
+
+def _normalize_stats(stats: Optional[Sequence[str]], metric: Optional[str]) -> List[str]:
+    if stats is None:
+        return list(DEFAULT_METRIC_STATS) if metric else ["count"]
+    if isinstance(stats, str):
+        stats = [stats]
+    wanted = list(dict.fromkeys(str(stat).strip().lower() for stat in stats))
+    unknown = [stat for stat in wanted if stat not in STATS]
+    if unknown:
+        raise ValueError(f"Unknown stat(s): {', '.join(unknown)}. Use {', '.join(STATS)}.")
+    if not metric and any(stat != "count" for stat in wanted):
+        raise ValueError("a metric is required for stats other than count")
+    return wanted
+
+
+def _group_value(value: Any) -> Any:
+    # "day" groups come back as midnight timestamps; report the date.
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _number(value: Any) -> Any:
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)  # SUM over integer columns comes back as numeric
+    try:
+        return round(float(value), 2)
+    except (TypeError, ValueError):
+        return value
+
+
+def aggregate(
+    spec: AggregateSpec,
+    org_id: int,
+    start: str,
+    end: str,
+    metric: Optional[str] = None,
+    stats: Optional[Sequence[str]] = None,
+    group_by: Optional[str] = None,
+    buckets: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Aggregate ``metric`` over the rows of ``spec.table`` in [start, end].
+
+    Returns ``{"columns": [...], "rows": [[...], ...]}`` with one row per
+    group (a single row without ``group_by``), ordered by day for
+    ``group_by="day"`` and by count otherwise; ``"histogram"`` adds
+    ``buckets`` equal-width buckets over the metric's range. Raises
+    ValueError for unsupported arguments and RuntimeError if a query fails.
+    """
+    metric_key = metric.strip().lower() if isinstance(metric, str) and metric.strip() else None
+    if metric_key is not None and metric_key not in spec.metrics:
+        raise ValueError(f"metric must be one of: {', '.join(spec.metrics)}")
+    wanted = _normalize_stats(stats, metric_key)
+    group_key = group_by.strip().lower() if isinstance(group_by, str) and group_by.strip() else None
+    group_expr = _resolve_group(spec, group_key) if group_key else None
+    if "histogram" in wanted and group_expr is not None:
+        raise ValueError("histogram cannot be combined with group_by")
+
+    limit_val = DEFAULT_GROUP_LIMIT if limit is None else int(limit)
+    if limit_val <= 0 or limit_val > MAX_GROUP_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_GROUP_LIMIT}")
+    bucket_count = DEFAULT_BUCKETS if buckets is None else int(buckets)
+    if bucket_count <= 0 or bucket_count > MAX_BUCKETS:
+        raise ValueError(f"buckets must be between 1 and {MAX_BUCKETS}")
+
+    expr = spec.metrics[metric_key] if metric_key else None
+    where = f"organizationid = %s AND {spec.time_column} BETWEEN %s AND %s"
+    params: Tuple[Any, ...] = (org_id, start, end)
+
+    select = []
+    columns: List[str] = []
+    if group_expr is not None:
+        select.append(f"{group_expr} AS group_key")
+        columns.append(group_key)
+    select.append("COUNT(*) AS count")
+    columns.append("count")
+    for stat in ("sum", "avg", "min", "max"):
+        if stat in wanted:
+            select.append(f"{stat.upper()}({expr}) AS {stat}")
+            columns.append(stat)
+    percentiles = [stat for stat in PERCENTILES if stat in wanted]
+    if percentiles:
+        # One sort per group for all requested percentiles.
+        fractions = ", ".join(str(PERCENTILES[stat]) for stat in percentiles)
+        select.append(f"percentile_cont(ARRAY[{fractions}]) WITHIN GROUP (ORDER BY {expr}) AS percentiles")
+
+    sql = f"SELECT {', '.join(select)}\nFROM insightly.{spec.table}\nWHERE {where}"
+    if group_expr is not None:
+        order = "group_key" if group_key == "day" else "count DESC, group_key"
+        sql += f"\nGROUP BY group_key\nORDER BY {order}\nLIMIT {limit_val}"
+
+    db = Database()
+    try:
+        res = db.execute_query(sql, params=params, columnar=True)
+        if not res["success"]:
+            raise RuntimeError(res.get("error") or "aggregate query failed")
+        rows = []
+        for values in res["rows"]:
+            values = list(values)
+            if percentiles:
+                values = values[:-1] + list(values[-1] or [None] * len(percentiles))
+            if group_expr is not None:
+                rows.append([_group_value(values[0])] + [_number(v) for v in values[1:]])
+            else:
+                rows.append([_number(v) for v in values])
+        result: Dict[str, Any] = {"columns": columns + percentiles, "rows": rows}
+
+        if "histogram" in wanted:
+            result["histogram"] = _histogram(db, spec, expr, where, params, bucket_count)
+    finally:
+        db.close()
+    return result
+
+
+def _histogram(db: Database, spec: AggregateSpec, expr: str, where: str, params: tuple, buckets: int) -> Dict[str, Any]:
+    sql = f"""
+    WITH base AS (
+        SELECT ({expr})::float8 AS v
+        FROM insightly.{spec.table}
+        WHERE {where} AND ({expr}) IS NOT NULL
+    ), bounds AS (
+        SELECT MIN(v) AS lo, MAX(v) AS hi FROM base
+    )
+    SELECT
+        CASE WHEN b.hi = b.lo THEN 1 ELSE LEAST(width_bucket(base.v, b.lo, b.hi, {buckets}), {buckets}) END AS bucket,
+        MIN(b.lo) AS lo,
+        MIN(b.hi) AS hi,
+        COUNT(*) AS count
+    FROM base CROSS JOIN bounds b
+    GROUP BY 1
+    ORDER BY 1
+    """
+    res = db.execute_query(sql, params=params, columnar=True)
+    if not res["success"]:
+        raise RuntimeError(res.get("error") or "histogram query failed")
+    if not res["rows"]:
+        return {"columns": ["lower", "upper", "count"], "rows": []}
+    lo, hi = float(res["rows"][0][1]), float(res["rows"][0][2])
+    counts = {int(bucket): int(count) for bucket, _, _, count in res["rows"]}
+    width = (hi - lo) / buckets if hi > lo else 0.0
+    rows = [
+        [round(lo + i * width, 2), round(lo + (i + 1) * width, 2) if width else round(hi, 2), counts.get(i + 1, 0)]
+        for i in range(buckets if width else 1)
+    ]
+    return {"columns": ["lower", "upper", "count"], "rows": rows}
+
+
+TREND_BUCKETS = ("day", "week", "month")
+MAX_TREND_POINTS = 400
+
+
+def _trend_bucket(start: datetime, end: datetime, bucket: Optional[str]) -> str:
+    if bucket is None or not str(bucket).strip():
+        span = (end - start).days
+        return "day" if span <= 31 else "week" if span <= 183 else "month"
+    bucket = str(bucket).strip().lower()
+    if bucket not in TREND_BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(TREND_BUCKETS)}")
+    return bucket
+
+
+def trend(
+    spec: AggregateSpec,
+    org_id: int,
+    start: datetime,
+    end: datetime,
+    series: Dict[str, Tuple[str, Optional[int]]],
+    bucket: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Per-bucket time series over ``spec.table`` in [start, end], in one query.
+
+    ``series`` maps each output column to an aggregate over the table's rows
+    and the value used for buckets without rows (0 for counts and sums, None
+    for e.g. a median). generate_series supplies every day/week/month
+    between start and end, so gaps come back filled rather than missing;
+    buckets are UTC and labelled by their first day. ``bucket`` defaults to
+    day, week or month depending on the span. Raises ValueError for
+    unsupported arguments and RuntimeError if the query fails.
+    """
+    unit = _trend_bucket(start, end, bucket)
+    points = {"day": (end - start).days, "week": (end - start).days // 7, "month": (end - start).days // 28}[unit] + 1
+    if points > MAX_TREND_POINTS:
+        raise ValueError(f"{points} {unit} buckets exceed the limit of {MAX_TREND_POINTS}; use a larger bucket")
+
+    # Both sides are UTC timestamps, so buckets line up whatever the server's TimeZone.
+    truncated = f"date_trunc('{unit}', {_utc_time(spec)})"
+    aggregates = ",\n            ".join(f"{expr} AS {name}" for name, (expr, _) in series.items())
+    filled = ", ".join(
+        f"d.{name}" if fill is None else f"COALESCE(d.{name}, {int(fill)}) AS {name}"
+        for name, (_, fill) in series.items()
+    )
+    sql = f"""
+    WITH buckets AS (
+        SELECT generate_series(
+            date_trunc('{unit}', %s::timestamp),
+            date_trunc('{unit}', %s::timestamp),
+            interval '1 {unit}'
+        ) AS bucket
+    ), data AS (
+        SELECT
+            {truncated} AS bucket,
+            {aggregates}
+        FROM insightly.{spec.table}
+        WHERE organizationid = %s AND {spec.time_column} BETWEEN %s AND %s
+        GROUP BY 1
+    )
+    SELECT b.bucket, {filled}
+    FROM buckets b
+    LEFT JOIN data d ON d.bucket = b.bucket
+    ORDER BY b.bucket
+    """
+    start_iso, end_iso = start.isoformat(), end.isoformat()
+    db = Database()
+    try:
+        res = db.execute_query(
+            sql, params=(_utc_naive(start), _utc_naive(end), org_id, start_iso, end_iso), columnar=True
+        )
+    finally:
+        db.close()
+    if not res["success"]:
+        raise RuntimeError(res.get("error") or "trend query failed")
+    rows = [[_group_value(values[0])] + [_number(v) for v in values[1:]] for values in res["rows"]]
+    return {"bucket": unit, "columns": ["bucket"] + list(series), "rows": rows}
@@ -1,27 +1,325 @@
 from __future__ import annotations
 
-from datetime import datetime
+import atexit
+import contextvars
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
 
 LOG_DIR = Path(__file__).resolve().parent / "logs"
 LOG_FILE = LOG_DIR / "activity.log"
 
 
-def _write(kind: str, payload: str) -> None:
-    LOG_DIR.mkdir(exist_ok=True)
-    timestamp = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    line = f"{timestamp} [{kind.upper()}] {payload}"
-    with LOG_FILE.open("a", encoding="utf-8") as handle:
-        handle.write(line + "\n")
+def _env(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value.strip().lower() if value and value.strip() else default
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+# The settings below are read once, at import, which happens before manager.py or
+# database.py get to load .env; load the same two files here first. Values
+# already in the environment win, as with load_dotenv elsewhere.
+load_dotenv(Path(__file__).resolve().parent / ".env")
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+# Bounded buffer between the callers and the background writer.
+QUEUE_SIZE = int(_env_number("AUDIT_QUEUE_SIZE", 10000))
+# Upper bound on how long a line may sit in the buffer before it is written.
+FLUSH_INTERVAL = _env_number("AUDIT_FLUSH_INTERVAL", 0.5)
+BATCH_SIZE = int(_env_number("AUDIT_BATCH_SIZE", 500))
+# What to do when the buffer is full: block | drop_new | drop_oldest.
+OVERFLOW_POLICY = _env("AUDIT_OVERFLOW_POLICY", "block")
+# Which SQL text execute_query records: both | interpolated | raw.
+SQL_LOG_MODE = _env("AUDIT_SQL_MODE", "both")
+# Line format: text (``<ts> [KIND] key=value ...``) or jsonl (one JSON object per line).
+LOG_FORMAT = _env("AUDIT_LOG_FORMAT", "text")
+# Default "agent" attribution for events from this process (e.g. set by the manager for its servers).
+AGENT_NAME = os.getenv("AUDIT_AGENT_NAME") or None
+# Rotation settings (read after .env is loaded above, like the rest).
+# Rotate once the live file reaches this size (0 disables size-based rotation).
+MAX_BYTES = int(_env_number("AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+# Rotate when the live file was last written on an earlier UTC day.
+ROTATE_DAILY = _env("AUDIT_LOG_ROTATE_DAILY", "1") not in {"0", "false", "no", "off"}
+# Number of gzip-compressed rotated segments to keep.
+BACKUP_COUNT = int(_env_number("AUDIT_LOG_BACKUP_COUNT", 14))
+
+_SEGMENT_GLOB = LOG_FILE.name + ".*.gz"
+
+
+def rotated_segments() -> List[Path]:
+    """Rotated, compressed segments, oldest first."""
+    return sorted(LOG_DIR.glob(_SEGMENT_GLOB))
+
+
+def _needs_rotation(now: datetime) -> bool:
+    try:
+        st = LOG_FILE.stat()
+    except FileNotFoundError:
+        return False
+    if st.st_size == 0:
+        return False
+    if MAX_BYTES > 0 and st.st_size >= MAX_BYTES:
+        return True
+    if ROTATE_DAILY:
+        last_write = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        return last_write.date() < now.date()
+    return False
+
+
+def rotate() -> Optional[Path]:
+    """
+    Move the live log aside as ``activity.log.<timestamp>.gz`` and prune old segments.
+
+    The segment is named after the live file's last write so names sort
+    chronologically. Several server processes share the file, so losing the
+    rename race to another process is treated as "already rotated".
+    """
+    try:
+        stamp = datetime.fromtimestamp(LOG_FILE.stat().st_mtime, tz=timezone.utc)
+    except FileNotFoundError:
+        return None
+    base = f"{LOG_FILE.name}.{stamp:%Y%m%dT%H%M%S}"
+    target = LOG_DIR / f"{base}.gz"
+    suffix = 1
+    while target.exists():
+        target = LOG_DIR / f"{base}-{suffix}.gz"
+        suffix += 1
+
+    staging = target.with_suffix(".rotating")
+    try:
+        os.replace(LOG_FILE, staging)
+    except FileNotFoundError:
+        return None
+    with staging.open("rb") as src, gzip.open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    staging.unlink()
+
+    segments = rotated_segments()
+    for stale in segments[: max(0, len(segments) - BACKUP_COUNT)]:
+        try:
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+    return target
+
+
+def iter_log_lines(include_rotated: bool = True) -> Iterator[str]:
+    """Stream audit lines oldest first, across rotated segments and the live file."""
+    if include_rotated:
+        for segment in rotated_segments():
+            try:
+                with gzip.open(segment, "rt", encoding="utf-8") as handle:
+                    for line in handle:
+                        yield line.rstrip("\n")
+            except FileNotFoundError:
+                continue
+    try:
+        with LOG_FILE.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                yield line.rstrip("\n")
+    except FileNotFoundError:
+        return
+
+
+class _AuditWriter:
+    """Background thread that drains queued log lines to LOG_FILE in batches."""
+
+    def __init__(self, maxsize: int, flush_interval: float, batch_size: int, overflow: str):
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, maxsize))
+        self._flush_interval = max(0.01, flush_interval)
+        self._batch_size = max(1, batch_size)
+        self._overflow = overflow
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.dropped = 0
+        self.written = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stopped:
+                LOG_DIR.mkdir(exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, line: str) -> None:
+        if self._stopped:
+            self._write_batch([line])
+            return
+        self._ensure_started()
+        if self._overflow == "block":
+            self._queue.put(line)
+            return
+        try:
+            self._queue.put_nowait(line)
+            return
+        except queue.Full:
+            pass
+        if self._overflow == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(line)
+            except queue.Full:
+                pass
+        with self._lock:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: List[str] = []
+            stop = item is None
+            if not stop:
+                batch.append(item)
+            # Gather whatever else arrives within the flush window.
+            deadline = time.monotonic() + self._flush_interval
+            while not stop and len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[str]) -> None:
+        if not batch:
+            return
+        try:
+            if _needs_rotation(datetime.now(timezone.utc)):
+                rotate()
+        except OSError as e:
+            print(f"[AUDIT] rotation failed: {e}", file=sys.stderr, flush=True)
+        try:
+            with LOG_FILE.open("a", encoding="utf-8") as handle:
+                handle.write("\n".join(batch) + "\n")
+            self.written += len(batch)
+        except OSError as e:
+            print(f"[AUDIT] write failed: {e}", file=sys.stderr, flush=True)
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+_writer = _AuditWriter(QUEUE_SIZE, FLUSH_INTERVAL, BATCH_SIZE, OVERFLOW_POLICY)
+
+
+def flush() -> None:
+    _writer.flush()
+
+
+@atexit.register
+def shutdown() -> None:
+    """Flush pending lines and stop the writer thread (also runs at interpreter exit)."""
+    _writer.shutdown()
+
+
+def stats() -> dict:
+    return {
+        "queued": _writer._queue.qsize(),
+        "written": _writer.written,
+        "dropped": _writer.dropped,
+        "overflow_policy": OVERFLOW_POLICY,
+        "queue_size": QUEUE_SIZE,
+        "flush_interval": FLUSH_INTERVAL,
+        "batch_size": BATCH_SIZE,
+        "format": LOG_FORMAT,
+        "sql_mode": SQL_LOG_MODE,
+        "rotation": {"max_bytes": MAX_BYTES, "daily": ROTATE_DAILY, "backup_count": BACKUP_COUNT},
+    }
+
+
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("audit_context", default={})
+
+
+def bind(**fields: Any) -> contextvars.Token:
+    """
+    Attach correlation fields (agent, tool, request_id, ...) to every event
+    logged from the current context. Returns a token for :func:`unbind`.
+    """
+    merged = dict(_context.get())
+    merged.update({key: value for key, value in fields.items() if value is not None})
+    return _context.set(merged)
+
+
+def unbind(token: contextvars.Token) -> None:
+    _context.reset(token)
+
+
+def current_context() -> Dict[str, Any]:
+    return _context.get()
+
+
+def structured() -> bool:
+    return LOG_FORMAT == "jsonl"
+
+
+def _write(kind: str, payload: str, fields: Optional[Dict[str, Any]] = None) -> None:
+    now = datetime.utcnow()
+    if structured():
+        record: Dict[str, Any] = {"ts": now.isoformat(timespec="milliseconds") + "Z", "kind": kind}
+        if AGENT_NAME:
+            record["agent"] = AGENT_NAME
+        record.update(_context.get())
+        record.update(fields if fields is not None else {"message": payload})
+        line = json.dumps(record, default=str, separators=(",", ":"))
+    else:
+        timestamp = now.isoformat(timespec="seconds") + "Z"
+        line = f"{timestamp} [{kind.upper()}] {payload}"
+    _writer.submit(line)
 
 
 def log_agent_start(agent_name: str) -> None:
-    _write("agent", f"agent={agent_name} status=started")
+    _write("agent", f"agent={agent_name} status=started", {"agent": agent_name, "status": "started"})
 
 
 def log_user_query(agent_name: str, query: str) -> None:
-    _write("query", f"agent={agent_name} prompt={query!r}")
+    _write("query", f"agent={agent_name} prompt={query!r}", {"agent": agent_name, "prompt": query})
 
 
 def log_tool_call(tool_name: str, **kwargs: Any) -> None:
@@ -29,9 +327,62 @@ def log_tool_call(tool_name: str, **kwargs: Any) -> None:
     payload = f"tool={tool_name}"
     if extras:
         payload = f"{payload} {extras}"
-    _write("tool", payload)
+    # The explicit name wins over a tool bound in the context by the executor.
+    fields = {"tool": tool_name}
+    args = {key: value for key, value in kwargs.items() if value is not None}
+    if args:
+        fields["args"] = args
+    _write("tool", payload, fields)
 
 
 def log_sql(statement: str) -> None:
     condensed = " ".join(statement.split())
-    _write("sql", condensed)
+    _write("sql", condensed, {"sql": condensed})
+
+
+def log_db_query(
+    *,
+    tool: Optional[str],
+    fingerprint: str,
+    sql: str,
+    params: Any,
+    elapsed_ms: float,
+    rows: Optional[int],
+    error: Optional[str] = None,
+) -> None:
+    """
+    One record per executed statement with its timing. Only written in the
+    jsonl format; the text format keeps its raw/interpolated [SQL] lines.
+    """
+    if not structured():
+        return
+    fields: Dict[str, Any] = {
+        "fingerprint": fingerprint,
+        "sql": " ".join(sql.split()),
+        "params": list(params) if isinstance(params, (list, tuple)) else params,
+        "elapsed_ms": round(elapsed_ms, 2),
+        "rows": rows,
+        "success": error is None,
+    }
+    if tool:
+        fields["tool"] = tool
+    if error is not None:
+        fields["error"] = error
+    _write("db", "", fields)
+
+
+def logs_raw_sql() -> bool:
+    return SQL_LOG_MODE in {"both", "raw"}
+
+
+def logs_interpolated_sql() -> bool:
+    return SQL_LOG_MODE in {"both", "interpolated"}
+
+
+if __name__ == "__main__":
+    # Print the whole audit trail, oldest first: python -m mcp_server.audit_logger
+    try:
+        for entry in iter_log_lines(include_rotated="--live-only" not in sys.argv[1:]):
+            print(entry)
+    except BrokenPipeError:
+        pass
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+from .database import Database
+from .rollups import ROLLUPS
+from .schema_cache import SCHEMA_CACHE
+
+DEFAULT_INTERVAL_SECONDS = 60.0
+# Full-range reconciles are a slow catch-all; off unless configured.
+DEFAULT_FULL_REFRESH_SECONDS = 0.0
+# Keys per SQLite IN (...) lookup of previously seen days.
+_DAY_LOOKUP_CHUNK = 500
+
+# Mark columns that move when a row is edited; the others only see inserts.
+MODIFICATION_COLUMNS = frozenset({"updatedon", "modifiedon"})
+
+
+class TrackedTable(NamedTuple):
+    table: str  # table in the insightly schema
+    key_column: str  # id the tools look rows up by
+    time_column: str  # timestamp the period tools and rollups filter on
+    mark_columns: Tuple[str, ...]  # high-water mark candidates, first existing wins
+
+
+TABLES = {
+    "commit": TrackedTable("commit", "id", "date", ("updatedon", "modifiedon", "id")),
+    "pull_request": TrackedTable(
+        "pull_request", "actualpullrequestid", "createdon", ("updatedon", "modifiedon", "createdon")
+    ),
+}
+
+
+class ChangeSet(NamedTuple):
+    table: str
+    ids: FrozenSet[Any]  # key_column values of the new/changed rows
+    days: FrozenSet[date]  # UTC days of their time_column
+    updates: bool  # marked by a modification column, so rows may be edits (and may have moved day)
+    moved_from: FrozenSet[date] = frozenset()  # previously seen days that edited rows have left
+
+
+def _utc_day(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return (value.astimezone(timezone.utc) if value.tzinfo else value).date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _mark_text(value: Any) -> str:
+    return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+
+class ChangeCapture:
+    """
+    Incremental change capture for the insightly tables of one organization.
+
+    Every ``interval`` seconds each subscribed table is polled for rows whose
+    high-water mark column (``updatedon`` where the table has one, else an
+    increasing id or creation time) is above the last mark seen; only those
+    rows' keys and timestamps are read. Subscribers get a :class:`ChangeSet`
+    and invalidate what the rows affect. The first poll of a table only
+    records the current mark. Marks are kept next to the rollups so a
+    restart resumes where the previous process stopped.
+
+    For tables marked by a modification column, the UTC day of every row
+    seen is remembered, so an edit that moves a row to another day reports
+    the day it left in ``ChangeSet.moved_from``. Rows last seen before
+    capture started have no remembered day, and a table without a
+    modification column only reports inserts; for both, an opt-in schedule
+    (``full_refresh_interval`` seconds, 0 = off) reconciles or re-rolls the
+    whole rollup range.
+    """
+
+    def __init__(
+        self,
+        org_id: int,
+        state_path: Path,
+        interval: float = DEFAULT_INTERVAL_SECONDS,
+        full_refresh_interval: float = DEFAULT_FULL_REFRESH_SECONDS,
+    ):
+        self.org_id = org_id
+        self.state_path = Path(state_path)
+        self.interval = interval
+        self.full_refresh_interval = full_refresh_interval
+        self._inserts_only: Set[str] = set()
+        self._full_refreshed: Dict[str, float] = {}  # table -> epoch seconds of the last full re-roll
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._listeners: Dict[str, List[Callable[[ChangeSet], None]]] = {}
+        self._marks: Dict[str, Tuple[str, str]] = {}  # table -> (mark column, mark)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {"polls": 0, "changed_rows": 0, "notifications": 0, "full_refreshes": 0, "errors": 0}
+
+    def subscribe(self, table: str, listener: Callable[[ChangeSet], None]) -> None:
+        """Call ``listener`` with each ChangeSet of ``table``; only tables with listeners are polled."""
+        if table not in TABLES:
+            raise ValueError(f"change capture does not track {table}")
+        with self._lock:
+            self._listeners.setdefault(table, []).append(listener)
+
+    def _state(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.state_path), timeout=30, check_same_thread=False)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS capture_mark (
+                    table_name TEXT NOT NULL,
+                    org_id INTEGER NOT NULL,
+                    mark_column TEXT NOT NULL,
+                    mark TEXT NOT NULL,
+                    PRIMARY KEY (table_name, org_id)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS capture_day (
+                    table_name TEXT NOT NULL,
+                    org_id INTEGER NOT NULL,
+                    key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    PRIMARY KEY (table_name, org_id, key)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS capture_refresh (
+                    table_name TEXT NOT NULL,
+                    org_id INTEGER NOT NULL,
+                    refreshed_at REAL NOT NULL,
+                    PRIMARY KEY (table_name, org_id)
+                )
+                """
+            )
+            for table, column, mark in conn.execute(
+                "SELECT table_name, mark_column, mark FROM capture_mark WHERE org_id = ?", (self.org_id,)
+            ):
+                self._marks[table] = (column, mark)
+            for table, refreshed_at in conn.execute(
+                "SELECT table_name, refreshed_at FROM capture_refresh WHERE org_id = ?", (self.org_id,)
+            ):
+                self._full_refreshed[table] = refreshed_at
+            self._conn = conn
+        return self._conn
+
+    def _save_mark(self, table: str, column: str, mark: str) -> None:
+        self._marks[table] = (column, mark)
+        conn = self._state()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO capture_mark VALUES (?, ?, ?, ?)", (table, self.org_id, column, mark)
+            )
+
+    def _record_days(self, table: str, rows: Dict[str, date]) -> FrozenSet[date]:
+        """Remember each row's day; return the previously recorded days the rows have left."""
+        conn = self._state()
+        keys = list(rows)
+        previous: Dict[str, str] = {}
+        for offset in range(0, len(keys), _DAY_LOOKUP_CHUNK):
+            chunk = keys[offset : offset + _DAY_LOOKUP_CHUNK]
+            previous.update(
+                conn.execute(
+                    "SELECT key, day FROM capture_day WHERE table_name = ? AND org_id = ? "
+                    f"AND key IN ({', '.join('?' * len(chunk))})",
+                    (table, self.org_id, *chunk),
+                )
+            )
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO capture_day VALUES (?, ?, ?, ?)",
+                [(table, self.org_id, key, day.isoformat()) for key, day in rows.items()],
+            )
+        return frozenset(
+            date.fromisoformat(day) for key, day in previous.items() if day != rows[key].isoformat()
+        )
+
+    def _poll_table(self, name: str) -> Optional[ChangeSet]:
+        spec = TABLES[name]
+        columns = SCHEMA_CACHE.column_names(spec.table)
+        column = next((c for c in spec.mark_columns if c in columns), None)
+        if column is None:
+            raise RuntimeError(f"no high-water mark column on {spec.table}")
+        if column not in MODIFICATION_COLUMNS and name not in self._inserts_only:
+            self._inserts_only.add(name)
+            if self.full_refresh_interval > 0:
+                edits = f"edits reach the rollups through a full re-roll every {self.full_refresh_interval:g}s"
+            else:
+                edits = "set CHANGE_CAPTURE_FULL_REFRESH_SECONDS to re-roll edits periodically"
+            print(
+                f"[CDC] {spec.table} has no updatedon/modifiedon column; capturing inserts only ({edits})",
+                file=sys.stderr,
+            )
+        self._state()
+        previous = self._marks.get(name)
+        db = Database()
+        try:
+            if previous is None or previous[0] != column:
+                res = db.execute_query(
+                    f"SELECT MAX({column}) AS mark FROM insightly.{spec.table} WHERE organizationid = %s",
+                    params=(self.org_id,),
+                )
+                if not res["success"]:
+                    raise RuntimeError(res.get("error") or "mark query failed")
+                mark = res["rows"][0]["mark"] if res["rows"] else None
+                if mark is not None:
+                    self._save_mark(name, column, _mark_text(mark))
+                return None
+            # No LIMIT: rows sharing the last mark must not be split across polls.
+            sql = f"""
+            SELECT {spec.key_column} AS key, {spec.time_column} AS ts, {column} AS mark
+            FROM insightly.{spec.table}
+            WHERE organizationid = %s AND {column} > %s
+            ORDER BY {column}
+            """
+            res = db.execute_query(sql, params=(self.org_id, previous[1]), columnar=True)
+        finally:
+            db.close()
+        if not res["success"]:
+            raise RuntimeError(res.get("error") or "change query failed")
+        if not res["rows"]:
+            return None
+        self._stats["changed_rows"] += len(res["rows"])
+        self._save_mark(name, column, _mark_text(res["rows"][-1][2]))
+        row_days = {str(key): _utc_day(ts) for key, ts, _ in res["rows"]}
+        row_days = {key: day for key, day in row_days.items() if day is not None}
+        updates = column in MODIFICATION_COLUMNS
+        # Only edits can move a row between days, so only marked tables keep a day per row.
+        moved_from = self._record_days(name, row_days) if updates else frozenset()
+        return ChangeSet(
+            name, frozenset(row[0] for row in res["rows"]), frozenset(row_days.values()), updates, moved_from
+        )
+
+    def poll_once(self) -> List[ChangeSet]:
+        """Poll every subscribed table once and notify its listeners; returns the change sets."""
+        with self._lock:
+            listeners = {table: list(fns) for table, fns in self._listeners.items()}
+        changes = []
+        with self._poll_lock:
+            for table, fns in listeners.items():
+                change = self._capture(table, fns)
+                if change is not None:
+                    changes.append(change)
+                self._full_refresh(table)
+            self._stats["polls"] += 1
+        return changes
+
+    def _capture(self, table: str, fns: List[Callable[[ChangeSet], None]]) -> Optional[ChangeSet]:
+        try:
+            change = self._poll_table(table)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"[CDC] polling {table} failed: {e}", file=sys.stderr)
+            return None
+        if change is None:
+            return None
+        for fn in fns:
+            try:
+                fn(change)
+                self._stats["notifications"] += 1
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"[CDC] listener for {table} failed: {e}", file=sys.stderr)
+        return change
+
+    def _full_refresh(self, table: str) -> None:
+        """
+        Once ``full_refresh_interval`` has passed (opt-in), re-roll all rollup
+        days of an inserts-only table, or reconcile a marked table's per-day
+        counts for rows edited before their day was first recorded.
+        """
+        if self.full_refresh_interval <= 0:
+            return
+        now = time.time()
+        if now - self._full_refreshed.get(table, 0.0) < self.full_refresh_interval:
+            return
+        try:
+            if table in self._inserts_only:
+                ROLLUPS.refresh_range(table, self.org_id)
+            else:
+                ROLLUPS.reconcile(table, self.org_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"[CDC] full re-roll of {table} failed: {e}", file=sys.stderr)
+            return
+        self._stats["full_refreshes"] += 1
+        self._full_refreshed[table] = now
+        conn = self._state()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO capture_refresh VALUES (?, ?, ?)", (table, self.org_id, now))
+
+    def _run(self) -> None:
+        self.poll_once()  # the first poll only establishes marks
+        while not self._stop.wait(self.interval):
+            self.poll_once()
+
+    def start(self) -> None:
+        """Start the background poller (no-op when the interval is 0 or it already runs)."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="change-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "full_refresh_interval": self.full_refresh_interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "marks": {table: {"column": column, "mark": mark} for table, (column, mark) in self._marks.items()},
+            "inserts_only": sorted(self._inserts_only),
+            **self._stats,
+        }
+
+
+def _seconds_from_env(name: str, default: float) -> float:
+    value = os.getenv(name)
+    try:
+        return float(value) if value and value.strip() else default
+    except ValueError:
+        return default
+
+
+CHANGE_CAPTURE = ChangeCapture(
+    org_id=2133,
+    state_path=ROLLUPS.path,
+    interval=_seconds_from_env("CHANGE_CAPTURE_INTERVAL", DEFAULT_INTERVAL_SECONDS),
+    full_refresh_interval=_seconds_from_env("CHANGE_CAPTURE_FULL_REFRESH_SECONDS", DEFAULT_FULL_REFRESH_SECONDS),
+)
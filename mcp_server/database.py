@@ -1,141 +1,469 @@
 # mcp_server/database.py
+import atexit
+import json
 import os
-import re
 import sys
+import threading
+import uuid
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
 from dotenv import load_dotenv
-from .audit_logger import log_sql
+from .sql_guard import fingerprint_sql, parse
+from .audit_logger import (
+    current_context,
+    log_db_query,
+    log_sql,
+    logs_interpolated_sql,
+    logs_raw_sql,
+    structured,
+)
 import time
-import inspect
 from datetime import datetime
 
 # Load .env file
 load_dotenv()
 
-_FORBIDDEN_KEYWORDS = (
-    "insert",
-    "update",
-    "delete",
-    "drop",
-    "alter",
-    "create",
-    "truncate",
-    "grant",
-    "revoke",
-    "merge",
-    "call",
-)
+def _ensure_read_only(sql: str) -> str:
+    """Ensure the provided SQL statement is read-only (SELECT/CTE); returns it without comments."""
+    statement = parse(sql)
+    if not statement.verdict.ok:
+        raise ValueError(statement.verdict.reason)
+    return statement.sanitized
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+# Server-side statement_timeout (ms) set on every pooled connection; 0 keeps the server default.
+STATEMENT_TIMEOUT_MS = _env_int("DATABASE_STATEMENT_TIMEOUT_MS", 0)
+# Reject custom queries whose EXPLAIN total cost is above this; 0 disables the check.
+CUSTOM_QUERY_MAX_COST = _env_float("CUSTOM_QUERY_MAX_COST", 0.0)
+# Rows per round trip when streaming from a server-side cursor.
+STREAM_BATCH_SIZE = _env_int("DATABASE_STREAM_BATCH_SIZE", 500)
+# JSON size budget for the rows of one custom query response.
+CUSTOM_QUERY_MAX_BYTES = _env_int("CUSTOM_QUERY_MAX_BYTES", 1024 * 1024)
+
+
+def statement_timeout_for(tool, default=None):
+    """
+    statement_timeout (ms) for one tool: ``DATABASE_STATEMENT_TIMEOUT_MS_<TOOL>``
+    (e.g. ``DATABASE_STATEMENT_TIMEOUT_MS_PR_RUN_CUSTOM_PR_QUERY``) when set,
+    otherwise ``default``. None leaves the connection's timeout in place.
+    """
+    if tool:
+        env_name = "DATABASE_STATEMENT_TIMEOUT_MS_" + tool.upper().replace(".", "_")
+        override = _env_int(env_name, -1)
+        if override >= 0:
+            return override
+    return default
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class QueryTimeout(Exception):
+    """Raised by :class:`QueryStream` when statement_timeout cancels the query."""
+
+    def __init__(self, timeout_ms):
+        super().__init__(f"Query cancelled: it ran longer than the {timeout_ms} ms statement timeout.")
+        self.timeout_ms = timeout_ms
+
+
+def _resolve_caller(caller, depth: int) -> str:
+    # The contextvar lookup and sys._getframe are O(1); inspect.stack() would
+    # read every frame's source.
+    caller_fn = caller or current_context().get("tool")
+    if caller_fn is None:
+        try:
+            caller_fn = sys._getframe(depth + 1).f_code.co_name
+        except Exception:
+            caller_fn = "unknown_caller"
+    return caller_fn
+
+
+def _log_params(params) -> tuple:
+    # Normalize params just for consistent logging (psycopg2 accepts None or seq)
+    if params is None:
+        return ()
+    if isinstance(params, (list, tuple)):
+        return tuple(params)
+    return (params,)
+
+
+def _print_statement(caller_fn: str, sql: str, log_params: tuple) -> None:
+    print("\n" + "=" * 80, file=sys.stderr, flush=True)
+    print(f"[DB] {datetime.now():%Y-%m-%d %H:%M:%S} | caller: {caller_fn}", file=sys.stderr, flush=True)
+    print("[DB] SQL:", sql.strip(), file=sys.stderr, flush=True)
+    if log_params:
+        print("[DB] Params:", log_params, file=sys.stderr, flush=True)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections shared by every tool in the process.
+
+    - Keeps at least ``min_size`` connections open and never more than ``max_size``.
+    - Idle connections above ``min_size`` are closed after ``idle_timeout`` seconds.
+    - Connections idle for longer than ``health_check_after`` seconds are pinged
+      with ``SELECT 1`` on checkout and replaced if the ping fails.
+    - With ``read_only`` every transaction is opened ``READ ONLY``, so the server
+      refuses writes even if a statement gets past the SQL validator.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        checkout_timeout: float = 30.0,
+        health_check_after: float = 30.0,
+        read_only: bool = False,
+        **connect_kwargs,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.read_only = read_only
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []  # list of (conn, last_used_monotonic); LIFO
+        self._size = 0  # idle + checked out + being opened
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {"created": 0, "recycled": 0, "checkouts": 0, "timeouts": 0}
 
+        for _ in range(self.min_size):
+            conn = self._open()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
 
-def _ensure_read_only(sql: str) -> None:
-    """Ensure the provided SQL statement is read-only (SELECT/CTE)."""
-    if not sql or not isinstance(sql, str):
-        raise ValueError("SQL must be a non-empty string.")
+    def _open(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        if self.read_only:
+            # psycopg2 then starts each transaction with BEGIN READ ONLY (no extra round trip).
+            conn.set_session(readonly=True)
+        with self._cond:
+            self._stats["created"] += 1
+        print("[DB] Connected to PostgreSQL (pooled connection opened)", file=sys.stderr, flush=True)
+        return conn
 
-    # Strip line and block comments
-    sanitized = re.sub(r"--.*?$", "", sql, flags=re.MULTILINE)
-    sanitized = re.sub(r"/\*.*?\*/", "", sanitized, flags=re.DOTALL)
-    stripped = sanitized.strip()
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _prune_idle_locked(self) -> list:
+        """Remove idle connections past ``idle_timeout``; caller closes them."""
+        if self.idle_timeout <= 0:
+            return []
+        now = time.monotonic()
+        expired = []
+        kept = []
+        # Oldest entries sit at the front of the LIFO list.
+        for conn, last_used in self._idle:
+            if (
+                self._size - len(expired) > self.min_size
+                and now - last_used > self.idle_timeout
+            ):
+                expired.append(conn)
+            else:
+                kept.append((conn, last_used))
+        if expired:
+            self._idle = kept
+            self._size -= len(expired)
+            self._stats["recycled"] += len(expired)
+        return expired
+
+    def getconn(self):
+        """Borrow a connection, blocking up to ``checkout_timeout`` seconds."""
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("connection pool is closed")
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        conn, last_used = None, None
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no database connection available after {self.checkout_timeout:g}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
 
-    if not stripped:
-        raise ValueError("SQL cannot be empty after removing comments.")
+        try:
+            if conn is not None:
+                idle_for = time.monotonic() - last_used
+                if conn.closed or (
+                    idle_for >= self.health_check_after and not self._is_alive(conn)
+                ):
+                    self._discard(conn)
+                    with self._cond:
+                        self._stats["recycled"] += 1
+                    conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
 
-    # Disallow multiple statements separated by semicolons (except optional trailing)
-    trailing_stripped = stripped.rstrip("; \n\t\r")
-    if ";" in trailing_stripped:
-        raise ValueError("Only single read-only statements are permitted.")
+        with self._cond:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+        return conn
 
-    # Accept statements that start with SELECT or WITH clauses (allow wrapping parens)
-    leading = stripped.lstrip("(").lstrip()
-    heading = leading[:5].lower()
-    if not (leading.lower().startswith("select") or leading.lower().startswith("with")):
-        raise ValueError("Only SELECT/CTE read queries are allowed.")
+    def putconn(self, conn, discard: bool = False) -> None:
+        """Return a borrowed connection; broken or discarded ones are closed."""
+        if not discard and not conn.closed:
+            try:
+                # Leave no open transaction (or SET LOCAL state) behind for the next borrower.
+                conn.rollback()
+            except Exception:
+                discard = True
 
-    lowered = stripped.lower()
-    for keyword in _FORBIDDEN_KEYWORDS:
-        if re.search(rf"\b{keyword}\b", lowered):
-            raise ValueError(f"Keyword '{keyword}' is not permitted in read-only mode.")
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                if not self._closed:
+                    self._stats["recycled"] += 1
+                to_close = [conn]
+            else:
+                self._idle.append((conn, time.monotonic()))
+                to_close = []
+            to_close.extend(self._prune_idle_locked())
+            self._cond.notify()
 
-    return stripped
+        for stale in to_close:
+            self._discard(stale)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                **self._stats,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it from the environment on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=_env_int("DATABASE_POOL_MIN_SIZE", 1),
+                    max_size=_env_int("DATABASE_POOL_MAX_SIZE", 10),
+                    idle_timeout=_env_float("DATABASE_POOL_IDLE_TIMEOUT", 300.0),
+                    checkout_timeout=_env_float("DATABASE_POOL_TIMEOUT", 30.0),
+                    health_check_after=_env_float("DATABASE_POOL_HEALTHCHECK_AFTER", 30.0),
+                    read_only=True,
+                    host=os.getenv("DATABASE_HOST"),
+                    port=int(os.getenv("DATABASE_PORT")),
+                    database=os.getenv("DATABASE_NAME"),
+                    user=os.getenv("DATABASE_USER"),
+                    password=os.getenv("DATABASE_PASSWORD"),
+                    **(
+                        {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+                        if STATEMENT_TIMEOUT_MS > 0
+                        else {}
+                    ),
+                )
+    return _pool
+
+
+def pool_stats() -> dict:
+    """Pool counters for monitoring; empty when no connection has been requested yet."""
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
+@atexit.register
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
 
 class Database:
     def __init__(self):
-        """Create connection when Database() is initialized"""
+        """Borrow a connection from the shared pool when Database() is initialized"""
         try:
-            self.conn = psycopg2.connect(
-                host=os.getenv("DATABASE_HOST"),
-                port=int(os.getenv("DATABASE_PORT")),
-                database=os.getenv("DATABASE_NAME"),
-                user=os.getenv("DATABASE_USER"),
-                password=os.getenv("DATABASE_PASSWORD")
-            )
-            print(" Connected to PostgreSQL!")
+            self._pool = get_pool()
+            self.conn = self._pool.getconn()
         except Exception as e:
-            print(f"Connection failed: {e}")
+            print(f"Connection failed: {e}", file=sys.stderr, flush=True)
             raise
-    def execute_query(self, sql: str, params=None) -> dict:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _set_statement_timeout(self, cursor, timeout_ms) -> None:
+        # SET LOCAL lasts until the transaction ends; the pool rolls back on return.
+        if timeout_ms is not None:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+
+    def execute_query(
+        self,
+        sql: str,
+        params=None,
+        caller: str | None = None,
+        timeout_ms: int | None = None,
+        columnar: bool = False,
+    ) -> dict:
         """
         Execute a SQL query and return results.
         Logs the statement, params, caller, and duration.
+        ``caller`` names the tool for the logs; by default it is the tool bound
+        by the tool executor, or the calling function's name.
+        ``timeout_ms`` is the statement_timeout for this query (see
+        :func:`statement_timeout_for`); a cancelled query returns
+        ``error_type="timeout"``.
+        Rows are dicts, or with ``columnar=True`` the driver's value tuples
+        alongside a single ``columns`` list (no per-row key copies).
         """
-        
 
+        sanitized_sql = sql
+        log_params = ()
+        caller_fn = None
+        timeout = None
+        start = time.time()
         try:
             # Ensure read-only & get sanitized SQL
             sanitized_sql = _ensure_read_only(sql)
 
-            # Who called me (e.g., get_pr_summary)
-            caller_fn = None
-            try:
-                caller_fn = inspect.stack()[1].function
-            except Exception:
-                caller_fn = "unknown_caller"
-
-            # Normalize params just for consistent logging (psycopg2 accepts None or seq)
-            # inside execute_query before log_params
-            if params is None:
-                log_params = ()
-            elif isinstance(params, (list, tuple)):
-                log_params = tuple(params)
-            else:
-                log_params = (params,)
+            # Who called me (e.g., pr.get_pr_summary)
+            caller_fn = _resolve_caller(caller, 1)
+            timeout = statement_timeout_for(caller_fn, timeout_ms)
+            log_params = _log_params(params)
 
             # ---- Logging: start ----
             start = time.time()
-            print("\n" + "=" * 80, file=sys.stderr, flush=True)
-            print(f"[DB] {datetime.now():%Y-%m-%d %H:%M:%S} | caller: {caller_fn}", file=sys.stderr, flush=True)
-            print("[DB] SQL:", sanitized_sql.strip(), file=sys.stderr, flush=True)
-            if log_params:
-                print("[DB] Params:", log_params, file=sys.stderr, flush=True)
-            log_sql(sanitized_sql.strip())
+            _print_statement(caller_fn, sanitized_sql, log_params)
+            # AUDIT_SQL_MODE picks the raw statement, the interpolated one, or both.
+            # The jsonl format records each statement once, with timings, below.
+            text_sql_log = not structured()
+            if text_sql_log and logs_raw_sql():
+                log_sql(sanitized_sql)
             # ---- Logging: start ----
 
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+            # Plain tuple cursor: each row is turned into a dict once, below,
+            # instead of a RealDictRow that is then copied again.
+            cursor = self.conn.cursor()
+            self._set_statement_timeout(cursor, timeout)
 
             # Execute the **sanitized** SQL (not the original)
             if params is not None:
                 cursor.execute(sanitized_sql, params)
-                try:
-                    interpolated = cursor.mogrify(sanitized_sql, params).decode()
-                    log_sql(interpolated)
-                except Exception:
-                    pass
+                if text_sql_log and logs_interpolated_sql():
+                    try:
+                        interpolated = cursor.mogrify(sanitized_sql, params).decode()
+                        log_sql(interpolated)
+                    except Exception:
+                        pass
             else:
                 cursor.execute(sanitized_sql)
-                log_sql(sanitized_sql)
+                if text_sql_log and not logs_raw_sql():
+                    log_sql(sanitized_sql)
 
             rows = cursor.fetchall()
+            columns = [col[0] for col in cursor.description or ()]
             cursor.close()
 
             elapsed_ms = (time.time() - start) * 1000.0
             print(f"[DB] OK: {len(rows)} rows in {elapsed_ms:.2f} ms", file=sys.stderr, flush=True)
             print("=" * 80 + "\n", file=sys.stderr, flush=True)
+            log_db_query(
+                tool=caller_fn,
+                fingerprint=fingerprint_sql(sanitized_sql),
+                sql=sanitized_sql,
+                params=log_params,
+                elapsed_ms=elapsed_ms,
+                rows=len(rows),
+            )
 
+            if columnar:
+                return {"success": True, "columns": columns, "rows": rows, "count": len(rows)}
             return {
                 "success": True,
-                "rows": [dict(row) for row in rows],
+                "rows": [dict(zip(columns, row)) for row in rows],
                 "count": len(rows),
             }
 
@@ -143,10 +471,282 @@ class Database:
             # Log the error too
             print(f"[DB] ERROR: {e}", file=sys.stderr, flush=True)
             print("=" * 80 + "\n", file=sys.stderr, flush=True)
+            log_db_query(
+                tool=caller_fn,
+                fingerprint=fingerprint_sql(sanitized_sql) if isinstance(sanitized_sql, str) else "",
+                sql=sanitized_sql if isinstance(sanitized_sql, str) else repr(sanitized_sql),
+                params=log_params,
+                elapsed_ms=(time.time() - start) * 1000.0,
+                rows=None,
+                error=str(e),
+            )
+            try:
+                # Clear the aborted transaction so the pooled connection stays usable.
+                self.conn.rollback()
+            except Exception:
+                pass
+            if isinstance(e, psycopg2.errors.QueryCanceled):
+                limit_ms = timeout if timeout is not None else STATEMENT_TIMEOUT_MS
+                return {
+                    "success": False,
+                    "error": str(QueryTimeout(limit_ms)),
+                    "error_type": "timeout",
+                    "timeout_ms": limit_ms,
+                }
             return {"success": False, "error": str(e)}
 
+    def stream_query(
+        self,
+        sql: str,
+        params=None,
+        caller: str | None = None,
+        timeout_ms: int | None = None,
+        batch_size: int | None = None,
+        max_rows: int | None = None,
+        max_bytes: int | None = None,
+    ) -> "QueryStream":
+        """
+        Run a read-only query on a named (server-side) cursor and return a
+        :class:`QueryStream` that yields its rows as dicts, ``batch_size`` at
+        a time, stopping at ``max_rows`` rows or ``max_bytes`` of JSON.
+        Raises ValueError for rejected SQL and :class:`QueryTimeout` when the
+        statement is cancelled; other database errors propagate.
+        """
+        return QueryStream(
+            self,
+            sql,
+            params,
+            caller=_resolve_caller(caller, 1),
+            timeout_ms=timeout_ms,
+            batch_size=batch_size or STREAM_BATCH_SIZE,
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+        )
+
+    def run_streamed(
+        self,
+        sql: str,
+        params=None,
+        caller: str | None = None,
+        timeout_ms: int | None = None,
+        max_rows: int | None = None,
+        max_bytes: int | None = None,
+    ) -> dict:
+        """
+        :meth:`stream_query` collected into a response: ``{"rows", "rowcount"}``
+        plus ``"truncated"`` when ``max_rows`` or ``max_bytes`` (default
+        CUSTOM_QUERY_MAX_BYTES) cut it short. A cancelled query returns
+        ``error_type="timeout"``; other database errors stay opaque.
+        """
+        try:
+            with self.stream_query(
+                sql,
+                params=params,
+                caller=_resolve_caller(caller, 1),
+                timeout_ms=timeout_ms,
+                max_rows=max_rows,
+                max_bytes=CUSTOM_QUERY_MAX_BYTES if max_bytes is None else max_bytes,
+            ) as stream:
+                rows = list(stream)
+        except QueryTimeout as e:
+            return {"success": False, "error": str(e), "error_type": "timeout", "timeout_ms": e.timeout_ms}
+        except Exception:
+            return {"success": False, "error": "Query execution failed (internal error)."}
+        payload = {"rows": rows, "rowcount": len(rows)}
+        if stream.truncated:
+            payload["truncated"] = stream.truncated
+        return {"success": True, "data": payload}
+
+    def explain_cost(self, sql: str, params=None, timeout_ms: int | None = None):
+        """
+        Planner's total cost estimate for a read-only query, from
+        ``EXPLAIN (FORMAT JSON)`` (the query itself is not run).
+        Returns None if the statement cannot be planned.
+        """
+        try:
+            sanitized_sql = _ensure_read_only(sql)
+            timeout = statement_timeout_for(current_context().get("tool"), timeout_ms)
+            with self.conn.cursor() as cursor:
+                self._set_statement_timeout(cursor, timeout)
+                explain_sql = "EXPLAIN (FORMAT JSON) " + sanitized_sql
+                if params is not None:
+                    cursor.execute(explain_sql, params)
+                else:
+                    cursor.execute(explain_sql)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            cost = float(plan[0]["Plan"]["Total Cost"])
+            print(f"[DB] EXPLAIN total cost: {cost:.0f}", file=sys.stderr, flush=True)
+            return cost
+        except Exception as e:
+            print(f"[DB] EXPLAIN failed: {e}", file=sys.stderr, flush=True)
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+            return None
+
+    def check_cost(self, sql: str, params=None, timeout_ms: int | None = None, max_cost: float | None = None):
+        """
+        Error response (``error_type="cost"``) if EXPLAIN puts ``sql`` above
+        ``max_cost`` (default CUSTOM_QUERY_MAX_COST; 0 disables the check),
+        otherwise None. A statement that cannot be planned is an error too.
+        """
+        limit = CUSTOM_QUERY_MAX_COST if max_cost is None else max_cost
+        if limit <= 0:
+            return None
+        cost = self.explain_cost(sql, params=params, timeout_ms=timeout_ms)
+        if cost is None:
+            return {"success": False, "error": "Query execution failed (internal error)."}
+        if cost > limit:
+            return {
+                "success": False,
+                "error": (
+                    f"Query rejected: estimated cost {cost:.0f} is above the limit of {limit:.0f}. "
+                    "Add filters (e.g. a narrower date range) or aggregate in SQL."
+                ),
+                "error_type": "cost",
+                "estimated_cost": round(cost),
+            }
+        return None
+
     def close(self):
-        """Close the database connection"""
-        self.conn.close()
-        print(" Database connection closed")
-    
+        """Return the connection to the shared pool"""
+        if self.conn is None:
+            return
+        conn, self.conn = self.conn, None
+        self._pool.putconn(conn)
+
+
+
+class QueryStream:
+    """
+    Rows of one query, fetched from a named (server-side) cursor with
+    ``fetchmany`` so only one batch is held in memory at a time.
+
+    Iteration yields dicts and stops after ``max_rows`` rows, or before the
+    row that would take the JSON size of the rows yielded past ``max_bytes``
+    (the first row is always yielded). ``truncated`` is then ``"rows"`` or
+    ``"bytes"``; it is only set if more rows were actually available.
+    Use it as a context manager, or call :meth:`close`, when the rows may not
+    all be consumed.
+    """
+
+    def __init__(self, db, sql, params, caller, timeout_ms, batch_size, max_rows, max_bytes):
+        self.batch_size = max(1, int(batch_size))
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.columns: list = []
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = None
+        self._db = db
+        self._caller = caller
+        self._cursor = None
+        self._closed = False
+        self._sql = _ensure_read_only(sql)
+        self._params = _log_params(params)
+        self._timeout = statement_timeout_for(caller, timeout_ms)
+
+        self._start = time.time()
+        _print_statement(caller, self._sql, self._params)
+        if not structured() and (logs_raw_sql() or logs_interpolated_sql()):
+            log_sql(self._sql)
+        try:
+            with db.conn.cursor() as setup:
+                db._set_statement_timeout(setup, self._timeout)
+            self._cursor = db.conn.cursor(name=f"stream_{uuid.uuid4().hex[:12]}")
+            if params is not None:
+                self._cursor.execute(self._sql, params)
+            else:
+                self._cursor.execute(self._sql)
+        except Exception as e:
+            self._fail(e)
+        self._rows = self._iterate()
+
+    def __iter__(self):
+        return self._rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _iterate(self):
+        try:
+            while True:
+                try:
+                    batch = self._cursor.fetchmany(self.batch_size)
+                except Exception as e:
+                    self._fail(e)
+                if not self.columns and self._cursor.description:
+                    self.columns = [col[0] for col in self._cursor.description]
+                if not batch:
+                    return
+                for values in batch:
+                    if self.max_rows is not None and self.row_count >= self.max_rows:
+                        self.truncated = "rows"
+                        return
+                    row = dict(zip(self.columns, values))
+                    if self.max_bytes is not None:
+                        size = len(json.dumps(row, default=str))
+                        if self.row_count and self.byte_count + size > self.max_bytes:
+                            self.truncated = "bytes"
+                            return
+                        self.byte_count += size
+                    self.row_count += 1
+                    yield row
+        finally:
+            self.close()
+
+    def _close_cursor(self) -> None:
+        self._closed = True
+        if self._cursor is not None:
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+
+    def _fail(self, error: Exception):
+        """Log, reset the connection and re-raise ``error`` (timeouts as QueryTimeout)."""
+        self._close_cursor()
+        elapsed_ms = (time.time() - self._start) * 1000.0
+        print(f"[DB] ERROR: {error}", file=sys.stderr, flush=True)
+        print("=" * 80 + "\n", file=sys.stderr, flush=True)
+        log_db_query(
+            tool=self._caller,
+            fingerprint=fingerprint_sql(self._sql),
+            sql=self._sql,
+            params=self._params,
+            elapsed_ms=elapsed_ms,
+            rows=None,
+            error=str(error),
+        )
+        try:
+            self._db.conn.rollback()
+        except Exception:
+            pass
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            raise QueryTimeout(self._timeout if self._timeout is not None else STATEMENT_TIMEOUT_MS) from error
+        raise error
+
+    def close(self) -> None:
+        """Close the server-side cursor; safe to call more than once."""
+        if self._closed:
+            return
+        self._close_cursor()
+        elapsed_ms = (time.time() - self._start) * 1000.0
+        note = f" (truncated by {self.truncated})" if self.truncated else ""
+        print(f"[DB] OK: streamed {self.row_count} rows in {elapsed_ms:.2f} ms{note}", file=sys.stderr, flush=True)
+        print("=" * 80 + "\n", file=sys.stderr, flush=True)
+        log_db_query(
+            tool=self._caller,
+            fingerprint=fingerprint_sql(self._sql),
+            sql=self._sql,
+            params=self._params,
+            elapsed_ms=elapsed_ms,
+            rows=self.row_count,
+        )
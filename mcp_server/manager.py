@@ -1,14 +1,82 @@
 import asyncio
+import os
 import sys
+import time
 from pathlib import Path
-from contextlib import AsyncExitStack
+from typing import AsyncIterator, List, Set
+from contextlib import AsyncExitStack, asynccontextmanager
 from agents import Agent, Runner
-from agents.mcp import MCPServerStdio
+from agents.mcp import MCPServerStdio, create_static_tool_filter
 from dotenv import load_dotenv
 from manager_instructions import MANAGER_AGENT_INSTRUCTIONS
 from audit_logger import log_agent_start, log_user_query
 
 
+def _env_number(name: str, default, cast=int):
+    """Read a positive number from the environment, falling back to ``default`` when unset or invalid."""
+    value = os.getenv(name)
+    if value and value.strip():
+        try:
+            number = cast(value)
+        except ValueError:
+            return default
+        if number > 0:
+            return number
+    return default
+
+
+def _mcp_server(module: str, project_root: Path) -> MCPServerStdio:
+    return MCPServerStdio(
+        params={
+            "command": sys.executable,
+            "args": ["-m", module],
+            "cwd": str(project_root),
+            # Only these variables reach the child, so pass the whole (.env-loaded) environment.
+            "env": {**os.environ, "AUDIT_AGENT_NAME": "manager_agent"},
+        },
+        # The tool lists do not change while the servers run; fetch them once.
+        cache_tools_list=True,
+        # warm_up is called by the manager itself at startup, never by the agent.
+        tool_filter=create_static_tool_filter(blocked_tool_names=["warm_up"]),
+        # Per-request timeout, including the warm-up wait at startup (read after .env is loaded).
+        client_session_timeout_seconds=_env_number("MCP_CLIENT_TIMEOUT_SECONDS", 30.0, float),
+    )
+
+
+async def _warm_up(label: str, server: MCPServerStdio) -> None:
+    try:
+        await server.call_tool("warm_up", {})
+    except Exception as e:
+        # A cold server still works; its first tool call just pays for the connection.
+        print(f"[manager] {label} server warm-up failed: {e}", file=sys.stderr, flush=True)
+
+
+@asynccontextmanager
+async def _running(*servers: MCPServerStdio) -> AsyncIterator[List[MCPServerStdio]]:
+    """Start the servers' subprocesses concurrently and stop them all on exit."""
+    # anyio cancel scopes must be exited by the task that entered them, so each
+    # server is entered and exited inside its own task.
+    loop = asyncio.get_running_loop()
+    ready = [loop.create_future() for _ in servers]
+    stop = asyncio.Event()
+
+    async def serve(server: MCPServerStdio, started: asyncio.Future) -> None:
+        try:
+            async with server:
+                started.set_result(server)
+                await stop.wait()
+        except BaseException as e:
+            if not started.done():
+                started.set_exception(e)
+            raise
+
+    tasks = [asyncio.create_task(serve(server, started)) for server, started in zip(servers, ready)]
+    try:
+        yield list(await asyncio.gather(*ready))
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 
 def main() -> None:
     asyncio.run(run())
@@ -22,24 +90,27 @@ async def run() -> None:
     project_root = base_dir.parent
 
     async with AsyncExitStack() as stack:
-        pr_server = await stack.enter_async_context(
-            MCPServerStdio(
-                params={
-                    "command": sys.executable,
-                    "args": ["-m", "mcp_server.up_pr_server"],
-                    "cwd": str(project_root),
-                },
+        # Both subprocesses start at once, and each opens its pool and loads the
+        # schema on a background thread as soon as it starts, so that work overlaps.
+        started = time.perf_counter()
+        pr_server, commit_server = await stack.enter_async_context(
+            _running(
+                _mcp_server("mcp_server.up_pr_server", project_root),
+                _mcp_server("mcp_server.up_commit_server", project_root),
             )
         )
-
-        commit_server = await stack.enter_async_context(
-            MCPServerStdio(
-                params={
-                    "command": sys.executable,
-                    "args": ["-m", "mcp_server.up_commit_server"],
-                    "cwd": str(project_root),
-                },
-            )
+        launched = time.perf_counter()
+        await asyncio.gather(
+            _warm_up("PR", pr_server),
+            _warm_up("commit", commit_server),
+            pr_server.list_tools(),
+            commit_server.list_tools(),
+        )
+        print(
+            f"[manager] MCP servers launched in {launched - started:.2f}s, "
+            f"ready in {time.perf_counter() - started:.2f}s",
+            file=sys.stderr,
+            flush=True,
         )
 
         manager_agent = Agent(
@@ -51,32 +122,61 @@ async def run() -> None:
 
         log_agent_start("manager_agent")
 
-        async def handle_prompt(prompt: str) -> None:
-            log_user_query("manager_agent", prompt)
-            result = await Runner.run(manager_agent, prompt)
+        # Prompts run as tasks against the shared MCP servers; the semaphore bounds
+        # how many agent runs (and so concurrent tool calls) are in flight at once.
+        slots = asyncio.Semaphore(_env_number("MANAGER_MAX_CONCURRENT_PROMPTS", 4))
+
+        async def handle_prompt(prompt: str) -> List[str]:
+            async with slots:
+                log_user_query("manager_agent", prompt)
+                try:
+                    result = await Runner.run(manager_agent, prompt)
+                except Exception as e:
+                    return [f"Error: {e}"]
+            lines = []
             if result.final_output:
-                print(result.final_output)
+                lines.append(str(result.final_output))
             if getattr(result, "new_messages", None):
                 for message in result.new_messages:
                     if message.content:
-                        print(f"- {message.content}")
+                        lines.append(f"- {message.content}")
+            return lines
 
         initial_prompts = []
         if len(sys.argv) > 1:
             initial_prompts.append(" ".join(sys.argv[1:]))
         elif sys.stdin and not sys.stdin.isatty():
-            buffered = sys.stdin.read().strip()
-            if buffered:
-                initial_prompts.append(buffered)
+            piped = sys.stdin.read()
+            if os.getenv("MANAGER_STDIN_BATCH", "").strip().lower() in {"1", "true", "yes"}:
+                # Opt-in batch mode: one prompt per non-empty line.
+                initial_prompts.extend(line.strip() for line in piped.splitlines() if line.strip())
+            elif piped.strip():
+                initial_prompts.append(piped.strip())
 
         if initial_prompts:
-            for prompt in initial_prompts:
-                await handle_prompt(prompt)
+            tasks = [asyncio.create_task(handle_prompt(prompt)) for prompt in initial_prompts]
+            # All run at once; answers are printed in the order the prompts were given.
+            for number, task in enumerate(tasks, start=1):
+                lines = await task
+                if len(tasks) > 1:
+                    print(f"[{number}] {initial_prompts[number - 1]}")
+                print("\n".join(lines))
             return
 
+        pending: Set[asyncio.Task] = set()
+
+        async def answer(number: int, prompt: str) -> None:
+            # Interactive answers arrive as they finish, tagged with the prompt's number.
+            lines = await handle_prompt(prompt)
+            print(f"\n[{number}] " + "\n".join(lines or ["(no output)"]), flush=True)
+
+        number = 0
         while True:
             try:
-                user_prompt = input("How can I help with your PR/commit metrics? (type 'exit' to quit) ").strip()
+                # Read on a thread so running prompts keep making progress while we wait.
+                user_prompt = (
+                    await asyncio.to_thread(input, "How can I help with your PR/commit metrics? (type 'exit' to quit) ")
+                ).strip()
             except EOFError:
                 break
 
@@ -84,11 +184,19 @@ async def run() -> None:
                 continue
 
             if user_prompt.lower() in {"exit", "quit", "q"}:
-                print("Exiting manager. Goodbye!")
+                if pending:
+                    print(f"Waiting for {len(pending)} running prompt(s)...")
                 break
 
-            await handle_prompt(user_prompt)
+            number += 1
+            print(f"[{number}] queued", flush=True)
+            task = asyncio.create_task(answer(number, user_prompt))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
 
+        if pending:
+            await asyncio.gather(*pending)
+        print("Exiting manager. Goodbye!")
 
 if __name__ == "__main__":
     main()
@@ -14,12 +14,19 @@ PR SERVER TOOLS (use for pull request data):
 - get_review_time(pr_id: int) → review time metrics
 - get_cycle_time(pr_id: int) → cycle time metrics
 - get_churn_metrics(pr_id: int) → code churn metrics
+- get_pr_metrics(pr_id: int, fields: list) → cycle time, review time, churn (and optionally the full record) of one PR in one call; use instead of calling the three metric tools separately
+- get_pr_summary_batch / get_cycle_time_batch / get_review_time_batch / get_churn_metrics_batch (pr_ids: list[int]) → the same for up to 100 PRs in one call, keyed by PR id
+- get_pr_aggregates(period: str, metric: str, stats: list, group_by: str) → count/avg/percentiles/histogram of a PR metric over a period, optionally per author, repo, branch, state or day
+- get_pr_trend(period: str, bucket: str) → per day/week/month PR count, lines added/removed and median cycle time, gaps zero-filled
 - run_custom_pr_query(sql: str, params: list) → custom PR queries
 
 COMMIT SERVER TOOLS (use for commit data):
 - get_table_schema(table_name: str) → use with table_name="commit"
 - get_commit_summary(commit_id: int) → full commit details
-- get_commits_period(period: str, offset: int) → list of commits (50 at a time)
+- get_commit_summary_batch(commit_ids: list[int]) → up to 100 commits in one call, keyed by commit id
+- get_commit_aggregates(period: str, metric: str, stats: list, group_by: str) → count/sum/avg/percentiles/histogram of commit line counts over a period, optionally per author, repo, branch or day
+- get_commit_trend(period: str, bucket: str) → per day/week/month commit count and lines added/removed, gaps zero-filled
+- get_commits_period(period: str, offset: int, cursor: str) → list of commits (50 at a time)
 - run_custom_commit_query(sql: str, params: list) → custom commit queries
 
 ═══════════════════════════════════════════════════════════════════════════════
@@ -125,7 +132,8 @@ SAFETY RULES
 
 3. PAGINATION:
    - All tools return max 50 rows per call
-   - For more results, use offset parameter (0, 50, 100, 150...)
+   - For more results, pass the previous response's next_cursor as the cursor parameter
+     (offset 0, 50, 100... still works but is slower on deep pages)
    - Tell user: "Showing 1-50. Type 'more' for next batch."
 
 4. ERROR HANDLING:
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+
+def _iso(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(kind: str, **state: Any) -> str:
+    """
+    Build an opaque continuation token for a keyset-paginated listing.
+
+    ``state`` holds everything needed to resume: the pinned window, the sort
+    key of the last row returned, the running position and the total.
+    """
+    payload = {"k": kind}
+    payload.update({key: _iso(value) for key, value in state.items()})
+    raw = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, kind: str) -> Dict[str, Any]:
+    """Decode a token produced by :func:`encode_cursor`; raises ValueError if invalid."""
+    if not isinstance(token, str) or not token.strip():
+        raise ValueError("cursor must be a non-empty string")
+    padded = token.strip() + "=" * (-len(token.strip()) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise ValueError("cursor is malformed; restart the listing without a cursor")
+    if not isinstance(payload, dict) or payload.get("k") != kind:
+        raise ValueError("cursor does not belong to this listing")
+    after = payload.get("after")
+    if not isinstance(after, list) or len(after) != 2 or not payload.get("start") or not payload.get("end"):
+        raise ValueError("cursor is malformed; restart the listing without a cursor")
+    return payload
+
+
+def next_cursor(
+    kind: str,
+    rows: list,
+    limit: int,
+    position: int,
+    total: Optional[int],
+    sort_key: str,
+    id_key: str,
+    columns: Optional[List[str]] = None,
+    **state: Any,
+) -> Optional[str]:
+    """
+    Return the cursor for the page after ``rows``, or None when the listing is exhausted.
+    ``rows`` are dicts, or value sequences described by ``columns``.
+    """
+    if not rows or len(rows) < limit:
+        return None
+    if total is not None and position >= total:
+        return None
+    last = rows[-1] if columns is None else dict(zip(columns, rows[-1]))
+    return encode_cursor(
+        kind,
+        after=[_iso(last.get(sort_key)), last.get(id_key)],
+        n=position,
+        t=total,
+        **state,
+    )
+
+
+def pop_total_count(rows: List[Dict[str, Any]]) -> Optional[int]:
+    """Strip the ``total_count`` window column (``COUNT(*) OVER ()``) from each row and return its value."""
+    total = None
+    for row in rows:
+        total = row.pop("total_count", total)
+    return total
+
+
+def split_total_count(columns: list, rows: list):
+    """Columnar counterpart of :func:`pop_total_count`: returns (columns, rows, total)."""
+    if "total_count" not in columns:
+        return columns, rows, None
+    index = columns.index("total_count")
+    total = rows[-1][index] if rows else None
+    rows = [row[:index] + row[index + 1:] for row in rows]
+    return columns[:index] + columns[index + 1:], rows, total
+
+
+def normalize_ids(ids: Any, name: str, max_ids: int) -> List[int]:
+    """Validate and de-duplicate the ids of a batch call (at most ``max_ids``); raises ValueError."""
+    if isinstance(ids, (int, str)):
+        ids = [ids]
+    if not isinstance(ids, (list, tuple)) or not ids:
+        raise ValueError(f"{name} must be a non-empty list of ids")
+    normalized = []
+    for value in ids:
+        try:
+            normalized.append(int(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} contains a non-integer id: {value!r}")
+    normalized = list(dict.fromkeys(normalized))
+    if len(normalized) > max_ids:
+        raise ValueError(f"at most {max_ids} {name} per call (got {len(normalized)})")
+    return normalized
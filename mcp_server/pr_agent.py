@@ -1,7 +1,8 @@
 from pathlib import Path
 from agents import Agent, Runner
-from agents.mcp import MCPServerStdio
+from agents.mcp import MCPServerStdio, create_static_tool_filter
 from dotenv import load_dotenv
+import os
 import sys
 import asyncio
 from agents.extensions.visualization import draw_graph
@@ -23,7 +24,10 @@ async def run() -> None:
             "command": sys.executable,
             "args": ["-m", "mcp_server.up_pr_server"],
             "cwd": str(project_root),
+            "env": {**os.environ, "AUDIT_AGENT_NAME": "pr_agent"},
         },
+        # warm_up is internal to the manager's startup; keep it out of the agent's tools.
+        tool_filter=create_static_tool_filter(blocked_tool_names=["warm_up"]),
     ) as server:
         log_agent_start("pr_agent")
 
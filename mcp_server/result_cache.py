@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from .audit_logger import log_tool_call
+from .time_filter import get_time_range
+
+DEFAULT_TTL_SECONDS = 60.0
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class ResultCache:
+    """
+    In-process LRU cache for tool results with per-entry TTLs.
+
+    Memory is bounded both by entry count and by the approximate JSON size of
+    the cached payloads; the least recently used entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        enabled: bool = True,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "bypasses": 0}
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            expires_at, size, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._bytes -= size
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        try:
+            size = len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Drop every entry (or those whose key matches ``predicate``); returns the count removed."""
+        with self._lock:
+            if predicate is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            doomed = [key for key in self._entries if predicate(key)]
+            for key in doomed:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                **self._stats,
+            }
+
+
+RESULT_CACHE = ResultCache(
+    max_entries=int(_env_number("RESULT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    max_bytes=int(_env_number("RESULT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    enabled=os.getenv("RESULT_CACHE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"},
+)
+
+
+def _normalize(name: str, value: Any) -> Hashable:
+    if isinstance(value, str):
+        value = value.strip()
+        return value.lower() if name == "period" else value
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(name, item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(k, v)) for k, v in value.items()))
+    return value
+
+
+def _window_bucket(period: Any, ttl: float) -> Hashable:
+    """Resolve ``period`` and bucket its boundaries to the TTL so rolling windows roll over."""
+    start, end = get_time_range(period)
+    step = max(ttl, 1.0)
+    return int(start.timestamp() // step), int(end.timestamp() // step)
+
+
+def invalidate_changed(prefix: str, ids: Iterable[Any]) -> int:
+    """
+    Drop the cached results of ``prefix`` tools (e.g. ``"commit."``) that rows
+    with the given ids can affect: every period-windowed entry, plus entries
+    whose ``*_id`` / ``*_ids`` arguments name one of ``ids``. Returns the count removed.
+    """
+    changed = {str(value) for value in ids}
+
+    def affected(key: Hashable) -> bool:
+        tool, arguments, window = key
+        if not tool.startswith(prefix):
+            return False
+        if window is not None:
+            return True
+        for name, value in arguments:
+            if name.endswith("_id") and str(value) in changed:
+                return True
+            if name.endswith("_ids") and isinstance(value, tuple) and changed.intersection(map(str, value)):
+                return True
+        return False
+
+    return RESULT_CACHE.invalidate(affected)
+
+
+def cached(tool_name: str, ttl: float = DEFAULT_TTL_SECONDS) -> Callable:
+    """
+    Cache successful results of a read-only tool function.
+
+    The key is (tool, normalized arguments, resolved time window bucket).
+    Callers can pass ``bypass_cache=True`` to force a fresh query; the fresh
+    result still refreshes the cache. The TTL can be overridden per tool with
+    ``RESULT_CACHE_TTL_<TOOL>`` (e.g. ``RESULT_CACHE_TTL_PR_GET_PR_SUMMARY``).
+    """
+    env_name = "RESULT_CACHE_TTL_" + tool_name.upper().replace(".", "_")
+    ttl = _env_number(env_name, ttl)
+
+    def decorator(fn: Callable[..., Dict]) -> Callable[..., Dict]:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, bypass_cache: bool = False, **kwargs: Any) -> Dict:
+            if not RESULT_CACHE.enabled or ttl <= 0:
+                return fn(*args, **kwargs)
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = tuple(
+                    (name, _normalize(name, value)) for name, value in bound.arguments.items()
+                )
+                window = _window_bucket(bound.arguments["period"], ttl) if "period" in bound.arguments else None
+                key = (tool_name, arguments, window)
+                hash(key)
+            except Exception:
+                # Unbindable or unhashable arguments: let the tool report the problem.
+                return fn(*args, **kwargs)
+
+            if bypass_cache:
+                RESULT_CACHE.record_bypass()
+            else:
+                hit, value = RESULT_CACHE.get(key)
+                if hit:
+                    log_tool_call(tool_name, cache="hit")
+                    return value
+
+            result = fn(*args, **kwargs)
+            if isinstance(result, dict) and result.get("success"):
+                RESULT_CACHE.set(key, result, ttl)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .database import Database
+from .schema_cache import SCHEMA_CACHE
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / "data" / "rollups.sqlite3"
+DEFAULT_REFRESH_DAYS = 7
+DEFAULT_REFRESH_SECONDS = 3600.0
+
+
+class RollupSource(NamedTuple):
+    table: str  # table in the insightly schema
+    time_column: str  # timestamp the rows are bucketed by (UTC days)
+    repo_columns: Tuple[str, ...]  # candidate repo columns, first existing wins
+    author_column: str
+
+
+SOURCES = {
+    "commit": RollupSource("commit", "date", ("repoid", "repositoryid"), "authorid"),
+    "pull_request": RollupSource("pull_request", "createdon", ("repositoryid", "repoid"), "authorid"),
+}
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+class RollupStore:
+    """
+    Per-day, per-repo, per-author counts and line sums in a local SQLite file.
+
+    Each source covers a contiguous range of whole UTC days
+    ``[from_day, through_day)``. The range is grown on demand: backwards when
+    a period starts before it, forwards (up to yesterday) once a day has
+    closed, each time with one GROUP BY query over only the missing days.
+    Today is never rolled up; :meth:`count` reads the whole days in a period
+    from the store and counts the partial first and last days (the live
+    tail) from the raw table.
+
+    Closed days can still change (late inserts, edited rows), so the last
+    ``horizon_days`` rolled-up days are re-rolled whenever they are older
+    than ``horizon_seconds``, whether or not change capture is running.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_DB_PATH,
+        enabled: bool = True,
+        horizon_days: int = DEFAULT_REFRESH_DAYS,
+        horizon_seconds: float = DEFAULT_REFRESH_SECONDS,
+    ):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.horizon_days = horizon_days
+        self.horizon_seconds = horizon_seconds
+        self._refreshed: Dict[Tuple[str, int], float] = {}  # (source, org) -> monotonic time
+        # Last covered range seen per (source, org); lets stats() report without the build lock.
+        self._ranges: Dict[Tuple[str, int], Tuple[date, date]] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {"hits": 0, "fallbacks": 0, "builds": 0, "days_built": 0, "refreshes": 0, "errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # The PR and commit servers are separate processes sharing the file.
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS daily_rollup (
+                    source TEXT NOT NULL,
+                    org_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    repo TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    lines_added INTEGER NOT NULL,
+                    lines_removed INTEGER NOT NULL,
+                    PRIMARY KEY (source, org_id, day, repo, author)
+                );
+                CREATE TABLE IF NOT EXISTS rollup_range (
+                    source TEXT NOT NULL,
+                    org_id INTEGER NOT NULL,
+                    from_day TEXT NOT NULL,
+                    through_day TEXT NOT NULL,
+                    PRIMARY KEY (source, org_id)
+                );
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def _range(self, conn: sqlite3.Connection, source: str, org_id: int) -> Optional[Tuple[date, date]]:
+        row = conn.execute(
+            "SELECT from_day, through_day FROM rollup_range WHERE source = ? AND org_id = ?",
+            (source, org_id),
+        ).fetchone()
+        if row is None:
+            self._ranges.pop((source, org_id), None)
+            return None
+        covered = date.fromisoformat(row[0]), date.fromisoformat(row[1])
+        self._ranges[(source, org_id)] = covered
+        return covered
+
+    def _build(self, conn: sqlite3.Connection, source: str, org_id: int, first: date, stop: date) -> None:
+        """Roll up the days ``[first, stop)`` from the raw table, replacing what was there."""
+        spec = SOURCES[source]
+        columns = SCHEMA_CACHE.column_names(spec.table)
+        repo = next((column for column in spec.repo_columns if column in columns), None)
+        sql = f"""
+        SELECT
+            FLOOR(EXTRACT(EPOCH FROM {spec.time_column}) / 86400)::int AS day_number,
+            {repo or "NULL"} AS repo,
+            {spec.author_column} AS author,
+            COUNT(*) AS count,
+            COALESCE(SUM(linesadded), 0) AS lines_added,
+            COALESCE(SUM(linesremoved), 0) AS lines_removed
+        FROM insightly.{spec.table}
+        WHERE organizationid = %s
+          AND {spec.time_column} >= %s AND {spec.time_column} < %s
+        GROUP BY 1, 2, 3
+        """
+        db = Database()
+        try:
+            res = db.execute_query(
+                sql,
+                params=(org_id, _day_start(first).isoformat(), _day_start(stop).isoformat()),
+                columnar=True,
+            )
+        finally:
+            db.close()
+        if not res["success"]:
+            raise RuntimeError(res.get("error") or "rollup query failed")
+
+        epoch = date(1970, 1, 1)
+        rows = [
+            (
+                source,
+                org_id,
+                (epoch + timedelta(days=int(day_number))).isoformat(),
+                "" if repo_id is None else str(repo_id),
+                "" if author is None else str(author),
+                int(count),
+                int(added),
+                int(removed),
+            )
+            for day_number, repo_id, author, count, added, removed in res["rows"]
+        ]
+        with conn:
+            conn.execute(
+                "DELETE FROM daily_rollup WHERE source = ? AND org_id = ? AND day >= ? AND day < ?",
+                (source, org_id, first.isoformat(), stop.isoformat()),
+            )
+            conn.executemany("INSERT INTO daily_rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            covered = self._range(conn, source, org_id)
+            low, high = (first, stop) if covered is None else (min(first, covered[0]), max(stop, covered[1]))
+            conn.execute(
+                "INSERT OR REPLACE INTO rollup_range VALUES (?, ?, ?, ?)",
+                (source, org_id, low.isoformat(), high.isoformat()),
+            )
+        self._ranges[(source, org_id)] = (low, high)
+        self._stats["builds"] += 1
+        self._stats["days_built"] += (stop - first).days
+
+    def _ensure(self, conn: sqlite3.Connection, source: str, org_id: int, first: date, stop: date) -> None:
+        covered = self._range(conn, source, org_id)
+        if covered is None:
+            self._build(conn, source, org_id, first, stop)
+            # Just built from the live table.
+            self._refreshed[(source, org_id)] = time.monotonic()
+            return
+        low, high = covered
+        if first < low:
+            self._build(conn, source, org_id, first, low)
+        if stop > high:
+            # Also closes the days between the old range and the new one.
+            self._build(conn, source, org_id, high, stop)
+        self._refresh_recent(conn, source, org_id)
+
+    def _refresh_recent(self, conn: sqlite3.Connection, source: str, org_id: int) -> None:
+        """Re-roll the newest ``horizon_days`` covered days once they are ``horizon_seconds`` old."""
+        if self.horizon_days <= 0 or self.horizon_seconds <= 0:
+            return
+        key = (source, org_id)
+        now = time.monotonic()
+        last = self._refreshed.get(key)
+        if last is not None and now - last < self.horizon_seconds:
+            return
+        covered = self._range(conn, source, org_id)
+        if covered is None:
+            return
+        low, high = covered
+        first = max(low, high - timedelta(days=self.horizon_days))
+        if first < high:
+            self._build(conn, source, org_id, first, high)
+            self._stats["refreshes"] += 1
+        self._refreshed[key] = now
+
+    def count(self, source: str, org_id: int, start: datetime, end: datetime) -> Optional[int]:
+        """
+        Rows of ``source`` with ``start <= time <= end``, or None when the
+        store is disabled, the period has no whole closed day, or the store
+        fails (callers then count from the raw table as before).
+        """
+        if not self.enabled or source not in SOURCES:
+            return None
+        start, end = start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+        today = datetime.now(timezone.utc).date()
+        # Whole days inside the period; the partial ones at either end are counted live.
+        first = start.date() if start == _day_start(start.date()) else start.date() + timedelta(days=1)
+        # Calendar periods end one microsecond before midnight; that last day is whole too.
+        stop = min((end + timedelta(microseconds=1)).date(), today)
+        if first >= stop:
+            self._stats["fallbacks"] += 1
+            return None
+        try:
+            with self._lock:
+                conn = self._connect()
+                self._ensure(conn, source, org_id, first, stop)
+                (rolled,) = conn.execute(
+                    "SELECT COALESCE(SUM(count), 0) FROM daily_rollup "
+                    "WHERE source = ? AND org_id = ? AND day >= ? AND day < ?",
+                    (source, org_id, first.isoformat(), stop.isoformat()),
+                ).fetchone()
+            live = self._count_live(source, org_id, start, _day_start(first), _day_start(stop), end)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"[ROLLUP] {source} count failed, using raw table: {e}", file=sys.stderr)
+            return None
+        self._stats["hits"] += 1
+        return int(rolled) + live
+
+    def _count_live(
+        self, source: str, org_id: int, start: datetime, head_end: datetime, tail_start: datetime, end: datetime
+    ) -> int:
+        """Count the partial days around the rolled-up range: [start, head_end) and [tail_start, end]."""
+        column = SOURCES[source].time_column
+        sql = f"""
+        SELECT COUNT(*) AS count
+        FROM insightly.{SOURCES[source].table}
+        WHERE organizationid = %s
+          AND (({column} >= %s AND {column} < %s) OR ({column} >= %s AND {column} <= %s))
+        """
+        db = Database()
+        try:
+            res = db.execute_query(
+                sql,
+                params=(org_id, start.isoformat(), head_end.isoformat(), tail_start.isoformat(), end.isoformat()),
+            )
+        finally:
+            db.close()
+        if not res["success"]:
+            raise RuntimeError(res.get("error") or "live count failed")
+        return int(res["rows"][0]["count"]) if res["rows"] else 0
+
+    def refresh_days(self, source: str, org_id: int, days: Iterable[date]) -> int:
+        """
+        Re-roll the given days of ``source`` that the store already covers
+        (one query per run of consecutive days); returns how many days were
+        rebuilt. Days outside the covered range are built when first needed.
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            covered = self._range(conn, source, org_id)
+            if covered is None:
+                return 0
+            wanted = [day for day in set(days) if covered[0] <= day < covered[1]]
+            self._rebuild_days(conn, source, org_id, wanted)
+        return len(wanted)
+
+    def _rebuild_days(self, conn: sqlite3.Connection, source: str, org_id: int, days: Iterable[date]) -> None:
+        runs: list = []
+        for day in sorted(days):
+            if runs and runs[-1][1] == day:
+                runs[-1][1] = day + timedelta(days=1)
+            else:
+                runs.append([day, day + timedelta(days=1)])
+        for first, stop in runs:
+            self._build(conn, source, org_id, first, stop)
+
+    def reconcile(self, source: str, org_id: int) -> int:
+        """
+        Compare per-day row counts of the covered range with the live table
+        (one GROUP BY day) and re-roll the days that differ; returns how many.
+        Catches rows whose timestamp moved to another day: change capture only
+        sees their new day, while the old one still counts them.
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            covered = self._range(conn, source, org_id)
+            if covered is None:
+                return 0
+            spec = SOURCES[source]
+            sql = f"""
+            SELECT FLOOR(EXTRACT(EPOCH FROM {spec.time_column}) / 86400)::int AS day_number, COUNT(*) AS count
+            FROM insightly.{spec.table}
+            WHERE organizationid = %s
+              AND {spec.time_column} >= %s AND {spec.time_column} < %s
+            GROUP BY 1
+            """
+            db = Database()
+            try:
+                res = db.execute_query(
+                    sql,
+                    params=(org_id, _day_start(covered[0]).isoformat(), _day_start(covered[1]).isoformat()),
+                    columnar=True,
+                )
+            finally:
+                db.close()
+            if not res["success"]:
+                raise RuntimeError(res.get("error") or "reconcile query failed")
+            epoch = date(1970, 1, 1)
+            live = {
+                (epoch + timedelta(days=int(day_number))).isoformat(): int(count) for day_number, count in res["rows"]
+            }
+            rolled = dict(
+                conn.execute(
+                    "SELECT day, SUM(count) FROM daily_rollup WHERE source = ? AND org_id = ? GROUP BY day",
+                    (source, org_id),
+                )
+            )
+            stale = [
+                date.fromisoformat(day) for day in set(live) | set(rolled) if live.get(day, 0) != rolled.get(day, 0)
+            ]
+            self._rebuild_days(conn, source, org_id, stale)
+        return len(stale)
+
+    def refresh_range(self, source: str, org_id: int) -> int:
+        """Re-roll every covered day of ``source`` (one query); returns how many days."""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            covered = self._range(conn, source, org_id)
+            if covered is None:
+                return 0
+            self._build(conn, source, org_id, covered[0], covered[1])
+            self._refreshed[(source, org_id)] = time.monotonic()
+        return (covered[1] - covered[0]).days
+
+    def invalidate(self, source: Optional[str] = None) -> None:
+        """Drop the rollups of ``source`` (all sources if None); they are rebuilt on demand."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if source is None:
+                    conn.execute("DELETE FROM daily_rollup")
+                    conn.execute("DELETE FROM rollup_range")
+                else:
+                    conn.execute("DELETE FROM daily_rollup WHERE source = ?", (source,))
+                    conn.execute("DELETE FROM rollup_range WHERE source = ?", (source,))
+            for key in [key for key in self._ranges if source is None or key[0] == source]:
+                del self._ranges[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and the ranges this process has seen; never waits for a build in progress."""
+        ranges = {
+            f"{source}:{org_id}": {"from": low.isoformat(), "through": high.isoformat()}
+            for (source, org_id), (low, high) in list(self._ranges.items())
+        }
+        return {"enabled": self.enabled, "path": str(self.path), "ranges": ranges, **dict(self._stats)}
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+ROLLUPS = RollupStore(
+    path=Path(os.getenv("ROLLUP_DB_PATH") or DEFAULT_DB_PATH),
+    enabled=os.getenv("ROLLUP_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"},
+    horizon_days=int(_env_number("ROLLUP_REFRESH_DAYS", DEFAULT_REFRESH_DAYS)),
+    horizon_seconds=_env_number("ROLLUP_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS),
+)
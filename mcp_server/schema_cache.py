@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .database import Database
+
+SCHEMA_NAME = "insightly"
+DEFAULT_REFRESH_SECONDS = 3600.0
+
+
+class SchemaCache:
+    """
+    In-memory copy of ``information_schema.columns`` for one schema.
+
+    The whole schema is loaded with a single query on first use (or via
+    :meth:`warm`) and served from memory afterwards. It is reloaded once
+    ``refresh_interval`` seconds have passed or after :meth:`invalidate`;
+    if a reload fails the previous snapshot keeps being served.
+    """
+
+    def __init__(self, schema: str = SCHEMA_NAME, refresh_interval: float = DEFAULT_REFRESH_SECONDS):
+        self.schema = schema
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._tables: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._stats = {"loads": 0, "load_errors": 0, "lookups": 0}
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        sql = """
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = %s
+        ORDER BY table_name, ordinal_position
+        """
+        db = Database()
+        try:
+            res = db.execute_query(sql, params=(self.schema,))
+        finally:
+            db.close()
+        if not res["success"]:
+            raise RuntimeError(res.get("error") or "schema query failed")
+        tables: Dict[str, List[Dict[str, Any]]] = {}
+        for row in res["rows"]:
+            tables.setdefault(row["table_name"], []).append(
+                {"column_name": row["column_name"], "data_type": row["data_type"]}
+            )
+        return tables
+
+    def _snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            self._stats["lookups"] += 1
+            expired = (
+                self.refresh_interval > 0
+                and time.monotonic() - self._loaded_at > self.refresh_interval
+            )
+            if self._tables is not None and not self._stale and not expired:
+                return self._tables
+            try:
+                tables = self._load()
+            except Exception:
+                self._stats["load_errors"] += 1
+                if self._tables is None:
+                    raise
+                return self._tables
+            self._tables = tables
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            self._stats["loads"] += 1
+            return tables
+
+    def warm(self) -> None:
+        """Load the schema now instead of on the first lookup."""
+        self._snapshot()
+
+    def invalidate(self) -> None:
+        """Force a reload on the next lookup."""
+        with self._lock:
+            self._stale = True
+
+    def tables(self) -> List[str]:
+        return sorted(self._snapshot())
+
+    def columns(self, table_name: str) -> List[Dict[str, Any]]:
+        """Column metadata for ``table_name``; an empty list if the table is unknown."""
+        return list(self._snapshot().get(table_name, []))
+
+    def column_names(self, table_name: str) -> set:
+        return {col["column_name"] for col in self._snapshot().get(table_name, [])}
+
+    def stats(self) -> Dict[str, Any]:
+        # No lock: _snapshot() holds it while a reload queries the database.
+        tables = self._tables
+        return {
+            "tables": len(tables) if tables is not None else 0,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if tables is not None else None,
+            "refresh_interval": self.refresh_interval,
+            **dict(self._stats),
+        }
+
+
+def _refresh_interval_from_env() -> float:
+    value = os.getenv("SCHEMA_CACHE_REFRESH_SECONDS")
+    try:
+        return float(value) if value and value.strip() else DEFAULT_REFRESH_SECONDS
+    except ValueError:
+        return DEFAULT_REFRESH_SECONDS
+
+
+SCHEMA_CACHE = SchemaCache(refresh_interval=_refresh_interval_from_env())
@@ -0,0 +1,607 @@
+"""
+Shared SQL tokenizer and read-only validator for the PR and commit servers.
+
+Statements are split into tokens once (string/dollar-quoted literals, quoted
+identifiers, comments and psycopg2 placeholders are recognised), so keyword
+checks only ever look at real keywords: a column called ``updated_at`` or a
+literal ``'delete'`` no longer trips the validator, while ``MERGE``/``CALL``
+or a data-modifying CTE can no longer slip through.
+
+Verdicts are cached by statement fingerprint, and tokenization by exact
+text, so the fixed SQL issued by the built-in tools is classified once per
+process.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Callable, Collection, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class Token(NamedTuple):
+    kind: str  # word | qident | string | number | param | op | comment
+    text: str
+    start: int
+    end: int
+
+    @property
+    def lower(self) -> str:
+        return self.text.lower()
+
+
+class Verdict(NamedTuple):
+    ok: bool
+    reason: Optional[str]
+    fingerprint: str
+
+
+class Statement(NamedTuple):
+    tokens: Tuple[Token, ...]  # without whitespace/comments
+    sanitized: str  # original text with comments removed, stripped
+    fingerprint: str
+    verdict: Verdict
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<dollar>\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?\$(?P=tag)\$)
+  | (?P<estring>[Ee]'(?:[^'\\]|''|\\.)*')
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<qident>"(?:[^"]|"")*")
+  | (?P<param>%\([^)]*\)s|%s|%%)
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<bad>['"]|/\*|\$[A-Za-z0-9_]*\$)
+  | (?P<op>::|<=|>=|<>|!=|\|\||->>|->|\S)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+# Statements/clauses that write, lock, or change server state.
+FORBIDDEN_KEYWORDS = frozenset(
+    {
+        "insert", "update", "delete", "drop", "alter", "create", "truncate",
+        "grant", "revoke", "merge", "call", "copy", "lock", "vacuum", "reindex",
+        "cluster", "refresh", "execute", "prepare", "deallocate", "listen",
+        "notify", "do", "into",
+    }
+)
+
+# Functions with side effects or server/file access.
+FORBIDDEN_FUNCTIONS = frozenset(
+    {
+        "set_config", "nextval", "setval", "pg_sleep", "pg_sleep_for", "pg_sleep_until",
+        "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf", "pg_rotate_logfile",
+        "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "pg_stat_file",
+        "lo_import", "lo_export", "lo_unlink", "lo_create", "dblink", "dblink_exec",
+        "lo_from_bytea", "lo_put", "lo_truncate", "lo_truncate64", "lowrite", "lo_open",
+        "dblink_connect", "dblink_connect_u", "dblink_open", "dblink_send_query",
+        "pg_advisory_lock", "pg_advisory_xact_lock", "pg_advisory_lock_shared",
+        "pg_advisory_xact_lock_shared", "pg_try_advisory_lock", "pg_try_advisory_xact_lock",
+        "pg_try_advisory_lock_shared", "pg_try_advisory_xact_lock_shared", "pg_notify",
+        # These run a query (or read a whole table) given as text, out of reach
+        # of the org-scoping rewrite.
+        "query_to_xml", "query_to_xmlschema", "query_to_xml_and_xmlschema",
+        "table_to_xml", "table_to_xmlschema", "table_to_xml_and_xmlschema",
+        "cursor_to_xml", "cursor_to_xmlschema", "schema_to_xml", "schema_to_xmlschema",
+        "schema_to_xml_and_xmlschema", "database_to_xml", "database_to_xmlschema",
+        "database_to_xml_and_xmlschema", "ts_stat", "dblink_fetch", "dblink_get_result",
+    }
+)
+
+READ_ONLY_ERROR = "Only read-only SELECT queries are allowed"
+MULTIPLE_STATEMENTS_ERROR = "Multiple SQL statements are not allowed"
+
+
+class SqlSyntaxError(ValueError):
+    pass
+
+
+def _tokenize(sql: str) -> Tuple[Tuple[Token, ...], Tuple[Token, ...]]:
+    """Return (significant tokens, comment tokens)."""
+    tokens = []
+    comments = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind == "tag":
+            kind = "dollar"
+        if kind == "ws":
+            continue
+        if kind == "bad":
+            raise SqlSyntaxError("SQL contains an unterminated quote or comment")
+        if kind in {"dollar", "estring"}:
+            kind = "string"
+        token = Token(kind, match.group(), match.start(), match.end())
+        if kind == "comment":
+            comments.append(token)
+        else:
+            tokens.append(token)
+    return tuple(tokens), tuple(comments)
+
+
+def _fingerprint_text(tokens: Tuple[Token, ...]) -> str:
+    parts = []
+    for token in tokens:
+        if token.kind in {"string", "number"}:
+            parts.append("?")
+        elif token.kind == "word":
+            parts.append(token.lower)
+        else:
+            parts.append(token.text)
+    return " ".join(parts)
+
+
+def _strip_comments(sql: str, comments: Tuple[Token, ...]) -> str:
+    if not comments:
+        return sql.strip()
+    pieces = []
+    cursor = 0
+    for comment in comments:
+        pieces.append(sql[cursor:comment.start])
+        pieces.append(" ")
+        cursor = comment.end
+    pieces.append(sql[cursor:])
+    return "".join(pieces).strip()
+
+
+def _ident_name(token: Token) -> str:
+    if token.kind == "qident":
+        return token.text[1:-1].replace('""', '"')
+    return token.lower
+
+
+def _classify(tokens: Tuple[Token, ...]) -> Optional[str]:
+    """Return None for a single read-only SELECT/CTE, otherwise the rejection reason."""
+    body = list(tokens)
+    while body and body[-1].text == ";":
+        body.pop()
+    if not body:
+        return "SQL cannot be empty after removing comments."
+    if any(token.text == ";" for token in body):
+        return MULTIPLE_STATEMENTS_ERROR
+
+    first = next((t for t in body if t.text != "("), None)
+    if first is None or first.kind != "word" or first.lower not in {"select", "with"}:
+        return READ_ONLY_ERROR
+
+    depth = 0
+    for index, token in enumerate(body):
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+            if depth < 0:
+                return "SQL has unbalanced parentheses"
+        if token.kind not in {"word", "qident"}:
+            continue
+        # Quoting does not hide a name: "pg_sleep"(1) calls pg_sleep.
+        word = _ident_name(token).lower()
+        if word in FORBIDDEN_KEYWORDS:
+            return f"Keyword '{word}' is not permitted in read-only mode."
+        following = body[index + 1] if index + 1 < len(body) else None
+        if word in FORBIDDEN_FUNCTIONS and following is not None and following.text == "(":
+            return f"Function '{word}' is not permitted in read-only mode."
+        if (
+            word == "for"
+            and following is not None
+            and following.kind == "word"
+            and following.lower in {"share", "no", "key"}
+        ):
+            return "Row-locking clauses are not permitted in read-only mode."
+    if depth != 0:
+        return "SQL has unbalanced parentheses"
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _verdict_for(fingerprint_text: str, fingerprint: str) -> Verdict:
+    tokens, _ = _tokenize(fingerprint_text)
+    reason = _classify(tokens)
+    return Verdict(reason is None, reason, fingerprint)
+
+
+def parse(sql: str) -> Statement:
+    """Tokenize and classify ``sql`` (cached by exact text)."""
+    if not isinstance(sql, str) or not sql.strip():
+        return Statement((), "", "", Verdict(False, "SQL must be a non-empty string.", ""))
+    return _parse(sql)
+
+
+@lru_cache(maxsize=2048)
+def _parse(sql: str) -> Statement:
+    try:
+        tokens, comments = _tokenize(sql)
+    except SqlSyntaxError as e:
+        return Statement((), sql.strip(), "", Verdict(False, str(e), ""))
+    text = _fingerprint_text(tokens)
+    fingerprint = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    # Literals are normalised out of the fingerprint, so statements that differ
+    # only in their values share one cached verdict.
+    return Statement(tokens, _strip_comments(sql, comments), fingerprint, _verdict_for(text, fingerprint))
+
+
+def check_read_only(sql: str) -> Verdict:
+    return parse(sql).verdict
+
+
+def fingerprint_sql(sql: str) -> str:
+    """Stable id for a statement's shape: comments, literals and spacing are normalized away."""
+    return parse(sql).fingerprint
+
+
+def cache_info() -> dict:
+    return {"parse": _parse.cache_info()._asdict(), "verdicts": _verdict_for.cache_info()._asdict()}
+
+
+# ---------------------------------------------------------------------------
+# Org scoping / LIMIT rewriting for the custom query tools
+# ---------------------------------------------------------------------------
+
+
+class ScopedQuery(NamedTuple):
+    sql: str
+    scoped_tables: Tuple[str, ...]
+    limit: int
+
+
+class SqlRewriteError(ValueError):
+    pass
+
+
+# Words that may follow a FROM item but are never its alias.
+_NON_ALIAS = frozenset(
+    {
+        "where", "join", "inner", "left", "right", "full", "cross", "natural", "on",
+        "using", "group", "having", "order", "limit", "offset", "fetch", "window",
+        "union", "intersect", "except", "for", "tablesample", "lateral",
+    }
+)
+# Clauses that end the FROM list of the current query level.
+_FROM_END = frozenset(
+    {"where", "group", "having", "order", "limit", "offset", "fetch", "window", "union", "intersect", "except"}
+)
+_SIMPLE_IDENT = re.compile(r"[a-z_][a-z0-9_]*")
+# Set-returning functions allowed as FROM items; any other call there is rejected,
+# since the rewrite cannot see which rows it reads.
+FROM_FUNCTIONS = frozenset(
+    {
+        "generate_series", "generate_subscripts", "unnest", "regexp_split_to_table",
+        "regexp_matches", "string_to_table", "json_each", "json_each_text", "jsonb_each",
+        "jsonb_each_text", "json_array_elements", "json_array_elements_text",
+        "jsonb_array_elements", "jsonb_array_elements_text", "json_to_recordset",
+        "jsonb_to_recordset", "json_populate_recordset", "jsonb_populate_recordset",
+    }
+)
+
+
+def _quote_ident(name: str) -> str:
+    if _SIMPLE_IDENT.fullmatch(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _dotted_name(tokens: Sequence[Token], index: int) -> Tuple[int, List[str]]:
+    """Read ``a``, ``a.b`` ... starting at ``index``; return (next index, parts)."""
+    parts = [_ident_name(tokens[index])]
+    index += 1
+    while (
+        index + 1 < len(tokens)
+        and tokens[index].text == "."
+        and tokens[index + 1].kind in {"word", "qident"}
+    ):
+        parts.append(_ident_name(tokens[index + 1]))
+        index += 2
+    return index, parts
+
+
+def _skip_parens(tokens: Sequence[Token], index: int) -> int:
+    """Index just past the parenthesised group opening at ``index``."""
+    depth = 0
+    while index < len(tokens):
+        if tokens[index].text == "(":
+            depth += 1
+        elif tokens[index].text == ")":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    return index
+
+
+def _cte_names(tokens: Sequence[Token]) -> set:
+    """
+    Names bound by the WITH lists of the statement:
+    ``WITH [RECURSIVE] name [(cols)] AS [[NOT] MATERIALIZED] (...) [, name ...]``.
+    """
+    names = set()
+    for index, token in enumerate(tokens):
+        if token.kind != "word" or token.lower != "with":
+            continue
+        index += 1
+        if index < len(tokens) and tokens[index].lower == "recursive":
+            index += 1
+        while index < len(tokens) and tokens[index].kind in {"word", "qident"}:
+            name = _ident_name(tokens[index])
+            index += 1
+            if index < len(tokens) and tokens[index].text == "(":
+                index = _skip_parens(tokens, index)
+            if index >= len(tokens) or tokens[index].lower != "as":
+                break  # not a CTE, e.g. WITH ORDINALITY or WITH TIME ZONE
+            index += 1
+            if index < len(tokens) and tokens[index].lower == "not":
+                index += 1
+            if index < len(tokens) and tokens[index].lower == "materialized":
+                index += 1
+            if index >= len(tokens) or tokens[index].text != "(":
+                break
+            names.add(name)
+            index = _skip_parens(tokens, index)
+            if index >= len(tokens) or tokens[index].text != ",":
+                break
+            index += 1
+    return names
+
+
+def _render(sql: str, tokens: Sequence[Token], edits: Dict[int, Tuple[int, str]]) -> str:
+    """
+    Re-assemble ``tokens`` from the original text, applying ``edits``
+    (first token index -> (end index, replacement)) and dropping comments.
+    """
+    out: List[str] = []
+    prev_end: Optional[int] = None
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if prev_end is not None:
+            gap = sql[prev_end:token.start]
+            out.append(gap if not gap.strip() else " ")
+        if index in edits:
+            end, text = edits[index]
+            out.append(text)
+            prev_end = tokens[end - 1].end
+            index = end
+        else:
+            out.append(token.text)
+            prev_end = token.end
+            index += 1
+    return "".join(out)
+
+
+def scope_to_org(
+    sql: str,
+    *,
+    schema: str,
+    org_column: str,
+    org_id: int,
+    columns_for: Callable[[str], set],
+    default_limit: int,
+    max_limit: int,
+    shared_tables: Collection[str] = (),
+) -> ScopedQuery:
+    """
+    Rewrite a validated read-only query so every base table of ``schema``
+    that has ``org_column`` is read through
+    ``(SELECT * FROM schema.table WHERE org_column = org_id) AS alias``,
+    and the statement as a whole returns at most ``max_limit`` rows.
+
+    Postgres flattens these subqueries into the outer plan, so the org
+    predicate lands on each table scan (and its index) and aggregates that
+    never project ``org_column`` still work. An existing top-level integer
+    LIMIT is clamped to ``max_limit``; without one ``LIMIT default_limit``
+    is appended; any other form (``LIMIT %s``, ``LIMIT ALL``, FETCH) is
+    wrapped in an outer ``SELECT ... LIMIT``.
+
+    ``TABLE schema.table`` is rewritten the same way, as
+    ``SELECT * FROM (...) AS alias``.
+
+    ``columns_for(table)`` returns the column names of ``schema.table``
+    (empty for an unknown table). References to other schemas, unknown
+    tables, or tables without ``org_column`` that are not listed in
+    ``shared_tables`` raise :class:`SqlRewriteError`.
+    """
+    statement = parse(sql)
+    if not statement.verdict.ok:
+        raise SqlRewriteError(statement.verdict.reason)
+    tokens = list(statement.tokens)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+
+    ctes = _cte_names(tokens)
+    edits: Dict[int, Tuple[int, str]] = {}
+    scoped: List[str] = []
+    unaliased: set = set()  # scoped tables that now go by the bare table name
+    # One entry per open paren: [is a query level, inside its FROM list].
+    levels = [[True, False]]
+    expect_table = False
+    limit_index: Optional[int] = None
+    has_fetch = False
+
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        word = token.lower if token.kind == "word" else None
+        level = levels[-1]
+
+        if token.text == "(":
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            nxt = following.lower if following is not None and following.kind == "word" else ""
+            if nxt in {"select", "with", "table"}:
+                levels.append([True, False])
+                expect_table = False
+            elif expect_table and nxt != "values":
+                # Parenthesised join group: FROM (a JOIN b ON ...)
+                levels.append([False, True])
+            else:
+                levels.append([False, False])
+                expect_table = False
+            index += 1
+            continue
+        if token.text == ")":
+            if len(levels) > 1:
+                levels.pop()
+            expect_table = False
+            index += 1
+            continue
+
+        if word == "table":
+            # TABLE name is shorthand for SELECT * FROM name (a reserved word,
+            # so it is never a plain identifier).
+            start = index + 1
+            if start < len(tokens) and tokens[start].lower == "only":
+                start += 1
+            if start >= len(tokens) or tokens[start].kind not in {"word", "qident"}:
+                raise SqlRewriteError("TABLE must be followed by a table name.")
+            end, parts = _dotted_name(tokens, start)
+            replacement = _scoped_reference(
+                parts, tokens, end, ctes, schema, org_column, org_id, columns_for, shared_tables
+            )
+            if replacement is not None:
+                edits[index] = (end, f"SELECT * FROM {replacement}")
+                scoped.append(parts[-1])
+            index = end
+            continue
+
+        if expect_table:
+            if word in {"lateral", "only"}:
+                index += 1
+                continue
+            if token.kind in {"word", "qident"}:
+                end, parts = _dotted_name(tokens, index)
+                expect_table = False
+                if end < len(tokens) and tokens[end].text == "(":
+                    # Set-returning function such as generate_series(...).
+                    if parts[-1].lower() not in FROM_FUNCTIONS or parts[:-1] not in ([], ["pg_catalog"]):
+                        raise SqlRewriteError(f"Function '{'.'.join(parts)}' cannot be used in FROM.")
+                    index = end
+                    continue
+                replacement = _scoped_reference(
+                    parts, tokens, end, ctes, schema, org_column, org_id, columns_for, shared_tables
+                )
+                if replacement is not None:
+                    edits[index] = (end, replacement)
+                    scoped.append(parts[-1])
+                    if not _has_alias(tokens, end):
+                        unaliased.add(parts[-1])
+                index = end
+                continue
+            expect_table = False
+
+        if word is not None:
+            if word == "from" and level[0] and not (index and tokens[index - 1].lower == "distinct"):
+                level[1] = True
+                expect_table = True
+            elif word == "join" and level[1]:
+                expect_table = True
+            elif word in _FROM_END:
+                level[1] = False
+                if len(levels) == 1 and word == "limit":
+                    limit_index = index
+                elif len(levels) == 1 and word == "fetch":
+                    has_fetch = True
+        elif token.text == "," and level[1]:
+            expect_table = True
+        index += 1
+
+    _requalify_columns(tokens, edits, schema, unaliased)
+
+    limit = max(1, min(int(default_limit), int(max_limit)))
+    wrap = has_fetch
+    append = False
+    if limit_index is not None:
+        value = tokens[limit_index + 1] if limit_index + 1 < len(tokens) else None
+        after = tokens[limit_index + 2] if limit_index + 2 < len(tokens) else None
+        if (
+            value is not None
+            and value.kind == "number"
+            and value.text.isdigit()
+            and (after is None or after.lower == "offset")
+        ):
+            limit = max(1, min(int(value.text), int(max_limit)))
+            edits[limit_index + 1] = (limit_index + 2, str(limit))
+        else:
+            wrap = True
+    elif not wrap:
+        append = True
+
+    rendered = _render(sql, tokens, edits)
+    if wrap:
+        rendered = f"SELECT * FROM (\n{rendered}\n) AS limited LIMIT {limit}"
+    elif append:
+        rendered = f"{rendered}\nLIMIT {limit}"
+    return ScopedQuery(rendered, tuple(dict.fromkeys(scoped)), limit)
+
+
+def _scoped_reference(
+    parts: List[str],
+    tokens: Sequence[Token],
+    end: int,
+    ctes: set,
+    schema: str,
+    org_column: str,
+    org_id: int,
+    columns_for: Callable[[str], set],
+    shared_tables: Collection[str],
+) -> Optional[str]:
+    """Replacement text for the table reference ``parts``, or None to leave it as is."""
+    if len(parts) == 1:
+        if parts[0] in ctes:
+            return None
+        table = parts[0]
+    elif len(parts) == 2:
+        if parts[0] != schema:
+            raise SqlRewriteError(f"Only tables in the '{schema}' schema can be queried (got '{'.'.join(parts)}').")
+        table = parts[1]
+    else:
+        raise SqlRewriteError(f"Unsupported table reference '{'.'.join(parts)}'.")
+
+    columns = columns_for(table)
+    if not columns:
+        raise SqlRewriteError(f"Unknown table '{table}'.")
+    if org_column not in columns:
+        if table in shared_tables:
+            return None
+        raise SqlRewriteError(f"Table '{table}' has no {org_column} column and cannot be queried.")
+
+    text = f"(SELECT * FROM {_quote_ident(schema)}.{_quote_ident(table)} WHERE {org_column} = {int(org_id)})"
+    if _has_alias(tokens, end):
+        return text
+    return f"{text} AS {_table_alias(table)}"
+
+
+def _has_alias(tokens: Sequence[Token], end: int) -> bool:
+    following = tokens[end] if end < len(tokens) else None
+    return following is not None and (
+        (following.kind == "word" and following.lower not in _NON_ALIAS) or following.kind == "qident"
+    )
+
+
+def _table_alias(table: str) -> str:
+    # Always quoted, so a table named like a reserved word is still a valid alias.
+    return '"' + table.replace('"', '""') + '"'
+
+
+def _requalify_columns(
+    tokens: Sequence[Token], edits: Dict[int, Tuple[int, str]], schema: str, unaliased: set
+) -> None:
+    """
+    ``schema.table.column`` no longer resolves once ``schema.table`` is read
+    through an aliased subquery; point such references at the alias instead.
+    """
+    if not unaliased:
+        return
+    for index in range(len(tokens) - 4):
+        if index in edits or (index and tokens[index - 1].text == "."):
+            continue
+        head = tokens[index : index + 4]
+        if (
+            head[0].kind in {"word", "qident"}
+            and _ident_name(head[0]) == schema
+            and head[1].text == "."
+            and head[2].kind in {"word", "qident"}
+            and _ident_name(head[2]) in unaliased
+            and head[3].text == "."
+        ):
+            edits[index] = (index + 3, _table_alias(_ident_name(head[2])))
@@ -1,49 +1,309 @@
-from datetime import datetime, timedelta, timezone
-from typing import Tuple
+import functools
+import os
+import re
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-def get_time_range(period: str) -> Tuple[datetime, datetime]:
-    now = datetime.now(timezone.utc)
-    today = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+# Rolling windows ("last 7 days", "today", ...) end at the current time rounded up
+# to this step, so the same question asked a few seconds apart resolves to the same
+# SQL parameters and can hit the result cache. One of "none", "minute", "hour", "day".
+GRANULARITIES = {"none": None, "minute": 60, "hour": 3600, "day": 86400}
+DEFAULT_GRANULARITY = "minute"
+DEFAULT_PERIOD = "last 30 days"
 
-    if not period:
-        period = "last 30 days"
 
-    p = period.lower().strip()
+def _granularity_from_env() -> str:
+    value = (os.getenv("TIME_WINDOW_ALIGNMENT") or DEFAULT_GRANULARITY).strip().lower()
+    return value if value in GRANULARITIES else DEFAULT_GRANULARITY
 
-    if "last" in p and "day" in p:
+
+TIME_WINDOW_ALIGNMENT = _granularity_from_env()
+
+
+def align(moment: datetime, granularity: Optional[str] = None) -> datetime:
+    """Round ``moment`` up to the next ``granularity`` boundary (UTC); unchanged for "none"."""
+    step = GRANULARITIES.get(granularity or TIME_WINDOW_ALIGNMENT)
+    if step is None:
+        return moment
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    seconds = (moment - epoch).total_seconds()
+    buckets = -(-seconds // step)
+    return epoch + timedelta(seconds=buckets * step)
+
+
+class PeriodError(ValueError):
+    """Raised for a period the grammar does not understand."""
+
+
+class Period(NamedTuple):
+    """
+    A parsed period, independent of the current time.
+
+    ``kind`` is one of "rolling" (``amount`` ``unit``s back from now),
+    "calendar" (the ``unit`` = day/week/month/quarter/year ``amount`` periods
+    before the current one; 0 runs to now), "quarter"/"month" (``amount`` in
+    ``year``, the latest one if ``year`` is None), "weekday" (the last such
+    day, or since it with ``unit="since"``), "since" and "range" (explicit
+    ``start``/``end``).
+    """
+
+    kind: str
+    amount: int = 0
+    unit: str = ""
+    year: Optional[int] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    tz: tzinfo = timezone.utc
+
+
+_UNITS = {
+    "minute": "minutes", "min": "minutes", "mins": "minutes", "minutes": "minutes",
+    "hour": "hours", "hr": "hours", "hrs": "hours", "hours": "hours", "h": "hours",
+    "day": "days", "days": "days", "d": "days",
+    "week": "weeks", "weeks": "weeks", "wk": "weeks", "wks": "weeks", "w": "weeks",
+    "month": "months", "months": "months", "mo": "months", "mos": "months",
+    "year": "years", "years": "years", "yr": "years", "yrs": "years", "y": "years",
+}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTHS = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+            "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12}
+
+_TZ_SUFFIX = re.compile(
+    r"\s+(?:in\s+)?(?P<tz>utc|gmt|z|(?:utc|gmt)?\s*[+-]\d{1,2}(?::?\d{2})?|[a-z_]+/[a-z_]+(?:/[a-z_]+)?)$",
+    re.IGNORECASE,
+)
+_FILLER = re.compile(r"^(?:in|during|over|for|within)?\s*(?:the\s+)?")
+_ROLLING = re.compile(r"^(?:last|past|previous)\s+(?:(?P<n>\d+)\s*|(?P<word>[a-z]+)\s+)?(?P<unit>[a-z]+)$")
+_AGO = re.compile(r"^(?P<n>\d+|[a-z]+)\s+(?P<unit>[a-z]+)\s+ago$")
+_CALENDAR = re.compile(r"^(?P<which>this|current|last|previous)\s+(?P<unit>day|week|month|quarter|year)$")
+_QUARTER = re.compile(r"^(?:q(?P<q1>[1-4])(?:\s*[-/ ]?\s*(?P<y1>\d{4}))?|(?P<y2>\d{4})\s*[-/ ]?\s*q(?P<q2>[1-4]))$")
+_MONTH = re.compile(r"^(?:last\s+)?(?P<month>[a-z]+)(?:\s+(?P<year>\d{4}))?$")
+_WEEKDAY = re.compile(r"^(?P<since>since\s+|last\s+)?(?P<day>[a-z]+)$")
+_RANGE = re.compile(r"^(?:from\s+|between\s+)?(?P<a>\S+?)\s*(?:\.\.|\s+to\s+|\s+and\s+|\s+until\s+|\s+-\s+)\s*(?P<b>\S+)$")
+_SINCE = re.compile(r"^(?:since|after|from)\s+(?P<a>\S+)$")
+
+
+def _zone(name: str) -> tzinfo:
+    name = name.strip()
+    lowered = name.lower().replace(" ", "")
+    if lowered in {"utc", "gmt", "z"}:
+        return timezone.utc
+    offset = re.fullmatch(r"(?:utc|gmt)?([+-])(\d{1,2})(?::?(\d{2}))?", lowered)
+    if offset:
+        sign = -1 if offset.group(1) == "-" else 1
+        delta = timedelta(hours=int(offset.group(2)), minutes=int(offset.group(3) or 0))
+        if delta > timedelta(hours=14):
+            raise PeriodError(f"invalid UTC offset: {name}")
+        return timezone(sign * delta)
+    for candidate in (name, "/".join("_".join(w.capitalize() for w in part.split("_")) for part in name.split("/"))):
         try:
-            num_days = int(p.split("last")[1].split("day")[0].strip())
-        except Exception:
-            num_days = 30
-        start = now - timedelta(days=num_days)
-        return start, now
-
-    if "this week" in p:
-        start = today - timedelta(days=today.weekday())
-        return start, now
-
-    if "last week" in p:
-        start = today - timedelta(days=today.weekday() + 7)
-        end = start + timedelta(days=7)
-        return start, end
-
-    if "this month" in p:
-        start = today.replace(day=1)
-        return start, now
-
-    if "last month" in p:
-        first_of_this_month = today.replace(day=1)
-        last_month_end = first_of_this_month - timedelta(days=1)
-        start = last_month_end.replace(day=1)
-        end = last_month_end.replace(hour=23, minute=59, second=59)
-        return start, end
-
-    if p == "today":
-        return today, now
-
-    if p == "yesterday":
-        start = today - timedelta(days=1)
-        return start, today
-
-    start = now - timedelta(days=30)
-    return start, now
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    raise PeriodError(f"unknown time zone: {name}")
+
+
+def _count(text: Optional[str]) -> int:
+    if not text:
+        return 1
+    if text.isdigit():
+        return int(text)
+    if text in _NUMBERS:
+        return _NUMBERS[text]
+    raise PeriodError(f"not a number: {text!r}; give a count such as 'last 3 days'")
+
+
+def _moment(text: str, tz: tzinfo) -> Tuple[datetime, bool]:
+    """Parse an ISO date or datetime; returns (moment, is_date_only). Naive values are in ``tz``."""
+    try:
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", text):
+            day = date.fromisoformat(text)
+            return datetime(day.year, day.month, day.day, tzinfo=tz), True
+        moment = datetime.fromisoformat(text.upper())
+    except ValueError:
+        raise PeriodError(f"not an ISO date or datetime: {text}")
+    return (moment if moment.tzinfo else moment.replace(tzinfo=tz)), False
+
+
+@functools.lru_cache(maxsize=512)
+def parse_period(period: str) -> Period:
+    """
+    Parse ``period`` into a :class:`Period`; results are memoized, so
+    agents repeating the same phrase pay for the regexes once. Raises
+    PeriodError (a ValueError) for text the grammar does not cover.
+
+    Understood: "today", "yesterday", "last|past N minutes|hours|days|weeks|
+    months|years", "N days ago", "this|last week|month|quarter|year", "ytd",
+    "Q3", "Q3 2025", "2025-Q3", "March", "March 2025", "monday", "last
+    monday", "since monday", "since 2025-01-01", ISO ranges such as
+    "2025-01-01..2025-01-31" or "from 2025-01-01T09:00+05:30 to 2025-01-02",
+    each optionally followed by a time zone ("UTC", "+05:30", "UTC-3",
+    "Europe/Berlin") used for day boundaries and naive datetimes.
+    """
+    text = " ".join((period or DEFAULT_PERIOD).split())
+    tz: tzinfo = timezone.utc
+    suffix = _TZ_SUFFIX.search(text)
+    if suffix:
+        tz = _zone(suffix.group("tz"))
+        text = text[: suffix.start()]
+    p = _FILLER.sub("", text.lower().strip(" .?!")).strip()
+    if not p:
+        raise PeriodError(f"could not understand period: {period!r}")
+
+    if p in {"today", "yesterday"}:
+        return Period("calendar", 0 if p == "today" else 1, "day", tz=tz)
+    if p in {"ytd", "year to date"}:
+        return Period("calendar", 0, "year", tz=tz)
+    if p in {"mtd", "month to date"}:
+        return Period("calendar", 0, "month", tz=tz)
+
+    m = _CALENDAR.match(p)
+    if m:
+        back = 0 if m.group("which") in {"this", "current"} else 1
+        if m.group("unit") == "day" and back:
+            # "last day" reads as the last 24 hours, not yesterday.
+            return Period("rolling", 1, "days", tz=tz)
+        return Period("calendar", back, m.group("unit"), tz=tz)
+
+    m = _ROLLING.match(p)
+    if m and m.group("unit") in _UNITS:
+        return Period("rolling", _count(m.group("n") or m.group("word")), _UNITS[m.group("unit")], tz=tz)
+
+    m = _AGO.match(p)
+    if m and _UNITS.get(m.group("unit")) == "days":
+        return Period("calendar", _count(m.group("n")), "day", tz=tz)
+
+    m = _QUARTER.match(p)
+    if m:
+        quarter = int(m.group("q1") or m.group("q2"))
+        year = m.group("y1") or m.group("y2")
+        return Period("quarter", quarter, year=int(year) if year else None, tz=tz)
+
+    m = _MONTH.match(p)
+    if m and m.group("month") in _MONTHS:
+        month = _MONTHS.index(m.group("month")) + 1
+        return Period("month", month, year=int(m.group("year")) if m.group("year") else None, tz=tz)
+
+    m = _WEEKDAY.match(p)
+    if m and m.group("day") in _WEEKDAYS:
+        since = (m.group("since") or "").strip()
+        return Period("weekday", _WEEKDAYS.index(m.group("day")), since or "on", tz=tz)
+
+    m = _SINCE.match(p)
+    if m:
+        start, _ = _moment(m.group("a"), tz)
+        return Period("since", start=start, tz=tz)
+
+    m = _RANGE.match(p)
+    if m:
+        start, _ = _moment(m.group("a"), tz)
+        end, end_is_date = _moment(m.group("b"), tz)
+        if end_is_date:
+            end = end + timedelta(days=1) - timedelta(microseconds=1)
+        if end < start:
+            raise PeriodError(f"period ends before it starts: {period!r}")
+        return Period("range", start=start, end=end, tz=tz)
+
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", p):
+        start, _ = _moment(p, tz)
+        return Period("range", start=start, end=start + timedelta(days=1) - timedelta(microseconds=1), tz=tz)
+
+    raise PeriodError(
+        f"could not understand period: {period!r}. Try e.g. 'last 7 days', 'last 2 weeks', "
+        "'this month', 'Q3 2025', 'since monday' or '2025-01-01..2025-01-31'."
+    )
+
+
+def _shift_months(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    next_month = datetime(year + (month == 12), month % 12 + 1, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return moment.replace(year=year, month=month, day=min(moment.day, last_day))
+
+
+def _calendar_start(local_now: datetime, unit: str) -> datetime:
+    day = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "day":
+        return day
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    if unit == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def _calendar_step(start: datetime, unit: str, n: int) -> datetime:
+    if unit == "day":
+        return start + timedelta(days=n)
+    if unit == "week":
+        return start + timedelta(weeks=n)
+    return _shift_months(start, n * {"month": 1, "quarter": 3, "year": 12}[unit])
+
+
+def _resolve(parsed: Period, now: datetime, current: datetime) -> Tuple[datetime, datetime]:
+    """Window of ``parsed``: rolling ends use the aligned ``now``, day boundaries the real ``current``."""
+    local = current.astimezone(parsed.tz)
+    last = timedelta(microseconds=1)
+
+    if parsed.kind == "rolling":
+        if parsed.unit in {"months", "years"}:
+            months = parsed.amount * (12 if parsed.unit == "years" else 1)
+            return _shift_months(now.astimezone(parsed.tz), -months), now
+        return now - timedelta(**{parsed.unit: parsed.amount}), now
+
+    if parsed.kind == "calendar":
+        start = _calendar_start(local, parsed.unit)
+        if parsed.amount == 0:
+            return start, now
+        start = _calendar_step(start, parsed.unit, -parsed.amount)
+        return start, _calendar_step(start, parsed.unit, 1) - last
+
+    if parsed.kind in {"quarter", "month"}:
+        first_month = (parsed.amount - 1) * 3 + 1 if parsed.kind == "quarter" else parsed.amount
+        year = parsed.year if parsed.year is not None else local.year
+        start = datetime(year, first_month, 1, tzinfo=parsed.tz)
+        if parsed.year is None and start > local:
+            start = start.replace(year=year - 1)
+        end = _shift_months(start, 3 if parsed.kind == "quarter" else 1) - last
+        return start, min(end, now)
+
+    if parsed.kind == "weekday":
+        today = _calendar_start(local, "day")
+        back = (today.weekday() - parsed.amount) % 7
+        if parsed.unit == "last" and back == 0:
+            back = 7
+        start = today - timedelta(days=back)
+        if parsed.unit == "since":
+            return start, now
+        return start, min(start + timedelta(days=1) - last, now)
+
+    if parsed.kind == "since":
+        return parsed.start, now
+    return parsed.start, parsed.end
+
+
+def get_time_range(
+    period: str, granularity: Optional[str] = None, now: Optional[datetime] = None
+) -> Tuple[datetime, datetime]:
+    """
+    Resolve ``period`` (see :func:`parse_period`) to a (start, end) UTC
+    window; an empty period means the last 30 days. ``now`` (default: the
+    current time) is rounded up to ``granularity``, TIME_WINDOW_ALIGNMENT
+    unless given, before rolling windows are computed from it. Raises
+    PeriodError for periods the grammar does not understand.
+    """
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    current = now or datetime.now(timezone.utc)
+    parsed = parse_period((period or DEFAULT_PERIOD).strip())
+    start, end = _resolve(parsed, align(current, granularity), current)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from .audit_logger import bind as bind_audit_context
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def max_concurrency_from_env(server: str) -> int:
+    """
+    Resolve the concurrency cap for a server, e.g. ``PR_SERVER_MAX_CONCURRENCY``,
+    falling back to ``MCP_SERVER_MAX_CONCURRENCY`` and then the default.
+    """
+    for name in (f"{server.upper()}_SERVER_MAX_CONCURRENCY", "MCP_SERVER_MAX_CONCURRENCY"):
+        value = os.getenv(name)
+        if value and value.strip():
+            try:
+                return max(1, int(value))
+            except ValueError:
+                continue
+    return DEFAULT_MAX_CONCURRENCY
+
+
+class ToolExecutor:
+    """
+    Runs the synchronous tool functions on a bounded worker pool so an async
+    FastMCP server can keep serving other tool calls while a query is running.
+
+    At most ``max_concurrency`` tool calls execute at once; further calls wait
+    in the executor queue. Keep this at or below DATABASE_POOL_MAX_SIZE so
+    workers do not block on connection checkout.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix=f"{name}-tool"
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+        self._completed = 0
+
+    def _call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Await ``fn(*args, **kwargs)`` on a worker thread, preserving contextvars.
+        Each call gets its own request id and is tagged with the tool name
+        (``<executor name>.<function name>``) so its audit events and SQL can
+        be attributed without stack inspection.
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        ctx.run(
+            bind_audit_context,
+            request_id=uuid.uuid4().hex[:12],
+            tool=f"{self.name}.{getattr(fn, '__name__', 'tool')}",
+        )
+        with self._lock:
+            self._submitted += 1
+        call = functools.partial(ctx.run, self._call, fn, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = self._running
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": running,
+                "queued": self._submitted - self._completed - running,
+                "completed": self._completed,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,8 @@
 from pathlib import Path
 from agents import Agent, Runner
-from agents.mcp import MCPServerStdio
+from agents.mcp import MCPServerStdio, create_static_tool_filter
 from dotenv import load_dotenv
+import os
 import sys
 import asyncio
 from commit_message import COMMIT_BOT_MESSAGE
@@ -16,7 +17,10 @@ async def run():
             "command": sys.executable,
             "args": ["-m", "mcp_server.up_commit_server"],
             "cwd": str(project_root),
+            "env": {**os.environ, "AUDIT_AGENT_NAME": "commit_agent"},
         },
+        # warm_up is internal to the manager's startup; keep it out of the agent's tools.
+        tool_filter=create_static_tool_filter(blocked_tool_names=["warm_up"]),
     ) as server:
         log_agent_start("commit_agent")
         agent = Agent(
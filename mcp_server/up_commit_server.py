@@ -1,40 +1,108 @@
 from mcp.server.fastmcp import FastMCP
 
 from mcp_server import up_commit_tools as commit_tools
+from mcp_server.change_capture import CHANGE_CAPTURE
+from mcp_server.tool_executor import ToolExecutor, max_concurrency_from_env
+from mcp_server.warmup import start_warm_up, wait_for_warm_up
 
 mcp = FastMCP("Commit Analytics MCP Server")
+executor = ToolExecutor("commit", max_concurrency_from_env("commit"))
+
+# Read-only tools accept bypass_cache=True to skip the in-process result cache
+# when the caller needs data that is fresher than the tool's TTL.
 
 
 @mcp.tool()
-def get_table_schema(table_name: str) -> dict:
+async def get_table_schema(table_name: str, bypass_cache: bool = False) -> dict:
     """Get the schema of the table with table name"""
-    return commit_tools.get_table_schema(table_name)
+    return await executor.run(commit_tools.get_table_schema, table_name, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_commit_summary(commit_id: int) -> dict:
+async def get_commit_summary(commit_id: int, bypass_cache: bool = False) -> dict:
     """Get the summary about the given commit made with the given commit id """
-    return commit_tools.get_commit_summary(commit_id)
+    return await executor.run(commit_tools.get_commit_summary, commit_id, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_commit_count_period(period: str) -> dict:
+async def get_commit_summary_batch(commit_ids: list[int], bypass_cache: bool = False) -> dict:
+    """Get the summaries of several commits (up to 100 ids) in one call, keyed by commit id;
+    ids that were not found are listed under "missing"."""
+    return await executor.run(
+        commit_tools.get_commit_summary_batch, commit_ids, bypass_cache=bypass_cache
+    )
+
+
+@mcp.tool()
+async def get_commit_count_period(period: str, bypass_cache: bool = False) -> dict:
     """Get the count of commit for a given period of time either in terms of n days or 
     weeks or months 
     """
-    return commit_tools.get_commit_count_period(period)
+    return await executor.run(commit_tools.get_commit_count_period, period, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_commits_period(period: str, offset: int = 0, limit: int | None = None) -> dict:
+async def get_commits_period(
+    period: str,
+    offset: int = 0,
+    limit: int | None = None,
+    cursor: str | None = None,
+    columnar: bool = False,
+    bypass_cache: bool = False,
+) -> dict:
     """Get the details of the commits for a given period of time either in terms of n days or
-    weeks or months 
+    weeks or months. To fetch the next page, pass the previous response's next_cursor as
+    cursor (preferred over offset). columnar=True returns "columns" once and each commit
+    as an array of values in that order (smaller responses for long pages).
     """
-    return commit_tools.get_commits_period(period, offset, limit)
+    return await executor.run(
+        commit_tools.get_commits_period,
+        period,
+        offset,
+        limit,
+        cursor,
+        columnar=columnar,
+        bypass_cache=bypass_cache,
+    )
+
+
+@mcp.tool()
+async def get_commit_aggregates(
+    period: str,
+    metric: str | None = None,
+    stats: list[str] | None = None,
+    group_by: str | None = None,
+    buckets: int | None = None,
+    limit: int | None = None,
+    bypass_cache: bool = False,
+) -> dict:
+    """Aggregate commits in a period, computed in the database. metric is one of
+    lines_added, lines_removed or churn_lines; stats picks from count, sum, avg, min, max,
+    p50, p90, p99 and histogram (buckets equal-width bins, default 10);
+    group_by is author, repo, branch or day (up to limit groups, default 50).
+    Use this instead of listing commits when you need totals, averages or distributions."""
+    return await executor.run(
+        commit_tools.get_commit_aggregates,
+        period,
+        metric,
+        stats,
+        group_by,
+        buckets,
+        limit,
+        bypass_cache=bypass_cache,
+    )
 
 
 @mcp.tool()
-def run_custom_commit_query(
+async def get_commit_trend(period: str, bucket: str | None = None, bypass_cache: bool = False) -> dict:
+    """Time series of commit count and lines added/removed per day, week or month
+    (bucket) over a period, in one call; buckets without commits are zero-filled. Use it for trend
+    questions instead of one count call per interval."""
+    return await executor.run(commit_tools.get_commit_trend, period, bucket, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def run_custom_commit_query(
     
     sql: str, params: list | None = None, limit: int | None = None
 ) -> dict:
@@ -42,9 +110,27 @@ def run_custom_commit_query(
     required data through existing tools, and only use this if you need to do something that is not supported by other tools.
     The SQL must be written in PostgreSQL syntax.
     """
-    return commit_tools.run_custom_commit_query(sql, params, limit)
+    return await executor.run(commit_tools.run_custom_commit_query, sql, params, limit)
+
+
+@mcp.tool()
+async def get_server_stats() -> dict:
+    """Internal: database connection pool and tool executor statistics for monitoring."""
+    res = commit_tools.get_server_stats()
+    res["data"]["executor"] = executor.stats()
+    return res
+
+
+@mcp.tool()
+async def warm_up() -> dict:
+    """Internal: wait until the connection pool is open and the schema is cached; returns timings."""
+    return await executor.run(wait_for_warm_up)
 
 
 if __name__ == "__main__":
     print("Updated Commit MCP Server starting...")
+    # Connect the pool and load the schema while the client is still handshaking.
+    start_warm_up("commit")
+    # Poll for new/changed rows so cached results and rollups stay current.
+    CHANGE_CAPTURE.start()
     mcp.run(transport="stdio")
@@ -1,12 +1,29 @@
 from typing import Any, Dict, Optional, Sequence
-import re
 
-from .audit_logger import log_tool_call
-from .database import Database
+from .aggregates import AggregateSpec, aggregate, trend
+from .audit_logger import log_tool_call, stats as audit_stats
+from .change_capture import CHANGE_CAPTURE, ChangeSet
+from .database import Database, pool_stats
+from .pagination import decode_cursor, next_cursor, normalize_ids, pop_total_count, split_total_count
+from .result_cache import RESULT_CACHE, cached, invalidate_changed
+from .rollups import ROLLUPS
+from .schema_cache import SCHEMA_CACHE
+from .sql_guard import ScopedQuery, cache_info as sql_guard_stats, check_read_only, scope_to_org
 from .time_filter import get_time_range
 
 ORG_ALLOWED = 2133
 DEFAULT_LIMIT = 50
+# Row cap for run_custom_commit_query, whatever LIMIT the SQL itself asks for.
+MAX_CUSTOM_LIMIT = 500
+# statement_timeout for custom queries; override with
+# DATABASE_STATEMENT_TIMEOUT_MS_COMMIT_RUN_CUSTOM_COMMIT_QUERY.
+CUSTOM_QUERY_TIMEOUT_MS = 15000
+
+# Result cache TTLs (seconds); override per tool with RESULT_CACHE_TTL_COMMIT_<TOOL>.
+RECORD_TTL = 300
+PERIOD_TTL = 60
+# Most ids accepted by one *_batch call.
+MAX_BATCH_IDS = 100
 
 
 def _success(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -25,24 +42,43 @@ def _norm_params(params: Optional[Sequence]) -> tuple:
     return (params,)
 
 
-def get_table_schema(table_name: str) -> Dict:
+def _on_commit_changes(change: ChangeSet) -> None:
+    """Drop cached results and re-roll the days touched by commits added or changed since the last poll."""
+    invalidate_changed("commit.", change.ids)
+    # An edited row may have left another day; that day is re-rolled too.
+    ROLLUPS.refresh_days("commit", ORG_ALLOWED, change.days | change.moved_from)
+
+
+CHANGE_CAPTURE.subscribe("commit", _on_commit_changes)
+
+
+def get_server_stats() -> Dict:
+    log_tool_call("commit.get_server_stats")
+    return _success(
+        {
+            "pool": pool_stats(),
+            "cache": RESULT_CACHE.stats(),
+            "schema": SCHEMA_CACHE.stats(),
+            "audit": audit_stats(),
+            "sql_guard": sql_guard_stats(),
+            "rollups": ROLLUPS.stats(),
+            "change_capture": CHANGE_CAPTURE.stats(),
+        }
+    )
+
+
+def get_table_schema(table_name: str, bypass_cache: bool = False) -> Dict:
     log_tool_call("commit.get_table_schema", table=table_name)
-    sql = """
-    SELECT column_name, data_type
-    FROM information_schema.columns
-    WHERE table_schema = 'insightly' AND table_name = %s
-    ORDER BY ordinal_position
-    """
-    db = Database()
+    # Served from the in-memory schema snapshot; bypass_cache forces a reload.
+    if bypass_cache:
+        SCHEMA_CACHE.invalidate()
     try:
-        res = db.execute_query(sql, params=(table_name,))
-        if not res["success"]:
-            return _error(res.get("error"))
-        return _success({"columns": res["rows"]})
-    finally:
-        db.close()
+        return _success({"columns": SCHEMA_CACHE.columns(table_name)})
+    except Exception as e:
+        return _error(e)
 
 
+@cached("commit.get_commit_summary", ttl=RECORD_TTL)
 def get_commit_summary(commit_id: int) -> Dict:
     log_tool_call("commit.get_commit_summary", commit_id=commit_id)
     sql = """
@@ -74,9 +110,69 @@ def get_commit_summary(commit_id: int) -> Dict:
         db.close()
 
 
+@cached("commit.get_commit_summary_batch", ttl=RECORD_TTL)
+def get_commit_summary_batch(commit_ids: Sequence[int]) -> Dict:
+    """
+    get_commit_summary for up to MAX_BATCH_IDS commit ids in one query.
+    Returns {"results": {"<id>": commit, ...}, "missing": [ids not found]}.
+    """
+    log_tool_call("commit.get_commit_summary_batch", commit_ids=commit_ids)
+    try:
+        ids = normalize_ids(commit_ids, "commit_ids", MAX_BATCH_IDS)
+    except ValueError as e:
+        return _error(str(e))
+    sql = """
+    SELECT
+        id,
+        commitid,
+        authorid,
+        message,
+        repoid,
+        branch,
+        date,
+        linesadded,
+        linesremoved,
+        htmllink,
+        type
+    FROM insightly.commit
+    WHERE organizationid = %s AND id = ANY(%s)
+    """
+    db = Database()
+    try:
+        res = db.execute_query(sql, params=(ORG_ALLOWED, ids))
+        if not res["success"]:
+            return _error(res.get("error", "query failed"))
+        found: Dict[int, Dict[str, Any]] = {}
+        for row in res["rows"]:
+            found.setdefault(row["id"], row)
+        return _success(
+            {
+                "results": {str(commit_id): found[commit_id] for commit_id in ids if commit_id in found},
+                "missing": [commit_id for commit_id in ids if commit_id not in found],
+            }
+        )
+    finally:
+        db.close()
+
+
+@cached("commit.get_commit_count_period", ttl=PERIOD_TTL)
 def get_commit_count_period(period: str) -> Dict:
     log_tool_call("commit.get_commit_count_period", period=period)
-    start_dt, end_dt = get_time_range(period)
+    try:
+        start_dt, end_dt = get_time_range(period)
+    except ValueError as e:
+        return _error(str(e))
+    # Whole past days come from the daily rollups; only the partial days hit the raw table.
+    count = ROLLUPS.count("commit", ORG_ALLOWED, start_dt, end_dt)
+    if count is not None:
+        return _success(
+            {
+                "period": period,
+                "start": start_dt.isoformat(),
+                "end": end_dt.isoformat(),
+                "commit_count": count,
+            }
+        )
     sql = """
     SELECT COUNT(*) AS commit_count
     FROM insightly.commit
@@ -103,10 +199,34 @@ def get_commit_count_period(period: str) -> Dict:
         db.close()
 
 
+@cached("commit.get_commits_period", ttl=PERIOD_TTL)
 def get_commits_period(
-    period: str, offset: int = 0, limit: Optional[int] = None
+    period: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    columnar: bool = False,
 ) -> Dict:
-    log_tool_call("commit.get_commits_period", period=period, offset=offset, limit=limit)
+    """
+    List commits in a period, newest first.
+
+    Pass ``cursor`` (the ``next_cursor`` of a previous page) instead of
+    ``offset`` to continue a listing: the window is pinned to the first page
+    and rows are fetched by keyset on (date, id), so deep pages cost the same
+    as the first and stay stable while new commits arrive.
+
+    With ``columnar=True`` the page is returned as ``columns`` plus
+    ``commits`` as value arrays in that column order, instead of one object
+    per commit; the JSON is much smaller for long pages.
+    """
+    log_tool_call(
+        "commit.get_commits_period",
+        period=period,
+        offset=offset,
+        limit=limit,
+        cursor=cursor,
+        columnar=columnar or None,
+    )
     try:
         offset_val = int(offset)
         if offset_val < 0:
@@ -124,7 +244,20 @@ def get_commits_period(
         except Exception:
             return _error("limit must be an integer")
 
-    start_dt, end_dt = get_time_range(period)
+    state = None
+    if cursor:
+        try:
+            state = decode_cursor(cursor, kind="commit")
+        except ValueError as e:
+            return _error(str(e))
+        start_iso, end_iso = state["start"], state["end"]
+        offset_val = int(state.get("n", 0))
+    else:
+        try:
+            start_dt, end_dt = get_time_range(period)
+        except ValueError as e:
+            return _error(str(e))
+        start_iso, end_iso = start_dt.isoformat(), end_dt.isoformat()
 
     count_sql = """
     SELECT COUNT(*) AS commit_count
@@ -132,6 +265,9 @@ def get_commits_period(
     WHERE organizationid = %s
       AND date BETWEEN %s AND %s
     """
+    # On the first page the window count rides along with the rows so total
+    # and page come back in a single statement (it is evaluated before LIMIT).
+    # Cursor pages reuse the total carried in the cursor and seek by keyset.
     list_sql = """
     SELECT
         id,
@@ -142,88 +278,187 @@ def get_commits_period(
         repoid,
         branch,
         linesadded,
-        linesremoved
+        linesremoved{total_column}
     FROM insightly.commit
     WHERE organizationid = %s
-      AND date BETWEEN %s AND %s
-    ORDER BY date DESC
-    LIMIT %s OFFSET %s
+      AND date BETWEEN %s AND %s{keyset}
+    ORDER BY date DESC, id DESC
+    LIMIT %s{offset}
     """
+    params: list[Any] = [ORG_ALLOWED, start_iso, end_iso]
+    if state is not None:
+        list_sql = list_sql.format(
+            total_column="",
+            keyset="\n      AND (date, id) < (%s, %s)",
+            offset="",
+        )
+        params.extend(state["after"])
+        params.append(limit_val)
+    else:
+        list_sql = list_sql.format(
+            total_column=",\n        COUNT(*) OVER () AS total_count",
+            keyset="",
+            offset=" OFFSET %s",
+        )
+        params.extend([limit_val, offset_val])
 
     db = Database()
     try:
-        count_res = db.execute_query(
-            count_sql, params=(ORG_ALLOWED, start_dt.isoformat(), end_dt.isoformat())
-        )
-        if not count_res["success"]:
-            return _error(count_res.get("error"))
-        total = count_res["rows"][0].get("commit_count", 0) if count_res["rows"] else 0
-
-        list_res = db.execute_query(
-            list_sql,
-            params=(
-                ORG_ALLOWED,
-                start_dt.isoformat(),
-                end_dt.isoformat(),
-                limit_val,
-                offset_val,
-            ),
-        )
+        list_res = db.execute_query(list_sql, params=tuple(params), columnar=columnar)
         if not list_res["success"]:
             return _error(list_res.get("error"))
+        rows = list_res.get("rows", [])
+        columns = list_res.get("columns")
 
-        return _success(
-            {
-                "period": period,
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat(),
-                "offset": offset_val,
-                "limit": limit_val,
-                "commit_count": int(total),
-                "commits": list_res.get("rows", []),
-            }
+        if state is not None:
+            total = state.get("t")
+        else:
+            if columnar:
+                columns, rows, total = split_total_count(columns, rows)
+            else:
+                total = pop_total_count(rows)
+            if total is None:
+                # Past the last page the window count has no row to ride on.
+                total = 0
+                if offset_val > 0:
+                    count_res = db.execute_query(
+                        count_sql, params=(ORG_ALLOWED, start_iso, end_iso)
+                    )
+                    if not count_res["success"]:
+                        return _error(count_res.get("error"))
+                    total = count_res["rows"][0].get("commit_count", 0) if count_res["rows"] else 0
+
+        payload = {
+            "period": period,
+            "start": start_iso,
+            "end": end_iso,
+            "offset": offset_val,
+            "limit": limit_val,
+            "commit_count": int(total or 0),
+        }
+        if columnar:
+            payload["columns"] = columns
+        payload["commits"] = rows
+        payload["next_cursor"] = next_cursor(
+            "commit",
+            rows,
+            limit_val,
+            position=offset_val + len(rows),
+            total=total,
+            sort_key="date",
+            id_key="id",
+            columns=columns if columnar else None,
+            start=start_iso,
+            end=end_iso,
         )
+        return _success(payload)
     finally:
         db.close()
 
 
-def _is_read_only_select(sql: str) -> bool:
-    s = sql.strip().lower()
-    s = re.sub(r"^\(+", "", s).strip()
-    if not s.startswith("select"):
-        return False
-    forbidden = [
-        "insert",
-        "update",
-        "delete",
-        "drop",
-        "alter",
-        "truncate",
-        "create",
-        ";",
-        "grant",
-        "revoke",
-        "call",
-        "merge",
-    ]
-    for kw in forbidden:
-        if kw in s:
-            return False
-    return True
-
+# Aggregates over a period, computed in SQL (see mcp_server/aggregates.py).
+COMMIT_AGGREGATES = AggregateSpec(
+    table="commit",
+    time_column="date",
+    metrics={
+        "lines_added": "linesadded",
+        "lines_removed": "linesremoved",
+        "churn_lines": "COALESCE(linesadded, 0) + COALESCE(linesremoved, 0)",
+    },
+    groups={
+        "author": ("authorid",),
+        "repo": ("repoid", "repositoryid"),
+        "branch": ("branch",),
+    },
+)
+
+
+@cached("commit.get_commit_aggregates", ttl=PERIOD_TTL)
+def get_commit_aggregates(
+    period: str,
+    metric: Optional[str] = None,
+    stats: Optional[Sequence[str]] = None,
+    group_by: Optional[str] = None,
+    buckets: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict:
+    """
+    Aggregate commits in ``period`` in a single SQL query.
 
-def _has_limit_clause(sql: str) -> bool:
-    return bool(re.search(r"\blimit\b", sql, flags=re.IGNORECASE))
+    ``stats`` picks from count, sum, avg, min, max, p50, p90, p99 and
+    histogram (default: count alone, or count/avg/p50/p90 with a
+    ``metric``); ``group_by`` is one of author, repo, branch or day. The
+    result is columnar (``columns`` plus ``rows`` of values), with the
+    histogram as ``buckets`` equal-width [lower, upper, count] rows.
+    """
+    log_tool_call(
+        "commit.get_commit_aggregates",
+        period=period,
+        metric=metric,
+        stats=stats,
+        group_by=group_by,
+        buckets=buckets,
+        limit=limit,
+    )
+    try:
+        start_dt, end_dt = get_time_range(period)
+        start, end = start_dt.isoformat(), end_dt.isoformat()
+        result = aggregate(
+            COMMIT_AGGREGATES,
+            ORG_ALLOWED,
+            start,
+            end,
+            metric=metric,
+            stats=stats,
+            group_by=group_by,
+            buckets=buckets,
+            limit=limit,
+        )
+    except (ValueError, RuntimeError) as e:
+        return _error(str(e))
+    return _success(
+        {"period": period, "start": start, "end": end, "metric": metric, "group_by": group_by, **result}
+    )
 
 
-def _contains_org_filter(sql: str) -> bool:
-    return "organizationid" in sql.lower()
+# Output column -> (aggregate over commit rows, value for buckets without commits).
+COMMIT_TREND_SERIES = {
+    "commit_count": ("COUNT(*)", 0),
+    "lines_added": ("SUM(linesadded)", 0),
+    "lines_removed": ("SUM(linesremoved)", 0),
+}
 
 
-def _wrap_with_org_and_limit(sql: str, params: tuple, limit: int = DEFAULT_LIMIT):
-    wrapped_sql = f"SELECT * FROM ({sql}) AS sub WHERE sub.organizationid = %s LIMIT %s"
-    wrapped_params = tuple(params) + (ORG_ALLOWED, limit)
-    return wrapped_sql, wrapped_params
+@cached("commit.get_commit_trend", ttl=PERIOD_TTL)
+def get_commit_trend(period: str, bucket: Optional[str] = None) -> Dict:
+    """
+    Commit count and lines added/removed per day, week or month of
+    ``period``, from a single generate_series query so buckets without
+    commits come back as zeros instead of being missing. ``bucket``
+    defaults to day for up to a month, week up to six months, else month.
+    """
+    log_tool_call("commit.get_commit_trend", period=period, bucket=bucket)
+    try:
+        start_dt, end_dt = get_time_range(period)
+        result = trend(COMMIT_AGGREGATES, ORG_ALLOWED, start_dt, end_dt, COMMIT_TREND_SERIES, bucket=bucket)
+    except (ValueError, RuntimeError) as e:
+        return _error(str(e))
+    return _success(
+        {"period": period, "start": start_dt.isoformat(), "end": end_dt.isoformat(), **result}
+    )
+
+
+def _scope_custom_query(sql: str, limit: Optional[int]) -> ScopedQuery:
+    """Push the org filter into every commit-schema table and cap the rows returned."""
+    return scope_to_org(
+        sql,
+        schema=SCHEMA_CACHE.schema,
+        org_column="organizationid",
+        org_id=ORG_ALLOWED,
+        columns_for=SCHEMA_CACHE.column_names,
+        default_limit=limit or DEFAULT_LIMIT,
+        max_limit=limit or MAX_CUSTOM_LIMIT,
+    )
 
 
 def run_custom_commit_query(
@@ -232,39 +467,38 @@ def run_custom_commit_query(
     log_tool_call("commit.run_custom_commit_query")
     if not isinstance(sql, str) or not sql.strip():
         return _error("Invalid SQL provided")
-    if ";" in sql.strip().rstrip().rstrip(";"):
-        return _error("Multiple SQL statements are not allowed")
-    if not _is_read_only_select(sql):
-        return _error("Only read-only SELECT queries are allowed")
+    verdict = check_read_only(sql)
+    if not verdict.ok:
+        return _error(verdict.reason)
 
     params_t = _norm_params(params)
-    user_limit = DEFAULT_LIMIT
+    user_limit = None
     if limit is not None:
         try:
             user_limit = int(limit)
-            if user_limit <= 0 or user_limit > 500:
-                return _error("limit must be between 1 and 500")
+            if user_limit <= 0 or user_limit > MAX_CUSTOM_LIMIT:
+                return _error(f"limit must be between 1 and {MAX_CUSTOM_LIMIT}")
         except Exception:
             return _error("invalid limit value")
 
-    db = Database()
     try:
-        if _contains_org_filter(sql):
-            if not _has_limit_clause(sql):
-                wrapped_sql = f"SELECT * FROM ({sql}) AS sub LIMIT %s"
-                wrapped_params = tuple(params_t) + (user_limit,)
-                res = db.execute_query(wrapped_sql, params=wrapped_params)
-            else:
-                res = db.execute_query(sql, params=params_t)
-        else:
-            wrapped_sql, wrapped_params = _wrap_with_org_and_limit(
-                sql, params_t, user_limit
-            )
-            res = db.execute_query(wrapped_sql, params=wrapped_params)
+        scoped = _scope_custom_query(sql, user_limit)
+    except ValueError as e:
+        return _error(str(e))
+    except Exception:
+        return _error("Table metadata is unavailable; cannot scope the query.")
 
-        if not res["success"]:
-            return _error("Query execution failed (internal error).")
-        rows = res.get("rows", [])
-        return _success({"rows": rows, "rowcount": len(rows)})
+    db = Database()
+    try:
+        rejected = db.check_cost(scoped.sql, params_t, timeout_ms=CUSTOM_QUERY_TIMEOUT_MS)
+        if rejected is not None:
+            return rejected
+        return db.run_streamed(
+            scoped.sql,
+            params_t,
+            caller="commit.run_custom_commit_query",
+            timeout_ms=CUSTOM_QUERY_TIMEOUT_MS,
+            max_rows=scoped.limit,
+        )
     finally:
         db.close()
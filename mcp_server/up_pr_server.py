@@ -1,80 +1,185 @@
 from mcp.server.fastmcp import FastMCP
 from mcp_server import up_pr_tools as pr_tools
+from mcp_server.change_capture import CHANGE_CAPTURE
+from mcp_server.tool_executor import ToolExecutor, max_concurrency_from_env
+from mcp_server.warmup import start_warm_up, wait_for_warm_up
 
 
 mcp = FastMCP("PR Analytics MCP Server")
+executor = ToolExecutor("pr", max_concurrency_from_env("pr"))
+
+# Read-only tools accept bypass_cache=True to skip the in-process result cache
+# when the caller needs data that is fresher than the tool's TTL.
 
 
 @mcp.tool()
-def list_tables() -> dict:
+async def list_tables(bypass_cache: bool = False) -> dict:
     """List available Insightly tables (internal use only)."""
-    return pr_tools.list_tables()
+    return await executor.run(pr_tools.list_tables, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_pr_table_schema(table_name: str) -> dict:
+async def get_pr_table_schema(table_name: str, bypass_cache: bool = False) -> dict:
     """Return column metadata for a given table name."""
-    return pr_tools.get_table_schema(table_name)
+    return await executor.run(pr_tools.get_pr_table_schema, table_name, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_pr_summary(pr_id: int) -> dict:
+async def get_pr_summary(pr_id: int, bypass_cache: bool = False) -> dict:
     """Fetch the full pull request record for the given PR id."""
-    return pr_tools.get_pr_summary(pr_id)
+    return await executor.run(pr_tools.get_pr_summary, pr_id, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_review_time(pr_id: int) -> dict:
+async def get_review_time(pr_id: int, bypass_cache: bool = False) -> dict:
     """Return review time metrics (in minutes) for a PR."""
-    return pr_tools.get_review_time(pr_id)
+    return await executor.run(pr_tools.get_review_time, pr_id, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_cycle_time(pr_id: int) -> dict:
+async def get_cycle_time(pr_id: int, bypass_cache: bool = False) -> dict:
     """Return cycle time metrics (in minutes) for a PR."""
-    return pr_tools.get_cycle_time(pr_id)
+    return await executor.run(pr_tools.get_cycle_time, pr_id, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_pr_count_period(period: str) -> dict:
+async def get_pr_count_period(period: str, bypass_cache: bool = False) -> dict:
     """Count PRs within a natural language period (e.g., 'last 5 days')."""
-    return pr_tools.get_pr_count_period(period)
+    return await executor.run(pr_tools.get_pr_count_period, period, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def get_prs_by_period(
+async def get_prs_by_period(
     period: str,
     offset: int = 0,
     limit: int | None = None,
     min_cycle_time_minutes: float | None = None,
+    cursor: str | None = None,
+    columnar: bool = False,
+    bypass_cache: bool = False,
 ) -> dict:
-    """List PRs in a period with optional cycle-time filter."""
-    return pr_tools.get_prs_by_period(
+    """List PRs in a period with optional cycle-time filter. To fetch the next page, pass
+    the previous response's next_cursor as cursor (preferred over offset). columnar=True
+    returns "columns" once and each PR as an array of values in that order."""
+    return await executor.run(
+        pr_tools.get_prs_by_period,
         period,
         offset=offset,
         limit=limit,
         min_cycle_time_minutes=min_cycle_time_minutes,
+        cursor=cursor,
+        columnar=columnar,
+        bypass_cache=bypass_cache,
     )
 
 
 @mcp.tool()
-def get_churn_metrics(pr_id: int) -> dict:
+async def get_churn_metrics(pr_id: int, bypass_cache: bool = False) -> dict:
     """Compute churn metrics (lines added/removed, density, etc.) for a PR."""
-    return pr_tools.get_churn_metrics(pr_id)
+    return await executor.run(pr_tools.get_churn_metrics, pr_id, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def get_pr_metrics(
+    pr_id: int, fields: list[str] | None = None, bypass_cache: bool = False
+) -> dict:
+    """Several metrics of one PR in a single call. fields may list "cycle_time_minutes",
+    "review_time_minutes", "churn" (lines, per-file churn, files, commits), "summary" (the
+    full record) and/or pull_request column names; by default the first three."""
+    return await executor.run(pr_tools.get_pr_metrics, pr_id, fields, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def get_pr_summary_batch(pr_ids: list[int], bypass_cache: bool = False) -> dict:
+    """Fetch the full records of several PRs (up to 100 ids) in one call, keyed by PR id;
+    ids that were not found are listed under "missing"."""
+    return await executor.run(pr_tools.get_pr_summary_batch, pr_ids, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def get_cycle_time_batch(pr_ids: list[int], bypass_cache: bool = False) -> dict:
+    """Cycle times (minutes) of several PRs (up to 100 ids) in one call, keyed by PR id."""
+    return await executor.run(pr_tools.get_cycle_time_batch, pr_ids, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def get_review_time_batch(pr_ids: list[int], bypass_cache: bool = False) -> dict:
+    """Review times (minutes) of several PRs (up to 100 ids) in one call, keyed by PR id."""
+    return await executor.run(pr_tools.get_review_time_batch, pr_ids, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def get_churn_metrics_batch(pr_ids: list[int], bypass_cache: bool = False) -> dict:
+    """Churn metrics of several PRs (up to 100 ids) in one call, keyed by PR id."""
+    return await executor.run(pr_tools.get_churn_metrics_batch, pr_ids, bypass_cache=bypass_cache)
 
 
 @mcp.tool()
-def run_custom_pr_query(sql: str, params: list | None = None, limit: int | None = None) -> dict:
+async def get_pr_aggregates(
+    period: str,
+    metric: str | None = None,
+    stats: list[str] | None = None,
+    group_by: str | None = None,
+    buckets: int | None = None,
+    limit: int | None = None,
+    bypass_cache: bool = False,
+) -> dict:
+    """Aggregate PRs created in a period, computed in the database. metric is one of
+    cycle_time_minutes, review_time_minutes, commit_to_open_minutes, lines_added,
+    lines_removed, churn_lines, files_changed or commits_count; stats picks from count, sum,
+    avg, min, max, p50, p90, p99 and histogram (buckets equal-width bins, default 10);
+    group_by is author, repo, branch, state or day (up to limit groups, default 50).
+    Use this instead of listing PRs when you need totals, averages or distributions."""
+    return await executor.run(
+        pr_tools.get_pr_aggregates,
+        period,
+        metric,
+        stats,
+        group_by,
+        buckets,
+        limit,
+        bypass_cache=bypass_cache,
+    )
+
+
+@mcp.tool()
+async def get_pr_trend(period: str, bucket: str | None = None, bypass_cache: bool = False) -> dict:
+    """Time series of PR count, lines added/removed and median cycle time per day, week
+    or month (bucket) over a period, in one call; buckets without PRs are zero-filled. Use it for
+    "how did PR volume trend over the last 3 months" instead of one count call per interval."""
+    return await executor.run(pr_tools.get_pr_trend, period, bucket, bypass_cache=bypass_cache)
+
+
+@mcp.tool()
+async def run_custom_pr_query(sql: str, params: list | None = None, limit: int | None = None) -> dict:
     """Execute a safeguarded read-only PR query with enforced org scope and limits."""
-    return pr_tools.run_custom_pr_query(sql, params=params, limit=limit)
+    return await executor.run(pr_tools.run_custom_pr_query, sql, params=params, limit=limit)
+
+
+@mcp.tool()
+async def get_server_stats() -> dict:
+    """Internal: database connection pool and tool executor statistics for monitoring."""
+    res = pr_tools.get_server_stats()
+    res["data"]["executor"] = executor.stats()
+    return res
 
 
 @mcp.tool()
-def safe_sql(sql: str, params: list | None = None, limit: int | None = None) -> dict:
+async def safe_sql(sql: str, params: list | None = None, limit: int | None = None) -> dict:
     """Alias for run_custom_pr_query."""
-    return pr_tools.run_custom_pr_query(sql, params=params, limit=limit)
+    return await executor.run(pr_tools.run_custom_pr_query, sql, params=params, limit=limit)
+
+
+@mcp.tool()
+async def warm_up() -> dict:
+    """Internal: wait until the connection pool is open and the schema is cached; returns timings."""
+    return await executor.run(wait_for_warm_up)
 
 
 if __name__ == "__main__":
     print("Updated PR MCP Server starting...")
+    # Connect the pool and load the schema while the client is still handshaking.
+    start_warm_up("pr")
+    # Poll for new/changed rows so cached results and rollups stay current.
+    CHANGE_CAPTURE.start()
     mcp.run(transport="stdio")
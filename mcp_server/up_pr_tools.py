@@ -1,9 +1,15 @@
 # pr_tools.py
 from typing import Any, Dict, Optional, Sequence
-import re
 
-from .audit_logger import log_tool_call
-from .database import Database
+from .aggregates import AggregateSpec, aggregate, trend
+from .audit_logger import log_tool_call, stats as audit_stats
+from .change_capture import CHANGE_CAPTURE, ChangeSet
+from .database import Database, pool_stats
+from .pagination import decode_cursor, next_cursor, normalize_ids, pop_total_count, split_total_count
+from .result_cache import RESULT_CACHE, cached, invalidate_changed
+from .rollups import ROLLUPS
+from .schema_cache import SCHEMA_CACHE
+from .sql_guard import ScopedQuery, cache_info as sql_guard_stats, check_read_only, scope_to_org
 from .time_filter import get_time_range
 
 def _success(payload):
@@ -20,68 +26,104 @@ def _norm_params(params: Optional[Sequence]):
         return tuple(params)
     return (params,)
 
-# 1) list_tables - returns table names (internal use)
-def list_tables() -> Dict:
+# Result cache TTLs (seconds); override per tool with RESULT_CACHE_TTL_PR_<TOOL>.
+RECORD_TTL = 300
+PERIOD_TTL = 60
+# Most ids accepted by one *_batch call.
+MAX_BATCH_IDS = 100
+
+
+def _on_pr_changes(change: ChangeSet) -> None:
+    """Drop cached results and re-roll the days touched by PRs added or changed since the last poll."""
+    invalidate_changed("pr.", change.ids)
+    # An edited row may have left another day; that day is re-rolled too.
+    ROLLUPS.refresh_days("pull_request", ORG_ALLOWED, change.days | change.moved_from)
+
+
+CHANGE_CAPTURE.subscribe("pull_request", _on_pr_changes)
+
+
+# 0) get_server_stats - connection pool and cache counters for monitoring (internal use)
+def get_server_stats() -> Dict:
+    log_tool_call("pr.get_server_stats")
+    return _success(
+        {
+            "pool": pool_stats(),
+            "cache": RESULT_CACHE.stats(),
+            "schema": SCHEMA_CACHE.stats(),
+            "audit": audit_stats(),
+            "sql_guard": sql_guard_stats(),
+            "rollups": ROLLUPS.stats(),
+            "change_capture": CHANGE_CAPTURE.stats(),
+        }
+    )
+
+# 1) list_tables - returns table names (internal use), served from the schema cache
+def list_tables(bypass_cache: bool = False) -> Dict:
     log_tool_call("pr.list_tables")
-    sql = """
-    SELECT table_name
-    FROM information_schema.tables
-    WHERE table_schema = 'insightly'
-    """
-    db = Database()
-    res = db.execute_query(sql, params=())
-    if not res["success"]:
-        return _error(res.get("error"))
-    tables = [r.get("table_name") for r in res["rows"]]
-    db.close() 
-    return _success({"tables": tables})
-    
-
-# 2) get_table_schema(table_name) - returns column names/types
-def get_pr_table_schema(table_name: str) -> Dict:
+    if bypass_cache:
+        SCHEMA_CACHE.invalidate()
+    try:
+        return _success({"tables": SCHEMA_CACHE.tables()})
+    except Exception as e:
+        return _error(e)
+
+
+# 2) get_table_schema(table_name) - returns column names/types, served from the schema cache
+def get_pr_table_schema(table_name: str, bypass_cache: bool = False) -> Dict:
     """This tool has the whole table column information. This is the schema of the table."""
     log_tool_call("pr.get_table_schema", table=table_name)
-    sql = """
-    SELECT column_name, data_type
-    FROM information_schema.columns
-    WHERE table_schema = 'insightly' AND table_name = %s
-    ORDER BY ordinal_position
-    """
-    db = Database()
-    res = db.execute_query(sql, params=(table_name,))
-    if not res["success"]:
-        return _error(res.get("error"))
-    db.close() 
-    return _success({"columns": res["rows"]})
+    if bypass_cache:
+        SCHEMA_CACHE.invalidate()
+    try:
+        return _success({"columns": SCHEMA_CACHE.columns(table_name)})
+    except Exception as e:
+        return _error(e)
 
 # 3) get_pr_count_period(period) - returns count for organizationid=2133
+@cached("pr.get_pr_count_period", ttl=PERIOD_TTL)
 def get_pr_count_period(period: str) -> Dict:
     log_tool_call("pr.get_pr_count_period", period=period)
-    start_dt, end_dt = get_time_range(period)
+    try:
+        start_dt, end_dt = get_time_range(period)
+    except ValueError as e:
+        return _error(e)
     start = start_dt.isoformat()
     end = end_dt.isoformat()
+    # Whole past days come from the daily rollups; only the partial days hit the raw table.
+    count = ROLLUPS.count("pull_request", ORG_ALLOWED, start_dt, end_dt)
+    if count is not None:
+        return _success({"period": period, "start": start, "end": end, "pr_count": count})
     sql = """
     SELECT COUNT(*) AS pr_count
     FROM insightly.pull_request
     WHERE organizationid = 2133 AND createdon BETWEEN %s AND %s
     """
     db = Database()
-    res = db.execute_query(sql, params=(start, end))
-    if not res["success"]:
-        return _error(res.get("error"))
-    count = res["rows"][0].get("pr_count", 0) if res["rows"] else 0
-    db.close() 
-    return _success({"period": period, "start": start, "end": end, "pr_count": int(count)})
+    try:
+        res = db.execute_query(sql, params=(start, end))
+        if not res["success"]:
+            return _error(res.get("error"))
+        count = res["rows"][0].get("pr_count", 0) if res["rows"] else 0
+        return _success({"period": period, "start": start, "end": end, "pr_count": int(count)})
+    finally:
+        db.close()
 
 
+@cached("pr.get_prs_by_period", ttl=PERIOD_TTL)
 def get_prs_by_period(
     period: str,
     offset: int = 0,
     limit: Optional[int] = None,
     min_cycle_time_minutes: Optional[float] = None,
+    cursor: Optional[str] = None,
+    columnar: bool = False,
 ) -> Dict:
     """
     Return paginated PR metadata for a period, optionally filtering by cycle time.
+    Pass the returned next_cursor instead of offset to continue a listing; the
+    cursor pins the window and filter and seeks by (createdon, actualpullrequestid).
+    With columnar=True, "prs" holds value arrays in the order of "columns".
     """
     log_tool_call(
         "pr.get_prs_by_period",
@@ -89,6 +131,8 @@ def get_prs_by_period(
         offset=offset,
         limit=limit,
         min_cycle_time=min_cycle_time_minutes,
+        cursor=cursor,
+        columnar=columnar or None,
     )
 
     try:
@@ -108,9 +152,22 @@ def get_prs_by_period(
         except Exception:
             return _error("limit must be an integer")
 
-    start_dt, end_dt = get_time_range(period)
-    start_iso = start_dt.isoformat()
-    end_iso = end_dt.isoformat()
+    state = None
+    if cursor:
+        try:
+            state = decode_cursor(cursor, kind="pr")
+        except ValueError as e:
+            return _error(str(e))
+        start_iso, end_iso = state["start"], state["end"]
+        min_cycle_time_minutes = state.get("min_cycle")
+        offset_val = int(state.get("n", 0))
+    else:
+        try:
+            start_dt, end_dt = get_time_range(period)
+        except ValueError as e:
+            return _error(e)
+        start_iso = start_dt.isoformat()
+        end_iso = end_dt.isoformat()
 
     count_sql = """
     SELECT COUNT(*) AS pr_count
@@ -131,7 +188,7 @@ def get_prs_by_period(
         committoopenduration,
         linesadded,
         linesremoved,
-        modifiedfilescount
+        modifiedfilescount{total_column}
     FROM insightly.pull_request
     WHERE organizationid = %s
       AND createdon BETWEEN %s AND %s
@@ -143,35 +200,72 @@ def get_prs_by_period(
         list_sql += "      AND cycletimeduration >= %s\n"
         params_base.append(min_cycle_time_minutes)
 
-    list_sql += "    ORDER BY createdon DESC\n    LIMIT %s OFFSET %s\n"
+    if state is not None:
+        # Keyset page: total comes from the cursor, no window count needed.
+        list_sql = list_sql.format(total_column="")
+        list_sql += "      AND (createdon, actualpullrequestid) < (%s, %s)\n"
+        list_sql += "    ORDER BY createdon DESC, actualpullrequestid DESC\n    LIMIT %s\n"
+        list_params = tuple(params_base + list(state["after"]) + [limit_val])
+    else:
+        list_sql = list_sql.format(total_column=",\n        COUNT(*) OVER () AS total_count")
+        list_sql += "    ORDER BY createdon DESC, actualpullrequestid DESC\n    LIMIT %s OFFSET %s\n"
+        list_params = tuple(params_base + [limit_val, offset_val])
 
     db = Database()
     try:
-        count_res = db.execute_query(count_sql, params=tuple(params_base))
-        if not count_res["success"]:
-            return _error(count_res.get("error"))
-        total = count_res["rows"][0].get("pr_count", 0) if count_res["rows"] else 0
-
-        list_params = tuple(params_base + [limit_val, offset_val])
-        list_res = db.execute_query(list_sql, params=list_params)
+        # Total and page come back together via the window count; the separate
+        # COUNT(*) only runs when the offset is past the last page.
+        list_res = db.execute_query(list_sql, params=list_params, columnar=columnar)
         if not list_res["success"]:
             return _error(list_res.get("error"))
+        rows = list_res.get("rows", [])
+        columns = list_res.get("columns")
 
-        return _success(
-            {
-                "period": period,
-                "start": start_iso,
-                "end": end_iso,
-                "offset": offset_val,
-                "limit": limit_val,
-                "pr_count": int(total),
-                "prs": list_res.get("rows", []),
-            }
+        if state is not None:
+            total = state.get("t")
+        else:
+            if columnar:
+                columns, rows, total = split_total_count(columns, rows)
+            else:
+                total = pop_total_count(rows)
+            if total is None:
+                total = 0
+                if offset_val > 0:
+                    count_res = db.execute_query(count_sql, params=tuple(params_base))
+                    if not count_res["success"]:
+                        return _error(count_res.get("error"))
+                    total = count_res["rows"][0].get("pr_count", 0) if count_res["rows"] else 0
+
+        payload = {
+            "period": period,
+            "start": start_iso,
+            "end": end_iso,
+            "offset": offset_val,
+            "limit": limit_val,
+            "pr_count": int(total or 0),
+        }
+        if columnar:
+            payload["columns"] = columns
+        payload["prs"] = rows
+        payload["next_cursor"] = next_cursor(
+            "pr",
+            rows,
+            limit_val,
+            position=offset_val + len(rows),
+            total=total,
+            sort_key="createdon",
+            id_key="actualpullrequestid",
+            columns=columns if columnar else None,
+            start=start_iso,
+            end=end_iso,
+            min_cycle=min_cycle_time_minutes,
         )
+        return _success(payload)
     finally:
         db.close()
 
 # 4) get_cycle_time(pr_id) - single-value metric (minutes)
+@cached("pr.get_cycle_time", ttl=RECORD_TTL)
 def get_cycle_time(pr_id: int) -> Dict:
     log_tool_call("pr.get_cycle_time", pr_id=pr_id)
     sql = """
@@ -181,18 +275,21 @@ def get_cycle_time(pr_id: int) -> Dict:
     LIMIT 1
     """
     db = Database()
-    res = db.execute_query(sql, params=(pr_id,))
-    if not res["success"]:
-        return _error(res.get("error"))
-    if not res["rows"]:
-        return _error("PR not found")
-    val = res["rows"][0].get("cycle_time_minutes")
-    db.close()
-    return _success(
-        {"cycle_time_minutes": float(val) if val is not None else None}
-    )
+    try:
+        res = db.execute_query(sql, params=(pr_id,))
+        if not res["success"]:
+            return _error(res.get("error"))
+        if not res["rows"]:
+            return _error("PR not found")
+        val = res["rows"][0].get("cycle_time_minutes")
+        return _success(
+            {"cycle_time_minutes": float(val) if val is not None else None}
+        )
+    finally:
+        db.close()
 
 # 5) get_review_time(pr_id) - example metric (minutes)
+@cached("pr.get_review_time", ttl=RECORD_TTL)
 def get_review_time(pr_id: int) -> Dict:
     log_tool_call("pr.get_review_time", pr_id=pr_id)
     sql = """
@@ -216,6 +313,7 @@ def get_review_time(pr_id: int) -> Dict:
         db.close()
 
 # 6) get_pr_summary(pr_id) - aggregate many bits into a single dict
+@cached("pr.get_pr_summary", ttl=RECORD_TTL)
 def get_pr_summary(pr_id: int) -> Dict:
     """
     Fetches all available info about a given PR from the database.
@@ -224,21 +322,24 @@ def get_pr_summary(pr_id: int) -> Dict:
     This tool has access to all the columns in the pull_request table.
     """
     log_tool_call("pr.get_pr_summary", pr_id=pr_id)
-    db = Database()
     sql = """
     SELECT *
     FROM insightly.pull_request
     WHERE organizationid = 2133 AND actualpullrequestid = %s
     LIMIT 1
     """
-    res = db.execute_query(sql, params=(pr_id,))
-    if not res["success"]:
-        return _error(res.get("error", "Query failed"))
-    if not res["rows"]:
-        return _error("PR not found")
-    db.close() 
-    return _success({"pr_data": res["rows"][0]})
+    db = Database()
+    try:
+        res = db.execute_query(sql, params=(pr_id,))
+        if not res["success"]:
+            return _error(res.get("error", "Query failed"))
+        if not res["rows"]:
+            return _error("PR not found")
+        return _success({"pr_data": res["rows"][0]})
+    finally:
+        db.close()
 
+@cached("pr.get_churn_metrics", ttl=RECORD_TTL)
 def get_churn_metrics(pr_id: int) -> Dict:
     """
     Compute churn metrics for the given PR id.
@@ -263,73 +364,356 @@ def get_churn_metrics(pr_id: int) -> Dict:
         if not res["rows"]:
             return _error("PR not found")
 
-        row = res["rows"][0]
-        linesadded = row.get("linesadded")
-        linesremoved = row.get("linesremoved")
-        files_changed = row.get("modifiedfilescount")
-        commits_count = row.get("commitscount")
-
-        churn_lines = None
-        if linesadded is not None or linesremoved is not None:
-            churn_lines = float((linesadded or 0) + (linesremoved or 0))
-            churn_lines = round(churn_lines, 2)
-
-        churn_per_file = None
-        if churn_lines is not None and files_changed and files_changed > 0:
-            churn_per_file = round(churn_lines / float(files_changed), 2)
-
-        result = {"churn_lines": churn_lines, "churn_per_file": churn_per_file}
-        if files_changed is not None:
-            try:
-                result["files_changed"] = int(files_changed)
-            except Exception:
-                result["files_changed"] = files_changed
-        if commits_count is not None:
-            try:
-                result["commits_count"] = int(commits_count)
-            except Exception:
-                result["commits_count"] = commits_count
+        return _success(_churn_from_row(res["rows"][0]))
+    finally:
+        db.close()
+
+
+
+def _churn_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Churn metrics from a row with linesadded, linesremoved, modifiedfilescount, commitscount."""
+    linesadded = row.get("linesadded")
+    linesremoved = row.get("linesremoved")
+    files_changed = row.get("modifiedfilescount")
+    commits_count = row.get("commitscount")
+
+    churn_lines = None
+    if linesadded is not None or linesremoved is not None:
+        churn_lines = float((linesadded or 0) + (linesremoved or 0))
+        churn_lines = round(churn_lines, 2)
+
+    churn_per_file = None
+    if churn_lines is not None and files_changed and files_changed > 0:
+        churn_per_file = round(churn_lines / float(files_changed), 2)
+
+    result = {"churn_lines": churn_lines, "churn_per_file": churn_per_file}
+    if files_changed is not None:
+        try:
+            result["files_changed"] = int(files_changed)
+        except Exception:
+            result["files_changed"] = files_changed
+    if commits_count is not None:
+        try:
+            result["commits_count"] = int(commits_count)
+        except Exception:
+            result["commits_count"] = commits_count
+    return result
+
 
-        return _success(result)
+def _minutes(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+# Batch variants: one `= ANY(%s)` query for a list of PR ids, results keyed by id.
+def _query_by_ids(sql: str, ids: list) -> Dict[int, Dict[str, Any]]:
+    """Run ``sql`` with ``ids`` bound to its single ``= ANY(%s)``; rows keyed by actualpullrequestid."""
+    db = Database()
+    try:
+        res = db.execute_query(sql, params=(ids,))
     finally:
         db.close()
+    if not res["success"]:
+        raise RuntimeError(res.get("error") or "query failed")
+    found: Dict[int, Dict[str, Any]] = {}
+    for row in res["rows"]:
+        found.setdefault(row["actualpullrequestid"], row)
+    return found
 
 
+def _batch_result(ids: list, results: Dict[int, Any]) -> Dict:
+    return _success(
+        {
+            "results": {str(pr_id): results[pr_id] for pr_id in ids if pr_id in results},
+            "missing": [pr_id for pr_id in ids if pr_id not in results],
+        }
+    )
 
-ORG_ALLOWED = 2133
-DEFAULT_LIMIT = 10
 
+@cached("pr.get_pr_summary_batch", ttl=RECORD_TTL)
+def get_pr_summary_batch(pr_ids: Sequence[int]) -> Dict:
+    """Full pull_request rows for up to MAX_BATCH_IDS PR ids, keyed by PR id."""
+    log_tool_call("pr.get_pr_summary_batch", pr_ids=pr_ids)
+    try:
+        ids = normalize_ids(pr_ids, "pr_ids", MAX_BATCH_IDS)
+    except ValueError as e:
+        return _error(e)
+    sql = """
+    SELECT *
+    FROM insightly.pull_request
+    WHERE organizationid = 2133 AND actualpullrequestid = ANY(%s)
+    """
+    try:
+        found = _query_by_ids(sql, ids)
+    except RuntimeError as e:
+        return _error(e)
+    return _batch_result(ids, found)
 
 
-def _is_read_only_select(sql: str) -> bool:
-    """Quick heuristic: must start with SELECT and not contain forbidden keywords or semicolons."""
-    s = sql.strip().lower()
-    # remove leading parentheses and whitespace
-    s = re.sub(r'^\(+', '', s).strip()
-    if not s.startswith("select"):
-        return False
-    forbidden = ["insert", "update", "delete", "drop", "alter", "truncate", "create", "grant", "revoke"]
-    for kw in forbidden:
-        if kw in s:
-            return False
-    return True
+@cached("pr.get_cycle_time_batch", ttl=RECORD_TTL)
+def get_cycle_time_batch(pr_ids: Sequence[int]) -> Dict:
+    log_tool_call("pr.get_cycle_time_batch", pr_ids=pr_ids)
+    try:
+        ids = normalize_ids(pr_ids, "pr_ids", MAX_BATCH_IDS)
+    except ValueError as e:
+        return _error(e)
+    sql = """
+    SELECT actualpullrequestid, cycletimeduration AS cycle_time_minutes
+    FROM insightly.pull_request
+    WHERE organizationid = 2133 AND actualpullrequestid = ANY(%s)
+    """
+    try:
+        found = _query_by_ids(sql, ids)
+    except RuntimeError as e:
+        return _error(e)
+    return _batch_result(
+        ids, {pr_id: {"cycle_time_minutes": _minutes(row["cycle_time_minutes"])} for pr_id, row in found.items()}
+    )
 
-def _has_limit_clause(sql: str) -> bool:
-    """Simple check for LIMIT presence - not perfect but reasonable."""
-    return bool(re.search(r"\blimit\b", sql, flags=re.IGNORECASE))
 
-def _contains_org_filter(sql: str) -> bool:
-    return "organizationid" in sql.lower()
+@cached("pr.get_review_time_batch", ttl=RECORD_TTL)
+def get_review_time_batch(pr_ids: Sequence[int]) -> Dict:
+    log_tool_call("pr.get_review_time_batch", pr_ids=pr_ids)
+    try:
+        ids = normalize_ids(pr_ids, "pr_ids", MAX_BATCH_IDS)
+    except ValueError as e:
+        return _error(e)
+    sql = """
+    SELECT actualpullrequestid, opentoreviewduration AS review_time_minutes
+    FROM insightly.pull_request
+    WHERE organizationid = 2133 AND actualpullrequestid = ANY(%s)
+    """
+    try:
+        found = _query_by_ids(sql, ids)
+    except RuntimeError as e:
+        return _error(e)
+    return _batch_result(
+        ids, {pr_id: {"review_time_minutes": _minutes(row["review_time_minutes"])} for pr_id, row in found.items()}
+    )
+
 
-def _wrap_with_org_and_limit(sql: str, params: tuple, limit: int = DEFAULT_LIMIT):
+@cached("pr.get_churn_metrics_batch", ttl=RECORD_TTL)
+def get_churn_metrics_batch(pr_ids: Sequence[int]) -> Dict:
+    log_tool_call("pr.get_churn_metrics_batch", pr_ids=pr_ids)
+    try:
+        ids = normalize_ids(pr_ids, "pr_ids", MAX_BATCH_IDS)
+    except ValueError as e:
+        return _error(e)
+    sql = """
+    SELECT actualpullrequestid, linesadded, linesremoved, modifiedfilescount, commitscount
+    FROM insightly.pull_request
+    WHERE organizationid = 2133 AND actualpullrequestid = ANY(%s)
     """
-    Wraps the provided SQL as an inner query and applies an outer WHERE for organizationid
-    and a LIMIT. Returns (wrapped_sql, wrapped_params)
-    NOTE: This requires the inner query to project an `organizationid` column.
+    try:
+        found = _query_by_ids(sql, ids)
+    except RuntimeError as e:
+        return _error(e)
+    return _batch_result(ids, {pr_id: _churn_from_row(row) for pr_id, row in found.items()})
+
+
+# Metric name -> pull_request columns it needs (see get_pr_metrics).
+PR_METRIC_COLUMNS = {
+    "cycle_time_minutes": ("cycletimeduration",),
+    "review_time_minutes": ("opentoreviewduration",),
+    "churn": ("linesadded", "linesremoved", "modifiedfilescount", "commitscount"),
+}
+DEFAULT_PR_METRICS = ("cycle_time_minutes", "review_time_minutes", "churn")
+
+
+@cached("pr.get_pr_metrics", ttl=RECORD_TTL)
+def get_pr_metrics(pr_id: int, fields: Optional[Sequence[str]] = None) -> Dict:
     """
-    wrapped_sql = f"SELECT * FROM ({sql}) AS sub WHERE sub.organizationid = %s LIMIT %s"
-    wrapped_params = tuple(params) + (ORG_ALLOWED, limit)
-    return wrapped_sql, wrapped_params
+    Several metrics of one PR from a single query on insightly.pull_request.
+
+    ``fields`` may name metrics ("cycle_time_minutes", "review_time_minutes",
+    "churn", or "summary" for the whole row) and/or pull_request columns;
+    only the columns they need are selected. Defaults to the three metrics.
+    Churn lines and churn per file are derived from the same row, exactly
+    as get_churn_metrics does.
+    """
+    log_tool_call("pr.get_pr_metrics", pr_id=pr_id, fields=fields)
+    if fields is None:
+        requested = list(DEFAULT_PR_METRICS)
+    elif isinstance(fields, str):
+        requested = [fields]
+    else:
+        requested = list(fields)
+    requested = list(dict.fromkeys(str(field).strip().lower() for field in requested))
+    if not requested:
+        return _error("fields must name at least one metric or column")
+
+    raw_columns = [f for f in requested if f not in PR_METRIC_COLUMNS and f != "summary"]
+    if raw_columns:
+        try:
+            known = SCHEMA_CACHE.column_names("pull_request")
+        except Exception as e:
+            return _error(e)
+        unknown = [f for f in raw_columns if f not in known]
+        if unknown:
+            return _error(
+                f"Unknown field(s): {', '.join(unknown)}. Use "
+                f"{', '.join(list(PR_METRIC_COLUMNS) + ['summary'])} or pull_request column names."
+            )
+
+    if "summary" in requested:
+        select_list = "*"
+    else:
+        columns = []
+        for field in requested:
+            columns.extend(PR_METRIC_COLUMNS.get(field, (field,)))
+        # Names come from PR_METRIC_COLUMNS or the schema snapshot, never from raw input.
+        select_list = ", ".join(f'"{column}"' for column in dict.fromkeys(columns))
+
+    sql = f"""
+    SELECT {select_list}
+    FROM insightly.pull_request
+    WHERE organizationid = 2133 AND actualpullrequestid = %s
+    LIMIT 1
+    """
+    db = Database()
+    try:
+        res = db.execute_query(sql, params=(pr_id,))
+        if not res["success"]:
+            return _error(res.get("error", "query failed"))
+        if not res["rows"]:
+            return _error("PR not found")
+        row = res["rows"][0]
+    finally:
+        db.close()
+
+    result: Dict[str, Any] = {"pr_id": pr_id}
+    for field in requested:
+        if field == "summary":
+            result["pr_data"] = row
+        elif field == "cycle_time_minutes":
+            result[field] = _minutes(row.get("cycletimeduration"))
+        elif field == "review_time_minutes":
+            result[field] = _minutes(row.get("opentoreviewduration"))
+        elif field == "churn":
+            result[field] = _churn_from_row(row)
+        else:
+            result[field] = row.get(field)
+    return _success(result)
+
+
+# Aggregates over a period, computed in SQL (see mcp_server/aggregates.py).
+PR_AGGREGATES = AggregateSpec(
+    table="pull_request",
+    time_column="createdon",
+    metrics={
+        "cycle_time_minutes": "cycletimeduration",
+        "review_time_minutes": "opentoreviewduration",
+        "commit_to_open_minutes": "committoopenduration",
+        "lines_added": "linesadded",
+        "lines_removed": "linesremoved",
+        "churn_lines": "COALESCE(linesadded, 0) + COALESCE(linesremoved, 0)",
+        "files_changed": "modifiedfilescount",
+        "commits_count": "commitscount",
+    },
+    groups={
+        "author": ("authorid",),
+        "repo": ("repositoryid", "repoid"),
+        "branch": ("sourcebranch", "branch", "headbranch"),
+        "state": ("state",),
+    },
+)
+
+
+@cached("pr.get_pr_aggregates", ttl=PERIOD_TTL)
+def get_pr_aggregates(
+    period: str,
+    metric: Optional[str] = None,
+    stats: Optional[Sequence[str]] = None,
+    group_by: Optional[str] = None,
+    buckets: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict:
+    """
+    count/sum/avg/min/max/p50/p90/p99/histogram of a PR metric over a period,
+    optionally grouped by author, repo, branch, state or day. Results are
+    columnar: "rows" hold values in the order of "columns".
+    """
+    log_tool_call(
+        "pr.get_pr_aggregates",
+        period=period,
+        metric=metric,
+        stats=stats,
+        group_by=group_by,
+        buckets=buckets,
+        limit=limit,
+    )
+    try:
+        start_dt, end_dt = get_time_range(period)
+        start, end = start_dt.isoformat(), end_dt.isoformat()
+        result = aggregate(
+            PR_AGGREGATES,
+            ORG_ALLOWED,
+            start,
+            end,
+            metric=metric,
+            stats=stats,
+            group_by=group_by,
+            buckets=buckets,
+            limit=limit,
+        )
+    except (ValueError, RuntimeError) as e:
+        return _error(e)
+    return _success({"period": period, "start": start, "end": end, "metric": metric, "group_by": group_by, **result})
+
+
+# Output column -> (aggregate over pull_request rows, value for buckets without PRs).
+PR_TREND_SERIES = {
+    "pr_count": ("COUNT(*)", 0),
+    "lines_added": ("SUM(linesadded)", 0),
+    "lines_removed": ("SUM(linesremoved)", 0),
+    "median_cycle_time_minutes": ("percentile_cont(0.5) WITHIN GROUP (ORDER BY cycletimeduration)", None),
+}
+
+
+@cached("pr.get_pr_trend", ttl=PERIOD_TTL)
+def get_pr_trend(period: str, bucket: Optional[str] = None) -> Dict:
+    """
+    PR count, lines added/removed and median cycle time per day, week or
+    month of ``period`` from one query, with empty buckets zero-filled
+    (median left null). ``bucket`` defaults by span: day up to a month,
+    week up to six months, month beyond.
+    """
+    log_tool_call("pr.get_pr_trend", period=period, bucket=bucket)
+    try:
+        start_dt, end_dt = get_time_range(period)
+        result = trend(PR_AGGREGATES, ORG_ALLOWED, start_dt, end_dt, PR_TREND_SERIES, bucket=bucket)
+    except (ValueError, RuntimeError) as e:
+        return _error(str(e))
+    return _success(
+        {"period": period, "start": start_dt.isoformat(), "end": end_dt.isoformat(), **result}
+    )
+
+
+ORG_ALLOWED = 2133
+DEFAULT_LIMIT = 10
+# Row cap for run_custom_pr_query, whatever LIMIT the SQL itself asks for.
+MAX_CUSTOM_LIMIT = 500
+# statement_timeout for custom queries; override with
+# DATABASE_STATEMENT_TIMEOUT_MS_PR_RUN_CUSTOM_PR_QUERY.
+CUSTOM_QUERY_TIMEOUT_MS = 15000
+
+
+
+def _scope_custom_query(sql: str, limit: Optional[int]) -> ScopedQuery:
+    """
+    Rewrite the query so every insightly table with an organizationid column is
+    read through (SELECT * FROM insightly.<table> WHERE organizationid = 2133),
+    reject tables without one, and cap the rows with an outer LIMIT
+    (see sql_guard.scope_to_org).
+    """
+    return scope_to_org(
+        sql,
+        schema=SCHEMA_CACHE.schema,
+        org_column="organizationid",
+        org_id=ORG_ALLOWED,
+        columns_for=SCHEMA_CACHE.column_names,
+        default_limit=limit or DEFAULT_LIMIT,
+        max_limit=limit or MAX_CUSTOM_LIMIT,
+    )
 
 def _norm_params(params: Optional[Sequence]):
     if params is None:
@@ -342,25 +726,24 @@ def run_custom_pr_query(sql: str, params: Optional[Sequence] = None, limit: Opti
     """
     Execute a read-only, parameterized SQL query with enforcement:
       - Query must be a SELECT and read-only.
-      - organizationid = 2133 must be present either in SQL or be present in the inner result (see wrap).
-      - Enforces a LIMIT when necessary.
-    Returns: {"success": True, "data": {"rows": [...], "rowcount": N}} or error dict.
+      - Every referenced insightly table is filtered to organizationid = 2133.
+      - Rows are capped by an outer LIMIT (limit, DEFAULT_LIMIT, or MAX_CUSTOM_LIMIT).
+      - Rows are streamed from a server-side cursor, within CUSTOM_QUERY_MAX_BYTES.
+    Returns: {"success": True, "data": {"rows": [...], "rowcount": N}} or error dict;
+    "truncated": "rows" | "bytes" is added when a cap cut the result short.
     """
     try:
         if not isinstance(sql, str) or not sql.strip():
             return _error("Invalid SQL provided")
 
-        # basic sanitation checks
-        if not _is_read_only_select(sql):
-            return _error("Only read-only SELECT queries are allowed")
+        # single read-only statement check (shared tokenizer-based validator)
+        verdict = check_read_only(sql)
+        if not verdict.ok:
+            return _error(verdict.reason)
 
         # normalize params
         params_t = _norm_params(params)
 
-        # ensure no multiple statements / semicolons
-        if ";" in sql.strip().rstrip().rstrip(";"):
-            return _error("Multiple SQL statements are not allowed")
-
         # decide on limit
         user_limit = None
         if limit is not None:
@@ -368,38 +751,29 @@ def run_custom_pr_query(sql: str, params: Optional[Sequence] = None, limit: Opti
                 user_limit = int(limit)
                 if user_limit <= 0:
                     return _error("limit must be a positive integer")
+                user_limit = min(user_limit, MAX_CUSTOM_LIMIT)
             except Exception:
                 return _error("invalid limit value")
 
-        db = Database()
-
-        # If SQL already contains a reference to organizationid, allow execution but still enforce an upper bound on rows.
-        if _contains_org_filter(sql):
-            # If SQL has no LIMIT, enforce one by wrapping the query in an outer select with LIMIT.
-            if not _has_limit_clause(sql):
-                enforced_limit = user_limit or DEFAULT_LIMIT
-                wrapped_sql = f"SELECT * FROM ({sql}) AS sub LIMIT %s"
-                wrapped_params = tuple(params_t) + (enforced_limit,)
-                res = db.execute_query(wrapped_sql, params=wrapped_params)
-            else:
-                # SQL includes org filter and includes a limit — we still ensure an upper cap by refusing huge user limits may be tricky;
-                # rely on DB or caller to limit. Here we just execute with normalized params.
-                res = db.execute_query(sql, params=params_t)
-        else:
-            # SQL does NOT reference organizationid -> we will only allow it if the inner query returns organizationid column.
-            # To be safe we wrap the query and apply outer filter on sub.organizationid
-            # NOTE: This requires the inner query to include an organizationid column.
-            # If that's not true, the DB will error and we will return an error (we do not try to infer).
-            enforced_limit = user_limit or DEFAULT_LIMIT
-            wrapped_sql, wrapped_params = _wrap_with_org_and_limit(sql, params_t, enforced_limit)
-            res = db.execute_query(wrapped_sql, params=wrapped_params)
-        db.close() 
-        if not res["success"]:
-            # don't reveal DB errors directly; return a sanitized message
-            return _error("Query execution failed (internal error).")
+        try:
+            scoped = _scope_custom_query(sql, user_limit)
+        except ValueError as e:
+            return _error(str(e))
 
-        rows = res.get("rows", [])
-        return _success({"rows": rows, "rowcount": len(rows)})
+        db = Database()
+        try:
+            rejected = db.check_cost(scoped.sql, params_t, timeout_ms=CUSTOM_QUERY_TIMEOUT_MS)
+            if rejected is not None:
+                return rejected
+            return db.run_streamed(
+                scoped.sql,
+                params_t,
+                caller="pr.run_custom_pr_query",
+                timeout_ms=CUSTOM_QUERY_TIMEOUT_MS,
+                max_rows=scoped.limit,
+            )
+        finally:
+            db.close()
     except Exception as e:
         # log internally, return safe message
         # logger.exception("run_custom_pr_query failed", exc_info=e)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .database import get_pool
+from .schema_cache import SCHEMA_CACHE
+
+DEFAULT_WAIT_SECONDS = 30.0
+
+_lock = threading.Lock()
+_done = threading.Event()
+_thread: Optional[threading.Thread] = None
+_result: Dict[str, Any] = {}
+
+
+def _warm(name: str) -> None:
+    started = time.perf_counter()
+    try:
+        get_pool()  # opens DATABASE_POOL_MIN_SIZE connections
+        _result["pool_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        SCHEMA_CACHE.warm()
+        _result["schema_ms"] = round((time.perf_counter() - started) * 1000 - _result["pool_ms"], 1)
+    except Exception as e:
+        _result["error"] = str(e)
+        print(f"[WARMUP] {name} server warm-up failed: {e}", file=sys.stderr, flush=True)
+    finally:
+        _result["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        _done.set()
+
+
+def start_warm_up(name: str) -> None:
+    """
+    Open the connection pool and load the schema snapshot on a background
+    thread, so it overlaps the MCP handshake instead of delaying the first
+    tool call. Safe to call more than once.
+    """
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_warm, args=(name,), name=f"{name}-warmup", daemon=True)
+        _thread.start()
+
+
+def wait_for_warm_up(timeout: float = DEFAULT_WAIT_SECONDS) -> Dict[str, Any]:
+    """Block until the warm-up started by :func:`start_warm_up` is done; returns its timings."""
+    if _thread is None:
+        return {"started": False}
+    ready = _done.wait(timeout)
+    return {"started": True, "ready": ready, **_result}
@@ -0,0 +1,139 @@
+import pytest
+
+from mcp_server.sql_guard import SqlRewriteError, check_read_only, scope_to_org
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        'SELECT "pg_sleep"(600)',
+        "SELECT \"set_config\"('statement_timeout', '0', false)",
+        'SELECT "PG_SLEEP"(1)',
+        'SELECT "pg_catalog"."pg_sleep"(1)',
+        "SELECT dblink_connect('host=elsewhere')",
+        "SELECT lo_from_bytea(0, 'x')",
+        "SELECT pg_advisory_lock_shared(1)",
+        'SELECT 1 "into" x',
+    ],
+)
+def test_rejects_quoted_and_side_effecting_functions(sql):
+    assert not check_read_only(sql).ok
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        'SELECT "title" FROM insightly.pull_request',
+        "SELECT 'pg_sleep(1)' AS note",
+        'SELECT "pg_sleep" FROM insightly.commit',
+    ],
+)
+def test_allows_quoted_identifiers_that_are_not_calls(sql):
+    assert check_read_only(sql).ok
+
+
+def _scope(sql):
+    tables = {
+        "pull_request": {"organizationid", "title"},
+        "commit": {"organizationid", "id"},
+        "author": {"id", "name"},
+    }
+    return scope_to_org(
+        sql,
+        schema="insightly",
+        org_column="organizationid",
+        org_id=2133,
+        columns_for=lambda table: tables.get(table, set()),
+        default_limit=100,
+        max_limit=500,
+    )
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM query_to_xml('select * from insightly.pull_request', true, false, '')",
+        "SELECT table_to_xml('insightly.commit', true, false, '')",
+        "SELECT * FROM pg_ls_waldir()",
+        "SELECT * FROM insightly.pull_request p JOIN insightly.some_function(1) f ON true",
+    ],
+)
+def test_scope_rejects_unscoped_row_sources(sql):
+    with pytest.raises(SqlRewriteError):
+        _scope(sql)
+
+
+def test_scope_allows_listed_set_returning_functions():
+    sql = "SELECT g FROM generate_series(1, 3) g, pg_catalog.unnest(ARRAY[1]) u"
+    assert _scope(sql).sql.startswith(sql)
+
+
+def test_scope_keeps_schema_qualified_columns_valid():
+    scoped = _scope("SELECT insightly.pull_request.title FROM insightly.pull_request")
+    assert scoped.sql.startswith(
+        'SELECT "pull_request".title FROM '
+        '(SELECT * FROM insightly.pull_request WHERE organizationid = 2133) AS "pull_request"'
+    )
+
+
+@pytest.mark.parametrize(
+    "sql, scoped_tables",
+    [
+        (
+            "SELECT * FROM insightly.commit WHERE id IN (TABLE insightly.pull_request)",
+            ("commit", "pull_request"),
+        ),
+        ("SELECT id FROM insightly.commit UNION ALL (TABLE insightly.commit)", ("commit",)),
+        ("SELECT id FROM insightly.commit UNION ALL TABLE ONLY insightly.pull_request", ("commit", "pull_request")),
+    ],
+)
+def test_scope_rewrites_table_command(sql, scoped_tables):
+    scoped = _scope(sql)
+    assert scoped.scoped_tables == scoped_tables
+    assert "TABLE" not in scoped.sql
+    assert scoped.sql.count("WHERE organizationid = 2133") == len(sql.split("insightly.")) - 1
+
+
+def test_scope_ignores_window_names_when_collecting_ctes():
+    scoped = _scope(
+        "SELECT id, count(*) OVER pull_request FROM pull_request WINDOW pull_request AS (ORDER BY id)"
+    )
+    assert scoped.scoped_tables == ("pull_request",)
+    assert "(SELECT * FROM insightly.pull_request WHERE organizationid = 2133)" in scoped.sql
+
+
+def test_scope_leaves_cte_references_alone():
+    sql = (
+        "WITH RECURSIVE a(n) AS (SELECT 1), commit AS MATERIALIZED (TABLE insightly.pull_request) "
+        "SELECT * FROM a, commit"
+    )
+    scoped = _scope(sql)
+    assert scoped.scoped_tables == ("pull_request",)
+    assert scoped.sql.endswith("SELECT * FROM a, commit\nLIMIT 100")
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM insightly.author",
+        "SELECT * FROM insightly.commit c JOIN author a ON a.id = c.id",
+        "SELECT * FROM insightly.commit WHERE id IN (TABLE insightly.author)",
+    ],
+)
+def test_scope_rejects_tables_without_org_column(sql):
+    with pytest.raises(SqlRewriteError, match="has no organizationid column"):
+        _scope(sql)
+
+
+def test_scope_allows_listed_shared_tables():
+    scoped = scope_to_org(
+        "SELECT * FROM insightly.author",
+        schema="insightly",
+        org_column="organizationid",
+        org_id=2133,
+        columns_for=lambda table: {"id", "name"},
+        default_limit=100,
+        max_limit=500,
+        shared_tables={"author"},
+    )
+    assert scoped.sql == "SELECT * FROM insightly.author\nLIMIT 100"
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from mcp_server.time_filter import PeriodError, align, get_time_range, parse_period
+
+# A Wednesday, mid-minute.
+NOW = datetime(2025, 6, 18, 10, 17, 23, 500000, tzinfo=timezone.utc)
+# NOW rounded up to the minute, the default alignment of rolling ends.
+END = "2025-06-18T10:18:00+00:00"
+LAST = "23:59:59.999999+00:00"
+
+
+@pytest.mark.parametrize(
+    "period, start, end",
+    [
+        ("today", "2025-06-18T00:00:00+00:00", END),
+        ("yesterday", "2025-06-17T00:00:00+00:00", f"2025-06-17T{LAST}"),
+        ("last 7 days", "2025-06-11T10:18:00+00:00", END),
+        ("past 2 weeks", "2025-06-04T10:18:00+00:00", END),
+        ("last 3 hours", "2025-06-18T07:18:00+00:00", END),
+        ("last 6 months", "2024-12-18T10:18:00+00:00", END),
+        ("in the last two days", "2025-06-16T10:18:00+00:00", END),
+        ("last day", "2025-06-17T10:18:00+00:00", END),
+        ("", "2025-05-19T10:18:00+00:00", END),
+        ("3 days ago", "2025-06-15T00:00:00+00:00", f"2025-06-15T{LAST}"),
+        ("this week", "2025-06-16T00:00:00+00:00", END),
+        ("last week", "2025-06-09T00:00:00+00:00", f"2025-06-15T{LAST}"),
+        ("this month", "2025-06-01T00:00:00+00:00", END),
+        ("last month", "2025-05-01T00:00:00+00:00", f"2025-05-31T{LAST}"),
+        ("last quarter", "2025-01-01T00:00:00+00:00", f"2025-03-31T{LAST}"),
+        ("last year", "2024-01-01T00:00:00+00:00", f"2024-12-31T{LAST}"),
+        ("ytd", "2025-01-01T00:00:00+00:00", END),
+        ("Q1", "2025-01-01T00:00:00+00:00", f"2025-03-31T{LAST}"),
+        ("Q3", "2024-07-01T00:00:00+00:00", f"2024-09-30T{LAST}"),
+        ("Q3 2024", "2024-07-01T00:00:00+00:00", f"2024-09-30T{LAST}"),
+        ("2024-q4", "2024-10-01T00:00:00+00:00", f"2024-12-31T{LAST}"),
+        ("March", "2025-03-01T00:00:00+00:00", f"2025-03-31T{LAST}"),
+        ("July", "2024-07-01T00:00:00+00:00", f"2024-07-31T{LAST}"),
+        ("March 2024", "2024-03-01T00:00:00+00:00", f"2024-03-31T{LAST}"),
+        ("monday", "2025-06-16T00:00:00+00:00", f"2025-06-16T{LAST}"),
+        ("wednesday", "2025-06-18T00:00:00+00:00", END),
+        ("last wednesday", "2025-06-11T00:00:00+00:00", f"2025-06-11T{LAST}"),
+        ("since monday", "2025-06-16T00:00:00+00:00", END),
+        ("since 2025-01-01", "2025-01-01T00:00:00+00:00", END),
+        ("2025-01-01..2025-01-31", "2025-01-01T00:00:00+00:00", f"2025-01-31T{LAST}"),
+        ("2025-02-03", "2025-02-03T00:00:00+00:00", f"2025-02-03T{LAST}"),
+        ("from 2025-01-01T09:00+05:30 to 2025-01-02", "2025-01-01T03:30:00+00:00", f"2025-01-02T{LAST}"),
+    ],
+)
+def test_get_time_range(period, start, end):
+    assert tuple(moment.isoformat() for moment in get_time_range(period, now=NOW)) == (start, end)
+
+
+@pytest.mark.parametrize(
+    "period, start, end",
+    [
+        ("today UTC", "2025-06-18T00:00:00+00:00", END),
+        ("today +05:30", "2025-06-17T18:30:00+00:00", END),
+        ("today UTC-3", "2025-06-18T03:00:00+00:00", END),
+        ("yesterday Europe/Berlin", "2025-06-16T22:00:00+00:00", "2025-06-17T21:59:59.999999+00:00"),
+        ("this month in America/New_York", "2025-06-01T04:00:00+00:00", END),
+        ("2025-01-01..2025-01-31 +02:00", "2024-12-31T22:00:00+00:00", "2025-01-31T21:59:59.999999+00:00"),
+    ],
+)
+def test_time_zone_sets_day_boundaries(period, start, end):
+    assert tuple(moment.isoformat() for moment in get_time_range(period, now=NOW)) == (start, end)
+
+
+@pytest.mark.parametrize(
+    "granularity, start, end",
+    [
+        ("none", "2025-06-11T10:17:23.500000+00:00", "2025-06-18T10:17:23.500000+00:00"),
+        ("minute", "2025-06-11T10:18:00+00:00", "2025-06-18T10:18:00+00:00"),
+        ("hour", "2025-06-11T11:00:00+00:00", "2025-06-18T11:00:00+00:00"),
+        ("day", "2025-06-12T00:00:00+00:00", "2025-06-19T00:00:00+00:00"),
+    ],
+)
+def test_rolling_window_alignment(granularity, start, end):
+    window = get_time_range("last 7 days", granularity, now=NOW)
+    assert tuple(moment.isoformat() for moment in window) == (start, end)
+
+
+@pytest.mark.parametrize("granularity", ["minute", "hour", "day"])
+def test_alignment_keeps_exact_boundaries_and_groups_nearby_calls(granularity):
+    boundary = datetime(2025, 6, 18, tzinfo=timezone.utc)
+    assert align(boundary, granularity) == boundary
+    first = get_time_range("last 7 days", granularity, now=datetime(2025, 6, 18, 9, 0, 0, 1, tzinfo=timezone.utc))
+    second = get_time_range("last 7 days", granularity, now=datetime(2025, 6, 18, 9, 0, 59, tzinfo=timezone.utc))
+    assert first == second
+
+
+def test_calendar_days_are_not_aligned():
+    # Day boundaries come from the real time, so "today" still ends at the aligned now.
+    start, end = get_time_range("today", "day", now=NOW)
+    assert (start.isoformat(), end.isoformat()) == ("2025-06-18T00:00:00+00:00", "2025-06-19T00:00:00+00:00")
+
+
+@pytest.mark.parametrize(
+    "period, message",
+    [
+        ("last few days", "not a number: 'few'"),
+        ("whenever", "could not understand period: 'whenever'. Try e.g. 'last 7 days'"),
+        ("2025-02-30", "not an ISO date or datetime: 2025-02-30"),
+        ("2025-02-01..2025-01-01", "period ends before it starts"),
+        ("today +15:00", "invalid UTC offset: +15:00"),
+        ("today Mars/Olympus", "unknown time zone: Mars/Olympus"),
+    ],
+)
+def test_rejects_unknown_periods(period, message):
+    with pytest.raises(PeriodError) as excinfo:
+        parse_period(period)
+    assert message in str(excinfo.value)
+
+
+def test_period_error_is_a_value_error():
+    with pytest.raises(ValueError):
+        get_time_range("sometime soon", now=NOW)
+
+
+def test_rejects_unknown_granularity():
+    with pytest.raises(ValueError, match="granularity must be one of"):
+        get_time_range("today", "second", now=NOW)